@@ -0,0 +1,86 @@
+import heapq
+import random
+import shutil
+import tempfile
+import time
+import tracemalloc
+from argparse import ArgumentParser
+from bisect import bisect_left
+from typing import Callable, List, Tuple
+from os import path
+
+from benchmarks.spelling import generate_words
+from scripts.lookup.completion import CompletionIndex, encode_index
+from scripts.processing.lib.utils import store_binary
+
+
+class SortedCompletions:
+    """Completions from a sorted list of words, where the words starting with a prefix are found by bisection and then ranked."""
+
+    def __init__(self, words: List[Tuple[str, int]]) -> None:
+        # Words are given by the most frequent first, so the index of a word is its rank
+        order = sorted(range(len(words)), key=lambda index: words[index][0])
+        self.words = [words[index][0] for index in order]
+        self.ranks = order
+        self.counts = [count for _, count in words]
+        self.lookup = [word for word, _ in words]
+
+    def complete(self, prefix: str, n: int) -> List[Tuple[str, int]]:
+        """Get up to n of the most frequent words starting with a prefix, along with their frequency."""
+        start = bisect_left(self.words, prefix)
+        end = bisect_left(self.words, prefix + "\U0010ffff", start)
+        return [(self.lookup[rank], self.counts[rank]) for rank in heapq.nsmallest(n, self.ranks[start:end])]
+
+
+def measure(name: str, prefixes: List[str], function: Callable[[str], List[Tuple[str, int]]]) -> List[List[Tuple[str, int]]]:
+    """Run a function for every prefix and report the time per prefix."""
+    start = time.perf_counter()
+    results = [function(prefix) for prefix in prefixes]
+    elapsed = time.perf_counter() - start
+    print("{:<10} {:>10.1f} µs/query {:>10.0f} queries/s".format(name, elapsed / len(prefixes) * 1e6, len(prefixes) / elapsed))
+    return results
+
+
+def main() -> None:
+    """Main entrypoint."""
+    # Create an argument parser for parsing CLI arguments
+    parser = ArgumentParser(description="A benchmark of autocompletion with a completion index against bisecting a sorted list of words")
+    parser.add_argument("-w", "--words", type=int, default=300000, required=False, help="The number of words to generate")
+    parser.add_argument("-q", "--queries", type=int, default=10000, required=False, help="The number of prefixes to complete")
+    parser.add_argument("-k", type=int, default=10, required=False, help="The number of completions of each prefix")
+    parser.add_argument("--seed", type=int, default=0, required=False, help="The seed of the generator")
+
+    # Parse the arguments
+    options = parser.parse_args()
+
+    words = generate_words(options.words, options.seed)
+    generator = random.Random(options.seed)
+    # Complete the first few characters of words drawn by frequency, like those typed
+    prefixes = [word[:generator.randint(1, 4)] for word, _ in generator.choices(words, weights=[count for _, count in words], k=options.queries)]
+
+    tracemalloc.start()
+    baseline = SortedCompletions(words)
+    baseline_memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    output_directory = tempfile.mkdtemp(prefix="benchmark-")
+    try:
+        start = time.perf_counter()
+        content = encode_index(words, options.k)
+        store_binary(output_directory, "completion-index.bin", content)
+        print("words={} index built in {:.2f}s\n".format(len(words), time.perf_counter() - start))
+        print("{:<10} {:>10.1f} MB mapped".format("index", len(content) / 1e6))
+        print("{:<10} {:>10.1f} MB allocated\n".format("bisect", baseline_memory / 1e6))
+
+        with CompletionIndex(path.join(output_directory, "completion-index.bin")) as index:
+            indexed = measure("index", prefixes, lambda prefix: index.complete(prefix, options.k))
+            exact = measure("bisect", prefixes, lambda prefix: baseline.complete(prefix, options.k))
+    finally:
+        shutil.rmtree(output_directory)
+
+    mismatches = sum(1 for a, b in zip(indexed, exact) if a != b)
+    print("\nqueries with different completions: {}".format(mismatches))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+import shutil
+import tempfile
+import time
+from argparse import ArgumentParser
+from typing import Callable, List, Optional
+from os import path, walk
+
+from benchmarks.corpus import Corpus
+from scripts.processing.clean import clean_bucket
+from scripts.processing.compile import compile
+from scripts.processing.lib.compression import assert_compression, compressions
+from scripts.processing.lib.manifest import Manifest
+from scripts.processing.lib.utils import load, store, stream
+
+
+def generate_documents(documents: int, size: int, seed: int = 0) -> List[str]:
+    """Generate documents of Zipfian distributed words, each roughly size bytes."""
+    corpus = Corpus(seed)
+    return ["\n".join(corpus.paragraphs(size)) for _ in range(documents)]
+
+
+def disk_usage(directory: str) -> int:
+    """Get the total size of the files in a directory."""
+    return sum(path.getsize(path.join(root, filename)) for root, _, filenames in walk(directory) for filename in filenames)
+
+
+def measure(name: str, size: int, function: Callable[[], None]) -> None:
+    """Run a function and report its throughput."""
+    start = time.perf_counter()
+    function()
+    elapsed = time.perf_counter() - start
+    print("{:<10} {:>8.2f}s {:>10.2f} MB/s".format(name, elapsed, size / elapsed / 1e6))
+
+
+def benchmark(compression: Optional[str], contents: List[str]) -> None:
+    """Benchmark the stages that use the cache with a compression."""
+    output_directory = tempfile.mkdtemp(prefix="benchmark-")
+    try:
+        files = [("synthetic", "{}.txt".format(i)) for i in range(len(contents))]
+        size = sum(len(content.encode("utf-8")) for content in contents)
+        print("compression={} documents={} size={:.1f} MB".format(compression or "none", len(contents), size / 1e6))
+
+        def download() -> None:
+            manifest = Manifest(output_directory)
+            for (source, filename), content in zip(files, contents):
+                store(output_directory, "downloads/sv/{}/{}".format(source, filename), content, compression)
+                manifest.record("sv", source, filename, "downloaded", content)
+            manifest.close()
+
+        def read() -> None:
+            for source, filename in files:
+                load(output_directory, "downloads/sv/{}/{}".format(source, filename))
+
+        def read_streaming() -> None:
+            for source, filename in files:
+                for _ in stream(output_directory, "downloads/sv/{}/{}".format(source, filename)):
+                    pass
+
+        measure("store", size, download)
+        measure("load", size, read)
+        measure("stream", size, read_streaming)
+        measure("clean", size, lambda: clean_bucket(output_directory, "sv", files, compression))
+        measure("compile", size, lambda: compile(output_directory, "sv", force=True))
+        print("{:<10} {:>8.1f} MB".format("disk", (disk_usage(path.join(output_directory, "downloads")) + disk_usage(path.join(output_directory, "clean"))) / 1e6))
+        print()
+    finally:
+        shutil.rmtree(output_directory)
+
+
+def main() -> None:
+    """Main entrypoint."""
+    # Create an argument parser for parsing CLI arguments
+    parser = ArgumentParser(description="A benchmark of the processing stages with and without compressed caches")
+    parser.add_argument("-d", "--documents", type=int, default=50, required=False, help="The number of documents to generate")
+    parser.add_argument("-s", "--size", type=int, default=1 << 20, required=False, help="The size of each document in bytes")
+    parser.add_argument("--compression", nargs="+", choices=["none"] + compressions, default=["none"] + compressions, required=False, help="The compressions to compare")
+
+    # Parse the arguments
+    options = parser.parse_args()
+
+    contents = generate_documents(options.documents, options.size)
+    for compression in options.compression:
+        compression = None if compression == "none" else compression
+        try:
+            assert_compression(compression)
+        except ValueError as error:
+            print("Skipping compression={}: {}\n".format(compression, error))
+            continue
+        benchmark(compression, contents)
+
+
+if __name__ == '__main__':
+    main()
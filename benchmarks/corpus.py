@@ -0,0 +1,193 @@
+import random
+from argparse import ArgumentParser
+from itertools import accumulate
+from typing import Dict, List
+from os import path, makedirs
+
+from scripts.processing.lib.manifest import Manifest
+from scripts.processing.lib.utils import store
+
+# Letters are drawn with roughly the frequencies of Swedish text
+letters = "eanrtslidomkgvfhupåäbcöjyxwzq"
+letter_weights = [10.1, 9.4, 8.5, 8.4, 7.7, 6.6, 6.3, 5.3, 5.1, 4.5, 4.4, 3.2, 3.1, 2.4, 2.0, 2.1, 1.8, 1.8, 1.7, 1.3, 1.8, 1.5, 1.3, 0.7, 0.7, 0.2, 0.1, 0.1, 0.1]
+
+# The distribution of sentence lengths in words
+sentence_lengths = list(range(3, 31))
+punctuation = [".", ".", ".", ".", "!", "?", "...", ":"]
+
+# The share of each source in a corpus
+source_shares = [("wikipedia", 0.4), ("gutenberg", 0.4), ("litteraturbanken", 0.2)]
+
+
+def parse_size(value: str) -> int:
+    """Parse a size in bytes such as 500000, 10MB or 2GB."""
+    units = {"KB": 1000, "MB": 1000 ** 2, "GB": 1000 ** 3}
+    value = value.strip().upper()
+    for unit, multiplier in units.items():
+        if value.endswith(unit):
+            return int(float(value[:-len(unit)]) * multiplier)
+    return int(value)
+
+
+def create_vocabulary(generator: random.Random, size: int) -> List[str]:
+    """Create a vocabulary of unique made up words, shortest first so that frequent words are short like in real text."""
+    words = set()
+    while len(words) < size:
+        length = min(1 + int(generator.expovariate(1 / 5)), 20)
+        words.add("".join(generator.choices(letters, weights=letter_weights, k=length)))
+    return sorted(words, key=lambda word: (len(word), word))
+
+
+class Corpus:
+    """A generator of reproducible text where words follow a Zipfian distribution.
+
+    The word of rank r is drawn with a probability proportional to 1 / r^exponent.
+    """
+
+    def __init__(self, seed: int = 0, vocabulary_size: int = 100000, exponent: float = 1.07) -> None:
+        self.generator = random.Random(seed)
+        self.vocabulary = create_vocabulary(self.generator, vocabulary_size)
+        self.cumulative_weights = list(accumulate(1 / rank ** exponent for rank in range(1, vocabulary_size + 1)))
+
+    def words(self, n: int) -> List[str]:
+        """Draw n words."""
+        return self.generator.choices(self.vocabulary, cum_weights=self.cumulative_weights, k=n)
+
+    def sentences(self, size: int) -> List[str]:
+        """Generate sentences of roughly size characters in total."""
+        # Draw words in bulk, frequent words are short so a word takes about 3.5 characters with the separator
+        words = self.words(max(size * 2 // 7, 1))
+        sentences = []
+        start = 0
+        while start < len(words):
+            length = self.generator.choice(sentence_lengths)
+            sentence = words[start:start + length]
+            start += length
+            # Exercise the cleaner with digits, hyphens and quotes every now and then
+            roll = self.generator.random()
+            if roll < 0.05:
+                sentence.insert(self.generator.randrange(len(sentence) + 1), str(self.generator.randint(1, 2000)))
+            elif roll < 0.08:
+                sentence[0] = sentence[0] + "-" + self.generator.choice(self.vocabulary[:1000])
+            elif roll < 0.1:
+                sentence = ["”"] + sentence + ["”"]
+            sentences.append(" ".join(sentence).capitalize() + self.generator.choice(punctuation))
+        return sentences
+
+    def paragraphs(self, size: int) -> List[str]:
+        """Generate paragraphs of roughly size characters in total."""
+        sentences = self.sentences(size)
+        paragraphs = []
+        start = 0
+        while start < len(sentences):
+            length = self.generator.randint(2, 8)
+            paragraphs.append(" ".join(sentences[start:start + length]))
+            start += length
+        return paragraphs
+
+
+def wrap(paragraph: str, width: int = 72) -> str:
+    """Break a paragraph into lines like in a printed book."""
+    lines = []
+    line = []
+    length = 0
+    for word in paragraph.split(" "):
+        if length + len(word) > width and line:
+            lines.append(" ".join(line))
+            line = []
+            length = 0
+        line.append(word)
+        length += len(word) + 1
+    lines.append(" ".join(line))
+    return "\n".join(lines)
+
+
+def gutenberg_document(corpus: Corpus, title: str, size: int) -> str:
+    """Generate a book like those from Gutenberg, with a license header and footer and line broken text."""
+    paragraphs = corpus.paragraphs(size)
+    body = "\n\n".join(wrap(paragraph) for paragraph in paragraphs)
+    header = "The Project Gutenberg eBook of {0}\n\nTitle: {0}\nLanguage: Swedish\n\n*** START OF THE PROJECT GUTENBERG EBOOK {1} ***\n\n".format(title, title.upper())
+    footer = "\n\n*** END OF THE PROJECT GUTENBERG EBOOK {} ***\n\n*** START: FULL LICENSE ***\n\nTHE FULL PROJECT GUTENBERG LICENSE\n".format(title.upper())
+    return header + body + footer
+
+
+def wikipedia_document(corpus: Corpus, title: str, size: int) -> str:
+    """Generate an article like those from Wikipedia, with headings and lists."""
+    paragraphs = corpus.paragraphs(size)
+    lines = []
+    for i, paragraph in enumerate(paragraphs):
+        if i > 0 and i % 4 == 0:
+            lines.append("\n== {} ==".format(" ".join(corpus.words(2)).capitalize()))
+        if i % 7 == 6:
+            # Lists do not end with a period
+            lines.extend(" ".join(corpus.words(3)).capitalize() for _ in range(3))
+        lines.append(paragraph)
+    return "\n".join(lines)
+
+
+def litteraturbanken_document(corpus: Corpus, title: str, size: int) -> str:
+    """Generate a book like those from Litteraturbanken, with a header and some badly encoded characters."""
+    paragraphs = corpus.paragraphs(size)
+    body = "\n\n".join(paragraphs)
+    # Some books have characters encoded twice
+    body = body.replace("å", "ã¥", body.count("å") // 20).replace("ä", "ã¤", body.count("ä") // 20)
+    header = "{}\nLitteraturbanken\n{}\n".format(title, "-" * 80)
+    return header + body
+
+
+generators = {
+    "gutenberg": gutenberg_document,
+    "wikipedia": wikipedia_document,
+    "litteraturbanken": litteraturbanken_document,
+}
+
+
+def generate_corpus(output_directory: str, language: str, size: int, document_size: int = 1 << 20, seed: int = 0) -> Dict[str, int]:
+    """Generate downloaded documents of roughly size bytes in total into a cache and record them in its manifest.
+
+    Returns the number of bytes, words and documents generated.
+    """
+    corpus = Corpus(seed)
+    manifest = Manifest(output_directory)
+    statistics = {"bytes": 0, "words": 0, "documents": 0}
+    for source, share in source_shares:
+        target = size * share
+        generated = 0
+        while generated < target:
+            filename = "{}.txt".format(statistics["documents"])
+            title = " ".join(corpus.words(3)).capitalize()
+            content = generators[source](corpus, title, int(min(document_size, target - generated)) + 1)
+            store(output_directory, "downloads/{}/{}/{}".format(language, source, filename), content)
+            manifest.record(language, source, filename, "downloaded", content)
+
+            length = len(content.encode("utf-8"))
+            generated += length
+            statistics["bytes"] += length
+            statistics["words"] += len(content.split())
+            statistics["documents"] += 1
+    manifest.close()
+    return statistics
+
+
+def main() -> None:
+    """Main entrypoint."""
+    # Create an argument parser for parsing CLI arguments
+    parser = ArgumentParser(description="A tool to generate reproducible synthetic corpora of downloaded documents")
+    parser.add_argument("-l", "--language", type=str, default="sv", required=False, help="The two letter language code to generate documents for")
+    parser.add_argument("-c", "--cache", type=str, required=True, help="The cache directory to generate documents in")
+    parser.add_argument("-s", "--size", type=parse_size, default="10MB", required=False, help="The total size of the documents, such as 10MB or 2GB")
+    parser.add_argument("--document-size", type=parse_size, default="1MB", required=False, help="The maximum size of a document")
+    parser.add_argument("--seed", type=int, default=0, required=False, help="The seed of the generator")
+
+    # Parse the arguments
+    options = parser.parse_args()
+
+    if not path.exists(options.cache):
+        makedirs(options.cache)
+
+    statistics = generate_corpus(options.cache, options.language, options.size, options.document_size, options.seed)
+    print("Generated documents={documents} words={words} bytes={bytes}".format(**statistics))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,203 @@
+import json
+import logging
+import multiprocessing
+import resource
+import shutil
+import sys
+import tempfile
+import time
+from argparse import ArgumentParser
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List
+from os import listdir, path, makedirs
+
+import scripts.processing.clean as clean_stage
+from benchmarks.corpus import generate_corpus, parse_size
+from scripts.processing.compile import compile
+from scripts.processing.count import count
+from scripts.processing.lib.manifest import Manifest
+from scripts.processing.merge import merge
+from scripts.processing.ngram import create_ngrams
+
+# The stages in the order they are run, as each stage uses the output of the one before it
+stages = ["clean", "compile", "count", "ngram", "merge"]
+
+# The relative change in throughput or memory usage that counts as a regression
+default_tolerance = 0.1
+
+# A file marking a directory as created by the benchmark
+marker_filename = ".benchmark"
+
+
+def prepare_work_directory(directory: str) -> None:
+    """Create a work directory for the benchmark. A non-empty directory is only used if the benchmark created it,
+    as the benchmark writes documents into it and removes the output of the stages, which would ruin a real cache."""
+    if path.exists(directory) and listdir(directory) and not path.exists(path.join(directory, marker_filename)):
+        raise ValueError("Refusing to use a non-empty directory not created by the benchmark: {}".format(directory))
+    if not path.exists(directory):
+        makedirs(directory)
+    open(path.join(directory, marker_filename), "w").close()
+
+
+def run_stage(stage: str, output_directory: str, language: str, workers: int) -> None:
+    """Run a stage on a cache, forcing it to process everything."""
+    if stage == "clean":
+        # Mark all documents as outstanding so that they are cleaned again
+        manifest = Manifest(output_directory)
+        for source, filename in manifest.documents(language):
+            manifest.record(language, source, filename, "downloaded")
+        manifest.close()
+        shutil.rmtree(path.join(output_directory, "clean"), ignore_errors=True)
+        shutil.rmtree(path.join(output_directory, "shards"), ignore_errors=True)
+        clean_stage.executor = ProcessPoolExecutor(max_workers=workers)
+        clean_stage.clean(output_directory, language, workers)
+        clean_stage.executor.shutdown()
+    elif stage == "compile":
+        compile(output_directory, language, force=True)
+    elif stage == "count":
+        count(output_directory, language, workers=workers, force=True)
+    elif stage == "ngram":
+        create_ngrams(output_directory, language, [2, 3], force=True)
+    elif stage == "merge":
+        shutil.rmtree(path.join(output_directory, "merged"), ignore_errors=True)
+        merge(output_directory, language)
+
+
+def measure_stage(connection: Any, stage: str, output_directory: str, language: str, workers: int) -> None:
+    """Run a stage in a child process and send its wall time, CPU time and peak memory usage to the parent."""
+    start = time.perf_counter()
+    run_stage(stage, output_directory, language, workers)
+    elapsed = time.perf_counter() - start
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    # The peak is reported in kilobytes on Linux and in bytes on macOS
+    scale = 1 if sys.platform == "darwin" else 1024
+    connection.send({
+        "seconds": elapsed,
+        "cpu_seconds": usage.ru_utime + usage.ru_stime + children.ru_utime + children.ru_stime,
+        "peak_rss": max(usage.ru_maxrss, children.ru_maxrss) * scale,
+    })
+    connection.close()
+
+
+def benchmark(output_directory: str, language: str, corpus: Dict[str, int], selected: List[str], workers: int, repeat: int) -> Dict[str, Dict[str, float]]:
+    """Benchmark stages on a generated corpus, keeping the fastest of the repeated runs of each stage."""
+    # Each run gets a fresh process so that the peak memory usage of one stage does not hide that of another
+    context = multiprocessing.get_context("fork")
+    results = {}
+    # Stages that are not benchmarked are still run once if a later stage needs their output
+    last = max(stages.index(stage) for stage in selected)
+    for stage in stages[:last + 1]:
+        best = None
+        for _ in range(repeat if stage in selected else 1):
+            receiver, sender = context.Pipe(duplex=False)
+            process = context.Process(target=measure_stage, args=(sender, stage, output_directory, language, workers))
+            process.start()
+            # Close the parent's end so that a crashed stage is noticed rather than waited for
+            sender.close()
+            try:
+                result = receiver.recv()
+            except EOFError:
+                raise RuntimeError("The {} stage failed".format(stage))
+            finally:
+                process.join()
+            if best is None or result["seconds"] < best["seconds"]:
+                best = result
+        if stage not in selected:
+            continue
+
+        # The stages after cleaning read the compiled file, the others read the downloaded documents
+        compiled = path.join(output_directory, "compiled/{}/compiled.txt".format(language))
+        size = path.getsize(compiled) if stage in ["count", "ngram"] else corpus["bytes"]
+        best["mb_per_second"] = size / best["seconds"] / 1e6
+        best["tokens_per_second"] = corpus["words"] / best["seconds"]
+        results[stage] = best
+    return results
+
+
+def compare(results: Dict[str, Dict[str, float]], baseline: Dict[str, Dict[str, float]], tolerance: float) -> List[str]:
+    """Compare results to a baseline. Returns a description of each regression."""
+    regressions = []
+    for stage, result in results.items():
+        if stage not in baseline:
+            continue
+        expected = baseline[stage]
+        if result["mb_per_second"] < expected["mb_per_second"] * (1 - tolerance):
+            regressions.append("{} throughput {:.2f} MB/s, baseline {:.2f} MB/s".format(stage, result["mb_per_second"], expected["mb_per_second"]))
+        if result["peak_rss"] > expected["peak_rss"] * (1 + tolerance):
+            regressions.append("{} peak RSS {:.1f} MB, baseline {:.1f} MB".format(stage, result["peak_rss"] / 1e6, expected["peak_rss"] / 1e6))
+    return regressions
+
+
+def report(results: Dict[str, Dict[str, float]], baseline: Dict[str, Dict[str, float]]) -> None:
+    """Print a table of results, with the change in throughput against the baseline if any."""
+    print("{:<10} {:>10} {:>10} {:>12} {:>14} {:>12} {:>10}".format("stage", "seconds", "cpu", "MB/s", "tokens/s", "peak RSS MB", "change"))
+    for stage, result in results.items():
+        change = ""
+        if stage in baseline:
+            change = "{:+.1%}".format(result["mb_per_second"] / baseline[stage]["mb_per_second"] - 1)
+        print("{:<10} {:>10.2f} {:>10.2f} {:>12.2f} {:>14.0f} {:>12.1f} {:>10}".format(
+            stage, result["seconds"], result["cpu_seconds"], result["mb_per_second"], result["tokens_per_second"], result["peak_rss"] / 1e6, change))
+
+
+def main() -> None:
+    """Main entrypoint."""
+    # Create an argument parser for parsing CLI arguments
+    parser = ArgumentParser(description="A benchmark of the processing stages on a synthetic corpus")
+    parser.add_argument("-s", "--size", type=parse_size, default="10MB", required=False, help="The size of the corpus, such as 10MB or 2GB")
+    parser.add_argument("--document-size", type=parse_size, default="1MB", required=False, help="The maximum size of a document")
+    parser.add_argument("--seed", type=int, default=0, required=False, help="The seed of the corpus generator")
+    parser.add_argument("--stages", nargs="+", choices=stages, default=stages, required=False, help="The stages to benchmark")
+    parser.add_argument("-w", "--workers", type=int, default=1, required=False, help="The number of workers of the stages that use several processes")
+    parser.add_argument("-r", "--repeat", type=int, default=1, required=False, help="The number of times to run each stage, keeping the fastest run")
+    parser.add_argument("--work-dir", type=str, default=None, required=False,
+                        help="An empty directory to generate the corpus and run the stages in, kept for later runs. A temporary directory by default")
+    parser.add_argument("-b", "--baseline", type=str, default=None, required=False, help="A stored baseline to compare against")
+    parser.add_argument("--save", type=str, default=None, required=False, help="Store the results as a baseline")
+    parser.add_argument("--tolerance", type=float, default=default_tolerance, required=False, help="The relative change that counts as a regression")
+
+    # Parse the arguments
+    options = parser.parse_args()
+
+    # The stages log every document, which would drown the results
+    logging.getLogger().setLevel(logging.WARNING)
+
+    output_directory = options.work_dir or tempfile.mkdtemp(prefix="benchmark-")
+    try:
+        prepare_work_directory(output_directory)
+    except ValueError as error:
+        parser.error(str(error))
+
+    try:
+        print("Generating corpus size={} seed={}".format(options.size, options.seed))
+        corpus = generate_corpus(output_directory, "sv", options.size, options.document_size, options.seed)
+        print("Generated documents={documents} words={words} bytes={bytes}\n".format(**corpus))
+        results = benchmark(output_directory, "sv", corpus, options.stages, options.workers, options.repeat)
+    finally:
+        if options.work_dir is None:
+            shutil.rmtree(output_directory)
+
+    baseline = {}
+    if options.baseline is not None:
+        with open(options.baseline, "r") as file:
+            stored = json.load(file)
+        if stored["size"] != options.size or stored["seed"] != options.seed:
+            print("The baseline was made with size={} seed={}, the results may not be comparable\n".format(stored["size"], stored["seed"]))
+        baseline = stored["stages"]
+
+    report(results, baseline)
+
+    if options.save is not None:
+        with open(options.save, "w") as file:
+            json.dump({"size": options.size, "seed": options.seed, "workers": options.workers, "stages": results}, file, indent=2)
+
+    regressions = compare(results, baseline, options.tolerance)
+    if regressions:
+        print("\nRegressions:")
+        for regression in regressions:
+            print("  " + regression)
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+import random
+import shutil
+import tempfile
+import time
+from argparse import ArgumentParser
+from collections import Counter
+from typing import Callable, List, Optional, Tuple
+from os import path
+
+from benchmarks.corpus import Corpus, letters
+from scripts.lookup.spelling import SpellingIndex, distance, encode_index
+from scripts.processing.lib.utils import store_binary
+
+
+def generate_words(size: int, seed: int = 0) -> List[Tuple[str, int]]:
+    """Generate the word frequencies of a corpus of Zipfian distributed words, most frequent first."""
+    corpus = Corpus(seed, vocabulary_size=size)
+    counts = Counter(corpus.words(size * 10))
+    return counts.most_common()
+
+
+def misspell(generator: random.Random, word: str, edits: int) -> str:
+    """Make up to a number of random insertions, deletions, substitutions and swaps in a word."""
+    for _ in range(edits):
+        position = generator.randrange(len(word) + 1)
+        edit = generator.choice(["insert", "delete", "substitute", "swap"])
+        if edit == "insert" or len(word) < 2:
+            word = word[:position] + generator.choice(letters) + word[position:]
+        elif edit == "delete":
+            word = word[:position - 1] + word[position:] if position > 0 else word[1:]
+        elif edit == "substitute":
+            position = min(position, len(word) - 1)
+            word = word[:position] + generator.choice(letters) + word[position + 1:]
+        else:
+            position = min(position, len(word) - 2)
+            word = word[:position] + word[position + 1] + word[position] + word[position + 2:]
+    return word
+
+
+def brute_force(words: List[Tuple[str, int]], word: str, max_distance: int, n: Optional[int] = None) -> List[Tuple[str, int, int]]:
+    """Suggest spellings by computing the distance to every word."""
+    suggestions = []
+    for candidate, count in words:
+        candidate_distance = distance(word, candidate, max_distance)
+        if candidate_distance <= max_distance:
+            suggestions.append((candidate, candidate_distance, count))
+    suggestions.sort(key=lambda suggestion: (suggestion[1], -suggestion[2]))
+    return suggestions if n is None else suggestions[:n]
+
+
+def measure(name: str, queries: List[str], function: Callable[[str], List[Tuple[str, int, int]]]) -> List[List[Tuple[str, int, int]]]:
+    """Run a function for every query and report the time per query."""
+    start = time.perf_counter()
+    results = [function(query) for query in queries]
+    elapsed = time.perf_counter() - start
+    print("{:<12} {:>10.1f} µs/query {:>10.0f} queries/s".format(name, elapsed / len(queries) * 1e6, len(queries) / elapsed))
+    return results
+
+
+def main() -> None:
+    """Main entrypoint."""
+    # Create an argument parser for parsing CLI arguments
+    parser = ArgumentParser(description="A benchmark of spelling suggestions with a spelling index against computing the distance to every word")
+    parser.add_argument("-w", "--words", type=int, default=100000, required=False, help="The number of words to generate")
+    parser.add_argument("-q", "--queries", type=int, default=200, required=False, help="The number of misspelled words to look up")
+    parser.add_argument("-d", "--max-distance", type=int, default=2, required=False, help="The maximum edit distance of suggestions")
+    parser.add_argument("-n", "--suggestions", type=int, default=10, required=False, help="The number of suggestions per word, as served by the lookup server, 0 for all")
+    parser.add_argument("--seed", type=int, default=0, required=False, help="The seed of the generator")
+
+    # Parse the arguments
+    options = parser.parse_args()
+    n = options.suggestions if options.suggestions > 0 else None
+
+    words = generate_words(options.words, options.seed)
+    generator = random.Random(options.seed)
+    # Misspell words of the vocabulary rather than of a text, where most words are short and common and rarely misspelled
+    queries = [misspell(generator, word, generator.randint(0, options.max_distance)) for word, _ in generator.choices(words, k=options.queries)]
+
+    output_directory = tempfile.mkdtemp(prefix="benchmark-")
+    try:
+        start = time.perf_counter()
+        content = encode_index(words, options.max_distance)
+        store_binary(output_directory, "spelling-index.bin", content)
+        print("words={} index={:.1f} MB built in {:.2f}s\n".format(len(words), len(content) / 1e6, time.perf_counter() - start))
+
+        with SpellingIndex(path.join(output_directory, "spelling-index.bin")) as index:
+            indexed = measure("index", queries, lambda query: index.suggest(query, options.max_distance, n))
+            exact = measure("brute force", queries, lambda query: brute_force(words, query, options.max_distance, n))
+    finally:
+        shutil.rmtree(output_directory)
+
+    mismatches = sum(1 for a, b in zip(indexed, exact) if a != b)
+    print("\nqueries with different suggestions: {}".format(mismatches))
+
+
+if __name__ == '__main__':
+    main()
@@ -4,9 +4,8 @@
 python3 -m scripts.processing.download -l sv
 python3 -m scripts.processing.clean -l sv
 python3 -m scripts.processing.compile -l sv
-python3 -m scripts.processing.count -l sv
-python3 -m scripts.processing.ngram -l sv -n 3
-python3 -m scripts.processing.ngram -l sv -n 2
+python3 -m scripts.processing.merge -l sv
+python3 -m scripts.processing.ngram -l sv -n 2-3
 
 # The compiled source is not included due to potential licensing issues
 mkdir -p dist
@@ -1,16 +1,20 @@
 import logging
+import math
+import random
 from argparse import ArgumentParser
-from typing import Dict, List
-from os import path
+from typing import Dict, List, Tuple
+from os import path, replace
 
-# Requires numpy, keras, tensorflow and sklearn:
-# python3 -m pip install numpy keras tensorflow sklearn
+# Requires numpy, keras and tensorflow:
+# python3 -m pip install numpy keras tensorflow
 # May be slow at first start due to Python preparing the dependencies
 import numpy as np
-from keras.utils import to_categorical
+from numpy.lib.stride_tricks import sliding_window_view
+from keras.utils import Sequence
 from keras.models import Sequential
 from keras.layers import LSTM, Dense, GRU, Embedding
-from sklearn.model_selection import train_test_split
+
+from scripts.processing.lib.utils import stream
 
 # Configure the default logging format
 logging.basicConfig(
@@ -21,15 +25,124 @@ logging.basicConfig(
 
 logger = logging.getLogger(__name__)
 
-
-def create_sequences(corpus: str, length: int, token_map: Dict[str, int]) -> List[str]:
-    """Create sequences of text from sentences."""
-    sequences = []
-    for sentence in corpus.split("\n"):
-        for i in range(length, len(sentence)):
-            sequence = sentence[i-length:i+1]
-            sequences.append([token_map[character] for character in sequence])
-    return sequences
+# The number of characters preceding the character to predict
+sequence_length = 30
+
+
+def read_characters(filename: str) -> Tuple[List[str], int]:
+    """Read the characters used in sentences, with lines joined by spaces, along with the length of the corpus."""
+    characters = set()
+    size = 0
+    for chunk in stream(path.dirname(filename), path.basename(filename)):
+        characters.update(chunk)
+        size += len(chunk)
+    if "\n" in characters:
+        characters.remove("\n")
+        characters.add(" ")
+    return sorted(characters), size
+
+
+def encode_corpus(filename: str, output_filename: str, token_map: Dict[str, int], size: int) -> None:
+    """Encode a corpus as an array of character ids stored as .npy, where line endings are encoded as len(token_map).
+
+    The corpus is encoded a chunk at a time, directly into the memory-mapped array.
+    """
+    # The smallest type that fits every id, including that of line endings
+    dtype = np.uint8 if len(token_map) < 1 << 8 else np.uint16 if len(token_map) < 1 << 16 else np.uint32
+    ids = np.lib.format.open_memmap(output_filename + ".tmp", mode="w+", dtype=dtype, shape=(size,))
+    # Look up the ids of characters by their code point
+    table = np.zeros(max(ord(character) for character in list(token_map) + ["\n"]) + 1, dtype=dtype)
+    for character, index in token_map.items():
+        table[ord(character)] = index
+    table[ord("\n")] = len(token_map)
+
+    position = 0
+    for chunk in stream(path.dirname(filename), path.basename(filename)):
+        code_points = np.frombuffer(chunk.encode("utf-32-le"), dtype="<u4")
+        ids[position:position + len(code_points)] = table[code_points]
+        position += len(code_points)
+    ids.flush()
+    del ids
+    replace(output_filename + ".tmp", output_filename)
+
+
+def find_runs(ids: np.ndarray, start: int, end: int, separator: int, chunk_size: int = 1 << 24) -> Tuple[np.ndarray, np.ndarray]:
+    """Find the runs of consecutive starts between start and end of windows that are within a sentence.
+
+    Returns the first start of every run along with the cumulative number of windows preceding every run, ending with
+    the total number of windows. The ids are scanned a chunk at a time, so apart from a chunk only the two arrays are
+    in memory. They hold an integer per sentence long enough for a window, of 32 bits unless the corpus has 4G
+    characters or more, so they grow with the number of sentences rather than with the number of characters.
+    """
+    length = sequence_length + 1
+    stop = end + length - 1
+    dtype = np.uint32 if stop < 1 << 32 else np.uint64
+    firsts = []
+    cumulative = []
+    # The first start of the run that is still open at the end of a chunk, and the number of windows before it
+    first = start
+    total = 0
+    for chunk_start in range(start, stop, chunk_size):
+        separators = np.flatnonzero(ids[chunk_start:min(chunk_start + chunk_size, stop)] == separator) + chunk_start
+        # Every window starting between two separators, at least a window length before the latter, is within a sentence
+        chunk_firsts = np.concatenate(([first], separators + 1))
+        counts = separators - length - chunk_firsts[:-1] + 1
+        runs = counts > 0
+        counts = counts[runs]
+        firsts.append(chunk_firsts[:-1][runs].astype(dtype))
+        cumulative.append((np.cumsum(counts) - counts + total).astype(dtype))
+        total += int(counts.sum())
+        first = int(chunk_firsts[-1])
+    # The last run ends with the last start
+    if stop - length - first + 1 > 0:
+        firsts.append(np.array([first], dtype=dtype))
+        cumulative.append(np.array([total], dtype=dtype))
+        total += stop - length - first + 1
+    cumulative.append(np.array([total], dtype=dtype))
+    return np.concatenate(firsts) if firsts else np.empty(0, dtype=dtype), np.concatenate(cumulative)
+
+
+class Sequences(Sequence):
+    """Batches of the sequences of characters of an encoded corpus, which are the windows of sequence_length + 1
+    characters within a sentence, split into the characters and the id of the character following them.
+
+    Windows are read from a sliding window view of the ids, so only a batch at a time is in memory. Windows that cross
+    the end of a sentence are left out up front by indexing the runs of windows between separators, so every batch but
+    the last holds batch_size sequences. Windows are visited in a different random order every epoch, found by an
+    affine permutation of their index rather than by shuffling every start.
+    """
+
+    def __init__(self, ids: np.ndarray, start: int, end: int, batch_size: int, separator: int, shuffle: bool = True, seed: int = 42) -> None:
+        super().__init__()
+        self.windows = sliding_window_view(ids, sequence_length + 1)
+        self.firsts, self.cumulative = find_runs(ids, start, end, separator)
+        self.size = int(self.cumulative[-1])
+        self.batch_size = batch_size
+        self.shuffle = shuffle
+        self.generator = random.Random(seed)
+        self.multiplier, self.offset = 1, 0
+        self.on_epoch_end()
+
+    def __len__(self) -> int:
+        return math.ceil(self.size / self.batch_size)
+
+    def __getitem__(self, index: int) -> Tuple[np.ndarray, np.ndarray]:
+        positions = np.arange(index * self.batch_size, min((index + 1) * self.batch_size, self.size), dtype=np.int64)
+        # Map every position onto the index of a window, and the index onto the start of the window within its run
+        # The indices have the type of the runs, so that they are not converted for every search
+        indices = ((self.multiplier * positions + self.offset) % self.size).astype(self.cumulative.dtype)
+        runs = np.searchsorted(self.cumulative, indices, side="right") - 1
+        windows = self.windows[self.firsts[runs] + (indices - self.cumulative[runs])]
+        return windows[:, :-1].astype(np.int32), windows[:, -1].astype(np.int32)
+
+    def on_epoch_end(self) -> None:
+        if not self.shuffle or self.size < 2:
+            return
+        # Any multiplier coprime with the size maps the positions one to one onto the starts
+        self.multiplier = self.generator.randrange(1, self.size)
+        while math.gcd(self.multiplier, self.size) != 1:
+            self.multiplier = self.generator.randrange(1, self.size)
+        self.offset = self.generator.randrange(self.size)
 
 
 def main() -> None:
@@ -39,60 +152,52 @@ def main() -> None:
 
     # Add parameters for the server connection
     parser.add_argument("-i", "--input", required=True, type=str, help="The input file to read sentences from")
-    parser.add_argument("-t", "--training-data", required=True, type=str, help="The input file to read training data from")
+    parser.add_argument("-t", "--training-data", required=True, type=str, help="The .npy file to store the encoded corpus in and read it from")
     parser.add_argument("-o", "--output", required=True, type=str, help="The output file to serialize the model to")
+    parser.add_argument("-b", "--batch-size", type=int, default=32, required=False, help="The maximum number of sequences per batch")
 
     # Parse the arguments
     options = parser.parse_args()
 
-    # Read the corpus
-    logger.info("Loading corpus")
-    corpus = None
-    with open(options.input, "r") as file:
-        corpus = file.read()
-
-    # Create a token map of the words
+    # Create a token map of the characters
     logger.info("Creating token map")
-    characters = sorted(list(set(" ".join(corpus.split("\n")))))
+    characters, size = read_characters(options.input)
     token_map = dict((character, index) for index, character in enumerate(characters))
     logger.info("%d tokens mapped", len(token_map))
 
-    training_data = None
-    if path.exists(options.training_data):
-        logger.info("Reading training data")
-        with open(options.training_data, "rb") as file:
-            training_data = np.load(file)
-    else:
-        # Create sequences
-        logger.info("Creating input sequences")
-        training_data = np.array(create_sequences(corpus, 30, token_map))
-
-        # Serialize the training data if specified
-        logger.info("Storing training data")
-        with open(options.training_data, "wb") as file:
-            np.save(file, training_data)
-
-    # Create training and validation sets
+    if not path.exists(options.training_data):
+        # Encode the corpus once, after which it is reused as is
+        logger.info("Encoding corpus characters=%d", size)
+        encode_corpus(options.input, options.training_data, token_map, size)
+
+    logger.info("Reading training data")
+    training_data = np.load(options.training_data, mmap_mode="r")
+    if training_data.ndim != 1:
+        raise ValueError("Not an encoded corpus: {}".format(options.training_data))
+
+    # Create training and validation sets, validating on the last tenth of the corpus
     vocabulary_size = len(token_map)
-    X, y = training_data[:,:-1], training_data[:,-1]
-    y = to_categorical(y, num_classes=vocabulary_size)
-    X_tr, X_val, y_tr, y_val = train_test_split(X, y, test_size=0.1, random_state=42)
-    print('Train shape:', X_tr.shape, 'Val shape:', X_val.shape)
+    windows = max(len(training_data) - sequence_length, 0)
+    split = windows - windows // 10
+    training = Sequences(training_data, 0, split, options.batch_size, vocabulary_size)
+    validation = Sequences(training_data, split, windows, options.batch_size, vocabulary_size, shuffle=False)
+    print('Train batches:', len(training), 'Val batches:', len(validation))
 
     # Create the model
     model = Sequential()
-    model.add(Embedding(vocabulary_size, 50, input_length=30, trainable=True))
+    model.add(Embedding(vocabulary_size, 50, input_length=sequence_length, trainable=True))
     model.add(GRU(150, recurrent_dropout=0.1, dropout=0.1))
     model.add(Dense(vocabulary_size, activation='softmax'))
     print(model.summary())
 
     # Compile the model
     logger.info("Compiling model")
-    model.compile(loss='categorical_crossentropy', metrics=['acc'], optimizer='adam')
+    # Targets are the ids of characters rather than one-hot vectors of the size of the vocabulary
+    model.compile(loss='sparse_categorical_crossentropy', metrics=['acc'], optimizer='adam')
 
     # Train the model
     logger.info("Training model")
-    model.fit(X_tr, y_tr, epochs=100, verbose=2, validation_data=(X_val, y_val))
+    model.fit(training, epochs=100, verbose=2, validation_data=validation)
 
     # Serialize the model
     logger.info("Serializing model")
@@ -0,0 +1,322 @@
+import math
+import mmap
+import random
+import struct
+import sys
+from array import array
+from bisect import bisect
+from itertools import accumulate
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple, Union
+from os import replace
+
+# Requires numpy:
+# python3 -m pip install numpy
+import numpy as np
+
+# A model is stored as a header followed by fixed-width arrays and a blob of words, so that it can be memory-mapped.
+# Words are sorted bytewise and identified by their index. All integers are little-endian.
+#
+# header          magic, version, order of the model (k), number of words (n), size of the word blob
+# sizes           uint64[k], number of unique n-grams of each order (m)
+# offsets         uint64[n + 1], offset of each word in the blob
+# for each order from 1 to k:
+#   counts        uint64[m + 1], cumulative count of the n-grams
+#   grams         uint32[order * m], the n-grams sorted by their words, one row per position, padded to 8 bytes
+# blob            the UTF-8 encoded words
+header_format = "<4sIQQQ"
+header_size = struct.calcsize(header_format)
+magic = b"WLM\x00"
+version = 1
+
+# The labels NLTK pads sentences with
+start_label = "<s>"
+end_label = "</s>"
+
+# The number of tokens counted at a time while training, which bounds the memory used for counting
+default_chunk_size = 1 << 22
+
+
+def pad(tokens: List[str], order: int) -> List[str]:
+    """Pad a sentence on both ends like nltk.lm.preprocessing.pad_both_ends."""
+    return [start_label] * (order - 1) + tokens + [end_label] * (order - 1)
+
+
+def unique_columns(grams: np.ndarray, counts: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Sum the counts of equal n-grams, given as the columns of an array of shape (order, m). The n-grams are sorted by their ids."""
+    order, size = grams.shape
+    base = int(grams.max()) + 1 if size else 1
+    if base ** order >= 1 << 64:
+        # Too many words to pack an n-gram into a single integer
+        grams, inverse = np.unique(grams, axis=1, return_inverse=True)
+        summed = np.zeros(grams.shape[1], dtype=np.uint64)
+        np.add.at(summed, inverse.ravel(), counts)
+        return grams, summed
+    # Pack each n-gram into an integer with its first word the most significant, which sorts like the n-grams themselves
+    keys = np.zeros(size, dtype=np.uint64)
+    for row in grams:
+        keys = keys * np.uint64(base) + row.astype(np.uint64)
+    order_by_key = np.argsort(keys, kind="stable")
+    keys = keys[order_by_key]
+    starts = np.flatnonzero(np.concatenate([[True], keys[1:] != keys[:-1]])) if size else np.zeros(0, dtype=np.int64)
+    summed = np.add.reduceat(counts[order_by_key], starts) if size else np.zeros(0, dtype=np.uint64)
+    return grams[:, order_by_key[starts]], summed.astype(np.uint64)
+
+
+def count_everygrams(tokens: np.ndarray, ends: np.ndarray, order: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Count the n-grams of a single order of concatenated sentences, given the end of the sentence of each token.
+
+    Returns the unique n-grams as an array of shape (order, m) sorted by their ids, along with their counts.
+    """
+    # Only windows that end within the sentence they start in are n-grams
+    starts = np.flatnonzero(np.arange(len(tokens)) + order <= ends)
+    grams = np.stack([tokens[starts + i] for i in range(order)])
+    return unique_columns(grams, np.ones(grams.shape[1], dtype=np.uint64))
+
+
+def merge_counts(a: Tuple[np.ndarray, np.ndarray], b: Tuple[np.ndarray, np.ndarray]) -> Tuple[np.ndarray, np.ndarray]:
+    """Merge two sets of counted n-grams of the same order."""
+    return unique_columns(np.concatenate([a[0], b[0]], axis=1), np.concatenate([a[1], b[1]]))
+
+
+def count_sentences(sentences: Iterable[List[str]], order: int, chunk_size: int = default_chunk_size) -> Tuple[List[str], Dict[int, Tuple[np.ndarray, np.ndarray]]]:
+    """Count the padded everygrams of tokenized sentences like nltk.lm.preprocessing.padded_everygram_pipeline.
+
+    Sentences are counted in chunks of about chunk_size tokens. Returns the words sorted bytewise and, for each order,
+    the unique n-grams of word indices as an array of shape (order, m) along with their counts.
+    """
+    words = [start_label, end_label]
+    ids = {start_label: 0, end_label: 1}
+    counted: Dict[int, Tuple[np.ndarray, np.ndarray]] = {}
+
+    def count_chunk(tokens: array, lengths: array) -> None:
+        token_array = np.frombuffer(tokens, dtype=np.uint32)
+        # The end of the sentence of every token
+        ends = np.repeat(np.cumsum(np.frombuffer(lengths, dtype=np.uint32), dtype=np.int64), np.frombuffer(lengths, dtype=np.uint32))
+        for n in range(1, order + 1):
+            chunk = count_everygrams(token_array, ends, n)
+            counted[n] = chunk if n not in counted else merge_counts(counted[n], chunk)
+
+    # Ids are buffered in arrays rather than lists, which would hold an object for every token
+    tokens = array("I")
+    lengths = array("I")
+    for sentence in sentences:
+        padded = pad(sentence, order)
+        for word in padded:
+            if word not in ids:
+                ids[word] = len(words)
+                words.append(word)
+            tokens.append(ids[word])
+        lengths.append(len(padded))
+        if len(tokens) >= chunk_size:
+            count_chunk(tokens, lengths)
+            tokens, lengths = array("I"), array("I")
+    if tokens or not counted:
+        count_chunk(tokens, lengths)
+
+    # Renumber the words in bytewise order, so that words can be found by bisection and n-grams sort like their words
+    encoded = [word.encode("utf-8") for word in words]
+    sorted_ids = sorted(range(len(words)), key=encoded.__getitem__)
+    renumbered = np.zeros(len(words), dtype=np.uint32)
+    renumbered[sorted_ids] = np.arange(len(words), dtype=np.uint32)
+    for n in counted:
+        counted[n] = unique_columns(renumbered[counted[n][0]], counted[n][1])
+    return [words[index] for index in sorted_ids], counted
+
+
+def store_model(filename: str, words: List[str], counted: Dict[int, Tuple[np.ndarray, np.ndarray]]) -> int:
+    """Store counted n-grams as a model. Returns the size of the model."""
+    order = len(counted)
+    encoded = [word.encode("utf-8") for word in words]
+    offsets = np.zeros(len(encoded) + 1, dtype="<u8")
+    np.cumsum([len(word) for word in encoded], out=offsets[1:])
+    blob = b"".join(encoded)
+
+    # Write the arrays one at a time rather than joining them into a single copy of the model
+    with open(filename + ".tmp", "wb") as file:
+        file.write(struct.pack(header_format, magic, version, order, len(words), len(blob)))
+        np.array([counted[n][0].shape[1] for n in range(1, order + 1)], dtype="<u8").tofile(file)
+        offsets.tofile(file)
+        for n in range(1, order + 1):
+            grams, counts = counted[n]
+            cumulative_counts = np.zeros(len(counts) + 1, dtype="<u8")
+            np.cumsum(counts, out=cumulative_counts[1:])
+            cumulative_counts.tofile(file)
+            np.ascontiguousarray(grams, dtype="<u4").tofile(file)
+            if grams.size % 2:
+                file.write(bytes(4))
+        file.write(blob)
+        size = file.tell()
+    replace(filename + ".tmp", filename)
+    return size
+
+
+def log2(score: float) -> float:
+    """Get the base 2 logarithm of a score, -inf for a score of zero like NLTK."""
+    return float("-inf") if score == 0.0 else math.log(score, 2)
+
+
+def perplexity(logscores: List[float]) -> float:
+    """Get the perplexity of a text from the logscores of its words."""
+    return pow(2.0, -1 * math.fsum(logscores) / len(logscores))
+
+
+class NgramModel:
+    """A read-only, memory-mapped maximum likelihood n-gram language model, scoring like nltk.lm.MLE trained with
+    padded_everygram_pipeline.
+
+    The n-grams of each order are stored as a sorted array of shape (order, m), one row per position, along with their
+    cumulative counts, so that the n-grams starting with a context are a range found by bisecting one row at a time.
+    Only the parts of the model used by a lookup are read.
+    """
+
+    def __init__(self, filename: str) -> None:
+        self.file = open(filename, "rb")
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        file_magic, file_version, self.order, self.size, blob_size = struct.unpack_from(header_format, self.map)
+        if file_magic != magic or file_version != version:
+            self.close()
+            raise ValueError("Not an n-gram model: {}".format(filename))
+
+        # The arrays are used in place, without reading them into memory
+        start = header_size
+        sizes, start = self.section(start, "<u8", self.order)
+        offsets, start = self.section(start, "<u8", self.size + 1)
+        # Offsets are read one at a time while bisecting, which is faster from a memoryview than from an array
+        self.view = memoryview(self.map)
+        self.offsets = self.view[start - offsets.nbytes:start].cast("Q") if sys.byteorder == "little" else offsets.tolist()
+        self.grams: Dict[int, np.ndarray] = {}
+        self.cumulative_counts: Dict[int, np.ndarray] = {}
+        for n, m in enumerate(sizes.tolist(), 1):
+            self.cumulative_counts[n], start = self.section(start, "<u8", m + 1)
+            grams, start = self.section(start, "<u4", n * m)
+            self.grams[n] = grams.reshape(n, m)
+            start += 4 * (n * m % 2)
+        self.blob = start
+
+    def section(self, start: int, dtype: str, length: int) -> Tuple[np.ndarray, int]:
+        """Get an array from the model along with the offset following it."""
+        values = np.frombuffer(self.map, dtype=dtype, count=length, offset=start)
+        return values, start + values.nbytes
+
+    def word(self, index: int) -> str:
+        """Get the word at an index."""
+        return self.map[self.blob + self.offsets[index]:self.blob + self.offsets[index + 1]].decode("utf-8")
+
+    def index(self, word: str) -> int:
+        """Find the index of a word using binary search. Returns -1 for unknown words, which are never counted, like
+        those masked as unknown by NLTK."""
+        encoded = word.encode("utf-8")
+        low, high = 0, self.size
+        while low < high:
+            middle = (low + high) // 2
+            if self.map[self.blob + self.offsets[middle]:self.blob + self.offsets[middle + 1]] < encoded:
+                low = middle + 1
+            else:
+                high = middle
+        if low < self.size and self.word(low) == word:
+            return low
+        return -1
+
+    def lookup(self, words: Sequence[str]) -> Tuple[int, ...]:
+        """Get the indices of words."""
+        return tuple(self.index(word) for word in words)
+
+    def narrow(self, n: int, position: int, index: int, low: int, high: int) -> Tuple[int, int]:
+        """Narrow a range of the n-grams of an order, which share their words up to a position, to those with a word at the position."""
+        if index < 0 or low == high:
+            return low, low
+        row = self.grams[n][position, low:high]
+        # A key of another type than the row would convert the whole row
+        key = row.dtype.type(index)
+        return low + int(row.searchsorted(key, "left")), low + int(row.searchsorted(key, "right"))
+
+    def find(self, ids: Tuple[int, ...], n: int) -> Tuple[int, int]:
+        """Find the range of the n-grams of an order that start with ids."""
+        low, high = 0, self.grams[n].shape[1]
+        for position, index in enumerate(ids):
+            low, high = self.narrow(n, position, index, low, high)
+        return low, high
+
+    def score_ids(self, index: int, context_ids: Tuple[int, ...]) -> float:
+        """Get the probability of the word at an index following the words at context indices."""
+        # The followers of a context are counted among the n-grams one longer than it
+        n = len(context_ids) + 1
+        if n > self.order:
+            return 0.0
+        cumulative_counts = self.cumulative_counts[n]
+        low, high = self.find(context_ids, n)
+        total = int(cumulative_counts[high]) - int(cumulative_counts[low])
+        if total == 0:
+            return 0.0
+        low, high = self.narrow(n, n - 1, index, low, high)
+        return (int(cumulative_counts[high]) - int(cumulative_counts[low])) / total
+
+    def score(self, word: str, context: Optional[Sequence[str]] = None) -> float:
+        """Get the probability of a word following a context, the same as that of nltk.lm.MLE."""
+        return self.score_ids(self.index(word), self.lookup(context) if context else ())
+
+    def logscore(self, word: str, context: Optional[Sequence[str]] = None) -> float:
+        """Get the base 2 logarithm of the probability of a word following a context, the same as that of nltk.lm.MLE."""
+        return log2(self.score(word, context))
+
+    def followers(self, context: Sequence[str]) -> Tuple[List[str], List[int]]:
+        """Get the words seen following a context along with how often, sorted by the words."""
+        context_ids = self.lookup(context)
+        n = len(context_ids) + 1
+        if n > self.order:
+            return [], []
+        low, high = self.find(context_ids, n)
+        counts = np.diff(self.cumulative_counts[n][low:high + 1]).tolist()
+        return [self.word(index) for index in self.grams[n][n - 1, low:high].tolist()], counts
+
+    def generate(self, num_words: int = 1, text_seed: Optional[List[str]] = None,
+                 random_seed: Union[int, random.Random, None] = None) -> Union[str, List[str]]:
+        """Generate words following a text, the same as nltk.lm.MLE given the same seed."""
+        text_seed = [] if text_seed is None else list(text_seed)
+        generator = random_seed if isinstance(random_seed, random.Random) else random.Random(random_seed)
+        if num_words == 1:
+            context = text_seed[-self.order + 1:] if len(text_seed) >= self.order else text_seed
+            samples, counts = self.followers(context)
+            # Back off to shorter contexts until a word has been seen following one
+            while context and not samples:
+                context = context[1:] if len(context) > 1 else []
+                samples, counts = self.followers(context)
+            total = sum(counts)
+            # Words are numbered in bytewise order, which is the order of their code points, so samples are already sorted
+            weights = [count / total for count in counts]
+            return samples[bisect(list(accumulate(weights)), math.fsum(weights) * generator.random())]
+        generated = []
+        for _ in range(num_words):
+            generated.append(self.generate(1, text_seed + generated, generator))
+        return generated
+
+    def sentence_logscores(self, words: List[str]) -> List[float]:
+        """Get the logscore of every word of a padded sentence given the words before it, as scored by nltk.lm.MLE.perplexity."""
+        # Every word is looked up once rather than once for every n-gram it is in
+        ids = self.lookup(pad(words, self.order))
+        return [log2(self.score_ids(ids[i], ids[i - self.order + 1:i])) for i in range(self.order - 1, len(ids))]
+
+    def perplexity(self, words: List[str]) -> float:
+        """Get the perplexity of a sentence, the same as nltk.lm.MLE.perplexity of its padded n-grams."""
+        return perplexity(self.sentence_logscores(words))
+
+    def __len__(self) -> int:
+        return self.size
+
+    def __enter__(self) -> "NgramModel":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """Close the model."""
+        # The map cannot be closed while arrays refer to it
+        for values in [getattr(self, "offsets", None), getattr(self, "view", None)]:
+            if isinstance(values, memoryview):
+                values.release()
+        self.offsets = None
+        self.grams = {}
+        self.cumulative_counts = {}
+        self.map.close()
+        self.file.close()
@@ -1,19 +1,18 @@
-import pickle
+import math
 import random
+import sys
 from argparse import ArgumentParser
+from typing import Iterator, TextIO
 
-# Requires NLTK to be installed:
-# python3 -m pip install nltk
-# python3 -c 'import nltk;nltk.download("punkt")'
-# May be slow at first start due to NLTK preparing its dependencies
-from nltk.tokenize.treebank import TreebankWordDetokenizer
-from nltk.lm import MLE
+from scripts.ai.mle.model import NgramModel, perplexity
 
 
-detokenize = TreebankWordDetokenizer().detokenize
+def generate_sentence(model: NgramModel, length: int, seed=random.randint(0, 1e10)):
+    # Requires NLTK to be installed:
+    # python3 -m pip install nltk
+    # Imported when generating only, as NLTK is slow to import compared to scoring with a memory-mapped model
+    from nltk.tokenize.treebank import TreebankWordDetokenizer
 
-
-def generate_sentence(model: MLE, length: int, seed=random.randint(0, 1e10)):
     content = []
     for token in model.generate(length, random_seed=seed):
         if token == '<s>':
@@ -21,7 +20,35 @@ def generate_sentence(model: MLE, length: int, seed=random.randint(0, 1e10)):
         if token == '</s>':
             break
         content.append(token)
-    return detokenize(content)
+    return TreebankWordDetokenizer().detokenize(content)
+
+
+def read_lines(filename: str) -> Iterator[str]:
+    """Read the non-empty lines of a file, or of stdin if the filename is -."""
+    file: TextIO = sys.stdin if filename == "-" else open(filename, "r")
+    try:
+        for line in file:
+            line = line.rstrip("\n")
+            if line.strip():
+                yield line
+    finally:
+        if file is not sys.stdin:
+            file.close()
+
+
+def score_pairs(model: NgramModel, lines: Iterator[str]) -> None:
+    """Print the logscore of every line of a word and its context, separated by a tab."""
+    for line in lines:
+        word, _, context = line.partition("\t")
+        print("{}\t{}\t{}".format(word, context, model.logscore(word, context.split())))
+
+
+def score_sentences(model: NgramModel, lines: Iterator[str]) -> None:
+    """Print the total logscore and the perplexity of every line of a sentence."""
+    for line in lines:
+        words = line.lower().split()
+        logscores = model.sentence_logscores(words)
+        print("{}\t{}\t{}".format(math.fsum(logscores), perplexity(logscores), line))
 
 
 def main() -> None:
@@ -31,18 +58,28 @@ def main() -> None:
 
     # Add parameters for the server connection
     parser.add_argument("-i", "--input", required=True, type=str, help="The serialized model previously trained")
-    parser.add_argument("-w", "--word", required=True, type=str, help="The word to check the probability for")
-    parser.add_argument("-c", "--context", required=True, type=str, help="The context / sentence for the word")
+    parser.add_argument("-w", "--word", type=str, required=False, help="The word to check the probability for")
+    parser.add_argument("-c", "--context", type=str, required=False, help="The context / sentence for the word")
+    parser.add_argument("-p", "--pairs", type=str, required=False,
+                        help="Score the words of a file of a word and its context per line, separated by a tab. Use - for stdin")
+    parser.add_argument("-s", "--sentences", type=str, required=False,
+                        help="Score the sentences of a file of a sentence per line, printing their logscore and perplexity. Use - for stdin")
 
     # Parse the arguments
     options = parser.parse_args()
 
-    model = None
-    with open(options.input, "rb") as file:
-        model = pickle.load(file)
+    if options.pairs is None and options.sentences is None and (options.word is None or options.context is None):
+        parser.error("Either a word and its context, pairs or sentences are required")
+
+    with NgramModel(options.input) as model:
+        if options.pairs is not None:
+            score_pairs(model, read_lines(options.pairs))
+        if options.sentences is not None:
+            score_sentences(model, read_lines(options.sentences))
+        if options.word is not None and options.context is not None:
+            print(model.logscore(options.word, options.context.split()))
+            print(generate_sentence(model, 10))
 
-    print(model.logscore(options.word, options.context.split()))
-    print(generate_sentence(model, 10))
 
 if __name__ == '__main__':
     main()
@@ -1,13 +1,18 @@
-import pickle
+import logging
 from argparse import ArgumentParser
+from os import path
 
-# Requires NLTK to be installed:
-# python3 -m pip install nltk
-# python3 -c 'import nltk;nltk.download("punkt")'
-# May be slow at first start due to Python preparing the dependencies
-from nltk import word_tokenize, sent_tokenize
-from nltk.lm.preprocessing import padded_everygram_pipeline
-from nltk.lm import MLE
+from scripts.ai.mle.model import count_sentences, default_chunk_size, store_model
+from scripts.processing.lib.utils import stream_lines
+
+# Configure the default logging format
+logging.basicConfig(
+    format="[%(asctime)s] [%(name)s] [%(levelname)-5s] %(message)s",
+    level=logging.INFO,
+    datefmt="%Y-%m-%d %H:%M:%S"
+)
+
+logger = logging.getLogger(__name__)
 
 
 def main() -> None:
@@ -16,32 +21,24 @@ def main() -> None:
     parser = ArgumentParser(description="A tool to train an AI to predict the probability of a word in a sentence")
 
     # Add parameters for the server connection
-    parser.add_argument("-i", "--input", required=True, type=str, help="The input file to read from")
+    parser.add_argument("-i", "--input", required=True, type=str, help="The compiled text to read from, one sentence per line")
     parser.add_argument("-o", "--output", required=True, type=str, help="The output file to serialize the model to")
-    parser.add_argument("-l", "--language", required=True, type=str, help="The name of the language to use")
+    parser.add_argument("-n", "--order", type=int, default=3, required=False, help="The n-gram size of the model")
+    parser.add_argument("--chunk-size", type=int, default=default_chunk_size, required=False, help="The number of tokens to count at a time")
 
     # Parse the arguments
     options = parser.parse_args()
 
-    # Read and extract tokens
-    tokens = []
-    with open(options.input, "r") as file:
-        raw_text = file.read()
-        # Tokenize the text.
-        tokens = [list(map(str.lower, word_tokenize(sentence))) for sentence in sent_tokenize(raw_text, language=options.language)]
-
-    # n-gram size (trigram)
-    n = 3
-
-    # Prepare train data
-    train_data, padded_sentences = padded_everygram_pipeline(n, tokens)
+    # Compiled text is cleaned and lowercased with one sentence per line, so it is tokenized like when counting n-grams
+    lines = stream_lines(path.dirname(options.input), path.basename(options.input))
+    sentences = (line.split() for line in lines if line.strip())
 
-    # Train a Maximum Likelihood Estimation (MLE) model
-    model = MLE(n)
-    model.fit(train_data, padded_sentences)
+    logger.info("Training model order=%d", options.order)
+    words, counted = count_sentences(sentences, options.order, options.chunk_size)
+    logger.info("Trained model words=%d %s", len(words), " ".join("{}-grams={}".format(n, counted[n][0].shape[1]) for n in counted))
 
-    with open(options.output, "wb") as file:
-        pickle.dump(model, file)
+    size = store_model(options.output, words, counted)
+    logger.info("Stored model size=%d", size)
 
 
 if __name__ == '__main__':
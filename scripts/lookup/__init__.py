@@ -0,0 +1 @@
+__package__ = "lookup"
@@ -0,0 +1,241 @@
+import heapq
+import logging
+import mmap
+import struct
+import sys
+from argparse import ArgumentParser
+from array import array
+from bisect import bisect_left
+from typing import List, Optional, Tuple
+from os import path
+
+from scripts.lookup.spelling import load_words
+from scripts.processing.lib.utils import store_binary
+
+# Configure the default logging format
+logging.basicConfig(
+    format="[%(asctime)s] [%(name)s] [%(levelname)-5s] %(message)s",
+    level=logging.INFO,
+    datefmt="%Y-%m-%d %H:%M:%S"
+)
+
+logger = logging.getLogger(__name__)
+
+# A completion index is a trie of words stored as a header followed by fixed-width arrays and a blob of words.
+# Words are ordered by the most frequent first and nodes in depth-first order, the root first.
+# The edges of a node are sorted by their character. All integers are little-endian.
+#
+# header          magic, version, maximum number of completions per node (k), number of words (n),
+#                 size of the word blob, number of nodes (m), number of edges (e), number of completions (c)
+# offsets         uint64[n + 1], offset of each word in the blob
+# counts          uint64[n], count of each word
+# labels          uint32[e], code point of the character of each edge
+# targets         uint32[e], node each edge leads to
+# edges           uint32[m], index of the first edge of each node
+# edge_counts     uint32[m], number of edges of each node
+# completions     uint32[m], index of the first completion of each node
+# words           uint32[c], index of the word of each completion, most frequent first
+# completion_counts uint8[m], number of completions of each node
+# blob            the UTF-8 encoded words
+header_format = "<4sIQQQQQQ"
+header_size = struct.calcsize(header_format)
+magic = b"WAC\x00"
+version = 1
+
+
+def encode_index(words: List[Tuple[str, int]], k: int = 10) -> bytes:
+    """Encode a completion index of words, given with their counts by the most frequent first."""
+    if not 0 < k < 256:
+        raise ValueError("Invalid number of completions: {}".format(k))
+    labels = array("I")
+    targets = array("I")
+    edges = array("I")
+    edge_counts = array("I")
+    completions = array("I")
+    completion_words = array("I")
+    completion_counts = array("B")
+
+    def add_node() -> int:
+        for values in [edges, edge_counts, completions, completion_counts]:
+            values.append(0)
+        return len(edges) - 1
+
+    def close_node(node: int, children: List[Tuple[str, int]], candidates: List[int]) -> List[int]:
+        """Store the edges and completions of a node once all of its descendants are known. Returns its completions."""
+        edges[node] = len(labels)
+        edge_counts[node] = len(children)
+        for character, child in children:
+            labels.append(ord(character))
+            targets.append(child)
+        if len(children) == 1 and candidates == closed[children[0][1]]:
+            # A node with a single child and no word of its own completes to the same words, so they are shared
+            completions[node] = completions[children[0][1]]
+            completion_counts[node] = completion_counts[children[0][1]]
+            return candidates
+        top = heapq.nsmallest(k, candidates)
+        completions[node] = len(completion_words)
+        completion_counts[node] = len(top)
+        completion_words.extend(top)
+        return top
+
+    # Words sorted by their characters are visited in depth-first order of the trie. Each open node on the stack
+    # holds its depth, its children and the candidates for its completions, the completions of its children
+    order = sorted(range(len(words)), key=lambda index: words[index][0])
+    closed = {}
+    stack: List[Tuple[int, int, List[Tuple[str, int]], List[int]]] = [(add_node(), 0, [], [])]
+    previous = ""
+    for index in order:
+        word = words[index][0]
+        common = 0
+        while common < min(len(previous), len(word)) and previous[common] == word[common]:
+            common += 1
+        while stack[-1][1] > common:
+            node, _, children, candidates = stack.pop()
+            closed[node] = close_node(node, children, candidates)
+            stack[-1][3].extend(closed[node])
+            # The completions of grandchildren are no longer needed
+            for _, child in children:
+                del closed[child]
+        for depth in range(common, len(word)):
+            node = add_node()
+            stack[-1][2].append((word[depth], node))
+            stack.append((node, depth + 1, [], []))
+        stack[-1][3].append(index)
+        previous = word
+    while stack:
+        node, _, children, candidates = stack.pop()
+        closed[node] = close_node(node, children, candidates)
+        if stack:
+            stack[-1][3].extend(closed[node])
+
+    encoded_words = [word.encode("utf-8") for word, _ in words]
+    offsets = array("Q", [0])
+    for word in encoded_words:
+        offsets.append(offsets[-1] + len(word))
+    counts = array("Q", (count for _, count in words))
+
+    arrays = [offsets, counts, labels, targets, edges, edge_counts, completions, completion_words, completion_counts]
+    if sys.byteorder != "little":
+        for values in arrays:
+            values.byteswap()
+
+    blob = b"".join(encoded_words)
+    header = struct.pack(header_format, magic, version, k, len(words), len(blob), len(edges), len(labels), len(completion_words))
+    return header + b"".join(values.tobytes() for values in arrays) + blob
+
+
+class CompletionIndex:
+    """A read-only, memory-mapped trie of words where every node stores the most frequent words starting with its prefix.
+
+    Completing a prefix walks one edge per character and reads the stored completions, without visiting other words.
+    """
+
+    def __init__(self, filename: str) -> None:
+        self.file = open(filename, "rb")
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        file_magic, file_version, self.k, self.size, blob_size, node_count, edge_count, completion_count = \
+            struct.unpack_from(header_format, self.map)
+        if file_magic != magic or file_version != version:
+            self.close()
+            raise ValueError("Not a completion index: {}".format(filename))
+
+        # The arrays are used in place, without reading them into memory
+        self.view = memoryview(self.map)
+        start = header_size
+        self.offsets, start = self.section(start, "Q", self.size + 1)
+        self.counts, start = self.section(start, "Q", self.size)
+        self.labels, start = self.section(start, "I", edge_count)
+        self.targets, start = self.section(start, "I", edge_count)
+        self.edges, start = self.section(start, "I", node_count)
+        self.edge_counts, start = self.section(start, "I", node_count)
+        self.completions, start = self.section(start, "I", node_count)
+        self.words, start = self.section(start, "I", completion_count)
+        self.completion_counts, start = self.section(start, "B", node_count)
+        self.blob = start
+
+    def section(self, start: int, typecode: str, length: int) -> Tuple[memoryview, int]:
+        """Get an array from the index along with the offset following it."""
+        end = start + struct.calcsize(typecode) * length
+        values = self.view[start:end].cast(typecode)
+        if sys.byteorder != "little":
+            values = array(typecode, values)
+            values.byteswap()
+        return values, end
+
+    def word(self, index: int) -> str:
+        """Get the word at an index."""
+        return self.map[self.blob + self.offsets[index]:self.blob + self.offsets[index + 1]].decode("utf-8")
+
+    def find(self, prefix: str) -> int:
+        """Find the node of a prefix. Returns -1 if no word starts with the prefix."""
+        node = 0
+        for character in prefix:
+            low = self.edges[node]
+            high = low + self.edge_counts[node]
+            edge = bisect_left(self.labels, ord(character), low, high)
+            if edge == high or self.labels[edge] != ord(character):
+                return -1
+            node = self.targets[edge]
+        return node
+
+    def complete(self, prefix: str, n: Optional[int] = None) -> List[Tuple[str, int]]:
+        """Get up to n of the most frequent words starting with a prefix, along with their frequency. At most k are stored."""
+        node = self.find(prefix)
+        if node < 0:
+            return []
+        start = self.completions[node]
+        end = start + min(self.completion_counts[node], self.k if n is None else n)
+        return [(self.word(index), self.counts[index]) for index in self.words[start:end]]
+
+    def __len__(self) -> int:
+        return self.size
+
+    def __enter__(self) -> "CompletionIndex":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """Close the index."""
+        for name in ["offsets", "counts", "labels", "targets", "edges", "edge_counts", "completions", "words", "completion_counts", "view"]:
+            values = getattr(self, name, None)
+            if isinstance(values, memoryview):
+                values.release()
+        self.map.close()
+        self.file.close()
+
+
+def build_index(output_directory: str, language: str, k: int = 10, min_count: int = 1) -> None:
+    """Build the completion index of the compiled word frequencies of a language."""
+    words = load_words(output_directory, language, min_count)
+    logger.info("Indexing words=%d k=%d", len(words), k)
+    content = encode_index(words, k)
+    store_binary(output_directory, "compiled/{}/completion-index.bin".format(language), content)
+    logger.info("Stored completion index size=%d", len(content))
+
+
+def main() -> None:
+    """Main entrypoint."""
+    # Create an argument parser for parsing CLI arguments
+    parser = ArgumentParser(description="A tool to build an autocomplete index of the compiled word frequencies of a language and complete prefixes with it")
+    parser.add_argument("-l", "--language", required=True, type=str, help="The two letter language code for the language to index")
+    parser.add_argument("-c", "--cache", type=str, default="./frequency-data", required=False, help="The cache directory to use")
+    parser.add_argument("-k", type=int, default=10, required=False, help="The number of completions to store for each prefix")
+    parser.add_argument("-m", "--min-count", type=int, default=1, required=False, help="The minimum number of occurrences for a word to be completed")
+    parser.add_argument("--complete", nargs="+", default=None, required=False, help="Complete prefixes with an existing index instead of building one")
+
+    # Parse the arguments
+    options = parser.parse_args()
+
+    if options.complete is None:
+        build_index(options.cache, options.language, options.k, options.min_count)
+        return
+
+    with CompletionIndex(path.join(options.cache, "compiled/{}/completion-index.bin".format(options.language))) as index:
+        for prefix in options.complete:
+            print("{}: {}".format(prefix, ", ".join("{} ({})".format(*completion) for completion in index.complete(prefix))))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,235 @@
+import asyncio
+import logging
+import signal
+from argparse import ArgumentParser
+from typing import Any, Dict, Optional
+from os import path
+
+# Requires aiohttp:
+# python3 -m pip install aiohttp
+from aiohttp import web
+
+from scripts.lookup.tables import Tables
+
+# Configure the default logging format
+logging.basicConfig(
+    format="[%(asctime)s] [%(name)s] [%(levelname)-5s] %(message)s",
+    level=logging.INFO,
+    datefmt="%Y-%m-%d %H:%M:%S"
+)
+
+logger = logging.getLogger(__name__)
+
+# The maximum number of keys of a batch lookup
+max_batch_size = 100000
+# The maximum number of words of a batch of spelling suggestions. A suggestion takes up to a few milliseconds and
+# every other request waits for the batch, so batches are kept small
+max_suggest_batch_size = 100
+
+
+class Server:
+    """A server of lookups in the compiled tables of a language.
+
+    Lookups are answered synchronously on the event loop, so tables are never swapped or closed while in use.
+    Reloading loads the new tables before swapping them in, so lookups keep being served from the old ones meanwhile.
+    """
+
+    def __init__(self, directory: str) -> None:
+        self.directory = directory
+        self.tables = Tables(directory)
+        # Only one reload runs at a time, others wait for it
+        self.lock = asyncio.Lock()
+
+    async def reload(self) -> bool:
+        """Load the tables again if they have changed. Returns whether or not they were reloaded."""
+        async with self.lock:
+            if not self.tables.is_outdated():
+                return False
+            logger.info("Reloading tables directory=%s", self.directory)
+            try:
+                # Tables are loaded in a thread so that lookups are not blocked meanwhile
+                tables = await asyncio.get_running_loop().run_in_executor(None, Tables, self.directory)
+            except Exception:
+                logger.error("Unable to reload tables", exc_info=True)
+                raise
+            previous, self.tables = self.tables, tables
+            previous.close()
+            logger.info("Reloaded tables %s", self.tables.describe())
+            return True
+
+    async def watch(self, interval: float) -> None:
+        """Reload the tables whenever a new build lands."""
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.reload()
+            except Exception:
+                # The previous tables are still served, try again later
+                pass
+
+    async def handle_lookup(self, request: web.Request) -> web.Response:
+        """Look up a single key given as query parameters, or a batch of keys given as a JSON body."""
+        if request.method == "GET":
+            name = request.query.get("table", "words")
+            keys = request.query.getall("key", [])
+        else:
+            try:
+                body: Dict[str, Any] = await request.json()
+                name = body.get("table", "words")
+                keys = body["keys"]
+            except Exception:
+                raise web.HTTPBadRequest(text="Expected a JSON object with a list of keys")
+            if not isinstance(keys, list) or not all(isinstance(key, str) for key in keys):
+                raise web.HTTPBadRequest(text="Expected a list of keys")
+        if len(keys) > max_batch_size:
+            raise web.HTTPRequestEntityTooLarge(max_size=max_batch_size, actual_size=len(keys))
+        try:
+            results = self.tables.lookup(name, keys)
+        except KeyError:
+            raise web.HTTPNotFound(text="Unknown table: {}".format(name))
+        return web.json_response({"table": name, "results": results})
+
+    async def handle_suggest(self, request: web.Request) -> web.Response:
+        """Suggest spellings of a single word given as query parameters, or of a batch of words given as a JSON body."""
+        try:
+            if request.method == "GET":
+                words = request.query.getall("word", [])
+                max_distance = int(request.query["distance"]) if "distance" in request.query else None
+                n = int(request.query.get("n", "10"))
+            else:
+                body: Dict[str, Any] = await request.json()
+                words = body["words"]
+                max_distance = body.get("distance")
+                n = body.get("n", 10)
+                if not isinstance(words, list) or not all(isinstance(word, str) for word in words):
+                    raise ValueError("Expected a list of words")
+        except Exception:
+            raise web.HTTPBadRequest(text="Expected a list of words with an optional distance and number of suggestions")
+        if len(words) > max_suggest_batch_size:
+            raise web.HTTPRequestEntityTooLarge(max_size=max_suggest_batch_size, actual_size=len(words))
+        try:
+            results = self.tables.suggest(words, max_distance, n)
+        except KeyError:
+            raise web.HTTPNotFound(text="No spelling index, build one with scripts.lookup.spelling")
+        except ValueError as error:
+            raise web.HTTPBadRequest(text=str(error))
+        return web.json_response({"results": results})
+
+    async def handle_complete(self, request: web.Request) -> web.Response:
+        """Complete a single prefix given as query parameters, or a batch of prefixes given as a JSON body."""
+        try:
+            if request.method == "GET":
+                prefixes = request.query.getall("prefix", [])
+                n = int(request.query["n"]) if "n" in request.query else None
+            else:
+                body: Dict[str, Any] = await request.json()
+                prefixes = body["prefixes"]
+                n = body.get("n")
+                if not isinstance(prefixes, list) or not all(isinstance(prefix, str) for prefix in prefixes):
+                    raise ValueError("Expected a list of prefixes")
+        except Exception:
+            raise web.HTTPBadRequest(text="Expected a list of prefixes with an optional number of completions")
+        if len(prefixes) > max_batch_size:
+            raise web.HTTPRequestEntityTooLarge(max_size=max_batch_size, actual_size=len(prefixes))
+        try:
+            results = self.tables.complete(prefixes, n)
+        except KeyError:
+            raise web.HTTPNotFound(text="No completion index, build one with scripts.lookup.completion")
+        return web.json_response({"results": results})
+
+    async def handle_top(self, request: web.Request) -> web.Response:
+        """Get the most frequent entries of a table."""
+        name = request.query.get("table", "words")
+        try:
+            n = int(request.query.get("n", "10"))
+            if n <= 0:
+                raise ValueError("Expected a positive number of entries")
+            table = self.tables.table(name)
+        except ValueError:
+            raise web.HTTPBadRequest(text="Expected a positive number of entries")
+        except KeyError:
+            raise web.HTTPNotFound(text="Unknown table: {}".format(name))
+        return web.json_response({"table": name, "results": [{"key": key, "frequency": count} for key, count in table.top(min(n, max_batch_size))]})
+
+    async def handle_tables(self, request: web.Request) -> web.Response:
+        """Get the tables served and their number of entries."""
+        return web.json_response(self.tables.describe())
+
+    async def handle_reload(self, request: web.Request) -> web.Response:
+        """Reload the tables if they have changed."""
+        try:
+            reloaded = await self.reload()
+        except Exception:
+            raise web.HTTPInternalServerError(text="Unable to reload tables")
+        return web.json_response({"reloaded": reloaded, "tables": self.tables.describe()})
+
+    def create_app(self) -> web.Application:
+        """Create the web application."""
+        app = web.Application()
+        app.add_routes([
+            web.get("/lookup", self.handle_lookup),
+            web.post("/lookup", self.handle_lookup),
+            web.get("/suggest", self.handle_suggest),
+            web.post("/suggest", self.handle_suggest),
+            web.get("/complete", self.handle_complete),
+            web.post("/complete", self.handle_complete),
+            web.get("/top", self.handle_top),
+            web.get("/tables", self.handle_tables),
+            web.post("/reload", self.handle_reload),
+        ])
+        return app
+
+
+async def serve(directory: str, host: Optional[str] = None, port: int = 8080, socket: Optional[str] = None, watch: float = 0) -> None:
+    """Serve lookups over HTTP on a host and port, a Unix socket or both, until interrupted."""
+    server = Server(directory)
+    logger.info("Loaded tables %s", server.tables.describe())
+    runner = web.AppRunner(server.create_app(), access_log=None)
+    await runner.setup()
+    if host is not None:
+        await web.TCPSite(runner, host, port).start()
+        logger.info("Listening on http://%s:%d", host, port)
+    if socket is not None:
+        await web.UnixSite(runner, socket).start()
+        logger.info("Listening on unix:%s", socket)
+
+    loop = asyncio.get_running_loop()
+    # Reload on SIGHUP, like most daemons
+    loop.add_signal_handler(signal.SIGHUP, lambda: asyncio.ensure_future(server.reload()))
+    stopped = loop.create_future()
+    for signum in [signal.SIGINT, signal.SIGTERM]:
+        loop.add_signal_handler(signum, lambda: stopped.done() or stopped.set_result(None))
+    watcher = asyncio.ensure_future(server.watch(watch)) if watch > 0 else None
+    try:
+        await stopped
+    finally:
+        if watcher is not None:
+            watcher.cancel()
+        await runner.cleanup()
+        server.tables.close()
+
+
+def main() -> None:
+    """Main entrypoint."""
+    # Create an argument parser for parsing CLI arguments
+    parser = ArgumentParser(description="A server of frequency, rank and n-gram lookups in the compiled tables of a language")
+    parser.add_argument("-l", "--language", required=True, type=str, help="The two letter language code for the language to serve")
+    parser.add_argument("-c", "--cache", type=str, default="./frequency-data", required=False, help="The cache directory to use")
+    parser.add_argument("--host", type=str, default=None, required=False, help="The host to listen on, 127.0.0.1 unless a socket is given")
+    parser.add_argument("-p", "--port", type=int, default=8080, required=False, help="The port to listen on")
+    parser.add_argument("-s", "--socket", type=str, default=None, required=False, help="A Unix socket to listen on")
+    parser.add_argument("--watch", type=float, default=5, required=False, help="The number of seconds between checks for a new build, 0 to only reload on SIGHUP")
+
+    # Parse the arguments
+    options = parser.parse_args()
+
+    # Listen on the socket only, unless a host is also given
+    host = options.host
+    if host is None and options.socket is None:
+        host = "127.0.0.1"
+    directory = path.join(options.cache, "compiled", options.language)
+    asyncio.run(serve(directory, host, options.port, options.socket, options.watch))
+
+
+if __name__ == '__main__':
+    main()
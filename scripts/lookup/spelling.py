@@ -0,0 +1,318 @@
+import json
+import logging
+import mmap
+import struct
+import sys
+from argparse import ArgumentParser
+from array import array
+from bisect import bisect_left
+from hashlib import blake2b
+from typing import Dict, List, Optional, Set, Tuple
+from os import path
+
+from scripts.processing.lib.table import FrequencyTable
+from scripts.processing.lib.utils import exists, load, store_binary
+
+# Configure the default logging format
+logging.basicConfig(
+    format="[%(asctime)s] [%(name)s] [%(levelname)-5s] %(message)s",
+    level=logging.INFO,
+    datefmt="%Y-%m-%d %H:%M:%S"
+)
+
+logger = logging.getLogger(__name__)
+
+# A spelling index is stored as a header followed by fixed-width arrays and a blob of words.
+# Words are ordered by the most frequent first. All integers are little-endian.
+#
+# header          magic, version, maximum distance, prefix length, number of words (n),
+#                 size of the word blob, number of deletes (m), number of postings (p)
+# offsets         uint64[n + 1], offset of each word in the blob
+# counts          uint64[n], count of each word
+# hashes          uint64[m], hash of each delete, sorted
+# postings        uint64[m + 1], offset of the words of each delete in the words of deletes
+# words           uint32[p], index of each word of each delete, most frequent first
+# blob            the UTF-8 encoded words
+header_format = "<4sIIIQQQQ"
+header_size = struct.calcsize(header_format)
+magic = b"WSI\x00"
+version = 1
+
+# Only the start of words is indexed, which keeps the number of deletes of long words small
+default_prefix_length = 7
+
+
+def hash_delete(delete: str) -> int:
+    """Hash a delete. Hashes are stable between processes, unlike those of hash()."""
+    return int.from_bytes(blake2b(delete.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+def deletes(word: str, max_distance: int) -> Set[str]:
+    """Get the word and every string made by deleting up to max_distance characters from it."""
+    found = {word}
+    edges = [word]
+    for _ in range(max_distance):
+        next_edges = []
+        for edge in edges:
+            for i in range(len(edge)):
+                delete = edge[:i] + edge[i + 1:]
+                if delete not in found:
+                    found.add(delete)
+                    next_edges.append(delete)
+        edges = next_edges
+    return found
+
+
+def pattern_masks(pattern: str) -> Dict[str, int]:
+    """Get the bit mask of the positions of every character of a pattern, for computing distances to the pattern."""
+    masks: Dict[str, int] = {}
+    for i, character in enumerate(pattern):
+        masks[character] = masks.get(character, 0) | 1 << i
+    return masks
+
+
+def distance(source: str, target: str, max_distance: int, masks: Optional[Dict[str, int]] = None) -> int:
+    """Get the optimal string alignment distance between two strings, a Levenshtein distance that also counts
+    swapping two adjacent characters as one edit. Returns max_distance + 1 if it is larger.
+
+    The distance is computed bit-parallel (Hyyrö, 2003): a column of the distance matrix is kept as bit vectors of the
+    differences between adjacent cells, so every character of the target takes a few operations on integers rather
+    than a loop over the source. The masks of the source may be given when computing many distances to it.
+    """
+    if abs(len(source) - len(target)) > max_distance:
+        return max_distance + 1
+    if source == target:
+        return 0
+    if not source:
+        return len(target)
+    if masks is None:
+        masks = pattern_masks(source)
+    mask = (1 << len(source)) - 1
+    last = 1 << (len(source) - 1)
+    # Vertical positive and negative differences, the matches of the previous column and the previous target character
+    positive, negative, matches, previous = mask, 0, 0, 0
+    result = len(source)
+    remaining = len(target)
+    for character in target:
+        remaining -= 1
+        current = masks.get(character, 0)
+        swaps = ((~matches & current) << 1) & previous
+        matches = (((current & positive) + positive) ^ positive) | current | negative | swaps
+        horizontal_positive = negative | ~(matches | positive)
+        horizontal_negative = matches & positive
+        if horizontal_positive & last:
+            result += 1
+        elif horizontal_negative & last:
+            result -= 1
+        # The distance decreases by at most one per remaining character of the target
+        if result - remaining > max_distance:
+            return max_distance + 1
+        horizontal_positive = (horizontal_positive << 1) | 1
+        horizontal_negative <<= 1
+        positive = (horizontal_negative | ~(matches | horizontal_positive)) & mask
+        negative = matches & horizontal_positive & mask
+        previous = current
+    return min(result, max_distance + 1)
+
+
+def encode_index(words: List[Tuple[str, int]], max_distance: int, prefix_length: int = default_prefix_length) -> bytes:
+    """Encode a spelling index of words, given with their counts by the most frequent first."""
+    postings: Dict[int, List[int]] = {}
+    for index, (word, _) in enumerate(words):
+        for delete in deletes(word[:prefix_length], max_distance):
+            postings.setdefault(hash_delete(delete), []).append(index)
+
+    encoded_words = [word.encode("utf-8") for word, _ in words]
+    offsets = array("Q", [0])
+    for word in encoded_words:
+        offsets.append(offsets[-1] + len(word))
+    counts = array("Q", (count for _, count in words))
+    hashes = array("Q", sorted(postings))
+    posting_offsets = array("Q", [0])
+    posting_words = array("I")
+    for delete_hash in hashes:
+        posting_words.extend(postings[delete_hash])
+        posting_offsets.append(len(posting_words))
+
+    arrays = [offsets, counts, hashes, posting_offsets, posting_words]
+    if sys.byteorder != "little":
+        for values in arrays:
+            values.byteswap()
+
+    blob = b"".join(encoded_words)
+    header = struct.pack(header_format, magic, version, max_distance, prefix_length, len(words), len(blob), len(hashes), len(posting_words))
+    return header + b"".join(values.tobytes() for values in arrays) + blob
+
+
+class SpellingIndex:
+    """A read-only, memory-mapped index of the deletes of words, for finding words within an edit distance of a word.
+
+    Two words are within a distance d of each other only if they share a string made by deleting at most d characters
+    from each of them. The deletes of every word are precomputed, so a lookup only computes the deletes of the word
+    looked up and the distance to the words that share one of them.
+    """
+
+    def __init__(self, filename: str) -> None:
+        self.file = open(filename, "rb")
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        file_magic, file_version, self.max_distance, self.prefix_length, self.size, blob_size, delete_count, posting_count = \
+            struct.unpack_from(header_format, self.map)
+        if file_magic != magic or file_version != version:
+            self.close()
+            raise ValueError("Not a spelling index: {}".format(filename))
+
+        # The arrays are used in place, without reading them into memory
+        self.view = memoryview(self.map)
+        start = header_size
+        self.offsets, start = self.section(start, "Q", self.size + 1)
+        self.counts, start = self.section(start, "Q", self.size)
+        self.hashes, start = self.section(start, "Q", delete_count)
+        self.postings, start = self.section(start, "Q", delete_count + 1)
+        self.words, start = self.section(start, "I", posting_count)
+        self.blob = start
+
+    def section(self, start: int, typecode: str, length: int) -> Tuple[memoryview, int]:
+        """Get an array from the index along with the offset following it."""
+        end = start + struct.calcsize(typecode) * length
+        values = self.view[start:end].cast(typecode)
+        if sys.byteorder != "little":
+            values = array(typecode, values)
+            values.byteswap()
+        return values, end
+
+    def word(self, index: int) -> str:
+        """Get the word at an index."""
+        return self.map[self.blob + self.offsets[index]:self.blob + self.offsets[index + 1]].decode("utf-8")
+
+    def candidates(self, delete: str) -> memoryview:
+        """Get the indices of the words with a delete, or any other delete with the same hash."""
+        delete_hash = hash_delete(delete)
+        index = bisect_left(self.hashes, delete_hash)
+        if index < len(self.hashes) and self.hashes[index] == delete_hash:
+            return self.words[self.postings[index]:self.postings[index + 1]]
+        return self.words[0:0]
+
+    def suggest(self, word: str, max_distance: Optional[int] = None, n: Optional[int] = None) -> List[Tuple[str, int, int]]:
+        """Get the words within an edit distance of a word as (word, distance, count), closest first, then most frequent first.
+
+        When only the n best words are wanted, the search stops as soon as no other word can be among them, like the
+        closest and top modes of SymSpell, and words further away than the n best are rejected early.
+        """
+        if max_distance is None:
+            max_distance = self.max_distance
+        if max_distance > self.max_distance:
+            raise ValueError("The index only supports distances up to {}".format(self.max_distance))
+
+        prefix = word[:self.prefix_length]
+        masks = pattern_masks(word)
+        suggestions = []
+        considered = set()
+        # The largest distance of a word that may still be suggested, which shrinks once n closer words are found
+        bound = max_distance
+        found = [0] * (max_distance + 1)
+        # Visit the deletes of the word breadth first, so by the number of characters deleted
+        queue = [prefix]
+        queued = {prefix}
+        for delete in queue:
+            # A word within a distance d shares a delete of at most d characters with the word, so it has been found
+            # already if fewer characters are deleted than its distance
+            if len(prefix) - len(delete) > bound:
+                break
+            indices = set(self.candidates(delete))
+            indices.difference_update(considered)
+            considered.update(indices)
+            for index in indices:
+                # A UTF-8 encoded word has between one and four bytes per character, which rules out most words of
+                # another length without decoding them
+                size = self.offsets[index + 1] - self.offsets[index]
+                if size < len(word) - bound or size > 4 * (len(word) + bound):
+                    continue
+                suggestion = self.word(index)
+                suggestion_distance = distance(word, suggestion, bound, masks)
+                if suggestion_distance <= bound:
+                    suggestions.append((suggestion, suggestion_distance, self.counts[index], index))
+                    if n is not None:
+                        # Words further away than the n best so far can not be among the n best
+                        found[suggestion_distance] += 1
+                        total = 0
+                        for d in range(bound + 1):
+                            total += found[d]
+                            if total >= n:
+                                bound = d
+                                break
+            if len(prefix) - len(delete) < max_distance:
+                for i in range(len(delete)):
+                    next_delete = delete[:i] + delete[i + 1:]
+                    if next_delete not in queued:
+                        queued.add(next_delete)
+                        queue.append(next_delete)
+        # Words are stored by the most frequent first, so ties keep their order
+        suggestions.sort(key=lambda suggestion: (suggestion[1], -suggestion[2], suggestion[3]))
+        return [suggestion[:3] for suggestion in (suggestions if n is None else suggestions[:n])]
+
+    def __len__(self) -> int:
+        return self.size
+
+    def __enter__(self) -> "SpellingIndex":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """Close the index."""
+        for name in ["offsets", "counts", "hashes", "postings", "words", "view"]:
+            values = getattr(self, name, None)
+            if isinstance(values, memoryview):
+                values.release()
+        self.map.close()
+        self.file.close()
+
+
+def load_words(output_directory: str, language: str, min_count: int = 1) -> List[Tuple[str, int]]:
+    """Load the compiled word frequencies of a language occurring at least min_count times, most frequent first."""
+    filename = "compiled/{}/word-frequencies".format(language)
+    if exists(output_directory, filename + ".bin"):
+        with FrequencyTable(path.join(output_directory, filename + ".bin")) as table:
+            words = table.top(len(table))
+    else:
+        words = list(json.loads(load(output_directory, filename + ".json")).items())
+    # The empty word counts the ends of the compiled file, not a word
+    return [(word, count) for word, count in words if count >= min_count and word]
+
+
+def build_index(output_directory: str, language: str, max_distance: int = 2, min_count: int = 1, prefix_length: int = default_prefix_length) -> None:
+    """Build the spelling index of the compiled word frequencies of a language."""
+    words = load_words(output_directory, language, min_count)
+    logger.info("Indexing words=%d max_distance=%d prefix_length=%d", len(words), max_distance, prefix_length)
+    content = encode_index(words, max_distance, prefix_length)
+    store_binary(output_directory, "compiled/{}/spelling-index.bin".format(language), content)
+    logger.info("Stored spelling index size=%d", len(content))
+
+
+def main() -> None:
+    """Main entrypoint."""
+    # Create an argument parser for parsing CLI arguments
+    parser = ArgumentParser(description="A tool to build a spelling index of the compiled word frequencies of a language and suggest spellings with it")
+    parser.add_argument("-l", "--language", required=True, type=str, help="The two letter language code for the language to index")
+    parser.add_argument("-c", "--cache", type=str, default="./frequency-data", required=False, help="The cache directory to use")
+    parser.add_argument("-d", "--max-distance", type=int, default=2, required=False, help="The maximum edit distance of suggestions")
+    parser.add_argument("-m", "--min-count", type=int, default=1, required=False, help="The minimum number of occurrences for a word to be suggested")
+    parser.add_argument("--prefix-length", type=int, default=default_prefix_length, required=False, help="The number of characters of each word to index")
+    parser.add_argument("-s", "--suggest", nargs="+", default=None, required=False, help="Suggest spellings of words with an existing index instead of building one")
+
+    # Parse the arguments
+    options = parser.parse_args()
+
+    if options.suggest is None:
+        build_index(options.cache, options.language, options.max_distance, options.min_count, options.prefix_length)
+        return
+
+    with SpellingIndex(path.join(options.cache, "compiled/{}/spelling-index.bin".format(options.language))) as index:
+        for word in options.suggest:
+            suggestions = index.suggest(word, min(options.max_distance, index.max_distance), 10)
+            print("{}: {}".format(word, ", ".join("{} ({}, {})".format(*suggestion) for suggestion in suggestions)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,158 @@
+import json
+import logging
+import re
+from typing import Dict, List, Optional, Tuple, Union
+from os import path, listdir, stat
+
+from scripts.lookup.completion import CompletionIndex
+from scripts.lookup.spelling import SpellingIndex
+from scripts.processing.lib.table import FrequencyTable
+
+logger = logging.getLogger(__name__)
+
+# The compiled frequencies that are served, by the name of their table
+table_names = {
+    "word-frequencies": "words",
+    "character-frequencies": "characters",
+}
+ngram_pattern = re.compile(r"^(character-)?(\d+)-grams$")
+# The spelling and completion indices built by the spelling and completion scripts, if any
+spelling_index_filename = "spelling-index.bin"
+completion_index_filename = "completion-index.bin"
+
+
+class JsonTable:
+    """A frequency table loaded from JSON, for compilations stored without the binary format."""
+
+    def __init__(self, filename: str) -> None:
+        with open(filename, "r") as file:
+            self.counts: Dict[str, int] = json.load(file)
+        # Stored frequencies are sorted by the most frequent entries
+        self.ranks = {key: rank for rank, key in enumerate(self.counts, 1)}
+
+    def frequency(self, word: str) -> int:
+        """Get the frequency of a word. Returns 0 if the word does not exist."""
+        return self.counts.get(word, 0)
+
+    def rank(self, word: str) -> Optional[int]:
+        """Get the rank of a word, where the most frequent word has rank 1. Returns None if the word does not exist."""
+        return self.ranks.get(word)
+
+    def top(self, n: int) -> List[Tuple[str, int]]:
+        """Get the n most frequent words along with their frequency."""
+        return [(key, self.counts[key]) for key in list(self.counts)[:n]]
+
+    def __len__(self) -> int:
+        return len(self.counts)
+
+    def close(self) -> None:
+        """Close the table."""
+        self.counts = {}
+        self.ranks = {}
+
+
+Table = Union[FrequencyTable, JsonTable]
+
+
+def table_name(filename: str) -> Optional[str]:
+    """Get the name a compiled file is served as, such as words, characters, 2-grams or character-3-grams."""
+    name, _ = path.splitext(filename)
+    if name in table_names:
+        return table_names[name]
+    if ngram_pattern.match(name):
+        return name
+    return None
+
+
+def find_tables(directory: str) -> Dict[str, str]:
+    """Find the compiled tables of a directory by name. Binary tables are preferred over JSON."""
+    found = {}
+    for filename in sorted(listdir(directory)):
+        name = table_name(filename)
+        if name is None or not filename.endswith((".bin", ".json")):
+            continue
+        if name not in found or filename.endswith(".bin"):
+            found[name] = path.join(directory, filename)
+    return found
+
+
+def signature(directory: str) -> Dict[str, Tuple[int, int]]:
+    """Sign the compiled tables and indices of a directory by their size and modification time, to notice a new build."""
+    signatures = {}
+    tables = find_tables(directory)
+    for filename in [spelling_index_filename, completion_index_filename]:
+        if path.exists(path.join(directory, filename)):
+            tables[filename] = path.join(directory, filename)
+    for name, filename in tables.items():
+        file = stat(filename)
+        signatures[name] = (file.st_size, file.st_mtime_ns)
+    return signatures
+
+
+class Tables:
+    """The compiled tables of a language, loaded once and shared by every lookup."""
+
+    def __init__(self, directory: str) -> None:
+        self.directory = directory
+        self.signature = signature(directory)
+        self.tables: Dict[str, Table] = {}
+        self.spelling: Optional[SpellingIndex] = None
+        self.completion: Optional[CompletionIndex] = None
+        try:
+            for name, filename in find_tables(directory).items():
+                logger.info("Loading table=%s filename=%s", name, filename)
+                self.tables[name] = FrequencyTable(filename) if filename.endswith(".bin") else JsonTable(filename)
+            if path.exists(path.join(directory, spelling_index_filename)):
+                logger.info("Loading spelling index filename=%s", spelling_index_filename)
+                self.spelling = SpellingIndex(path.join(directory, spelling_index_filename))
+            if path.exists(path.join(directory, completion_index_filename)):
+                logger.info("Loading completion index filename=%s", completion_index_filename)
+                self.completion = CompletionIndex(path.join(directory, completion_index_filename))
+        except:
+            self.close()
+            raise
+
+    def lookup(self, name: str, keys: List[str]) -> List[Dict[str, Union[str, int, None]]]:
+        """Get the frequency and rank of keys in a table."""
+        table = self.table(name)
+        return [{"key": key, "frequency": table.frequency(key), "rank": table.rank(key)} for key in keys]
+
+    def suggest(self, words: List[str], max_distance: Optional[int] = None, n: Optional[int] = None) -> List[Dict[str, object]]:
+        """Get spelling suggestions of words as the word, its distance and its count, closest and most frequent first."""
+        if self.spelling is None:
+            raise KeyError("No spelling index")
+        return [{"word": word, "suggestions": [{"word": suggestion, "distance": distance, "frequency": count}
+                                               for suggestion, distance, count in self.spelling.suggest(word, max_distance, n)]} for word in words]
+
+    def complete(self, prefixes: List[str], n: Optional[int] = None) -> List[Dict[str, object]]:
+        """Get the most frequent words starting with prefixes, along with their frequency."""
+        if self.completion is None:
+            raise KeyError("No completion index")
+        return [{"prefix": prefix, "completions": [{"word": word, "frequency": count} for word, count in self.completion.complete(prefix, n)]}
+                for prefix in prefixes]
+
+    def table(self, name: str) -> Table:
+        """Get a table by name."""
+        if name not in self.tables:
+            raise KeyError("Unknown table: {}".format(name))
+        return self.tables[name]
+
+    def is_outdated(self) -> bool:
+        """Whether or not the tables on disk have changed since they were loaded."""
+        return signature(self.directory) != self.signature
+
+    def describe(self) -> Dict[str, int]:
+        """Get the number of entries of each table."""
+        return {name: len(table) for name, table in self.tables.items()}
+
+    def close(self) -> None:
+        """Close all tables."""
+        for table in self.tables.values():
+            table.close()
+        self.tables = {}
+        if self.spelling is not None:
+            self.spelling.close()
+            self.spelling = None
+        if self.completion is not None:
+            self.completion.close()
+            self.completion = None
@@ -1,11 +1,16 @@
 import logging
+import json
 from argparse import ArgumentParser
-from concurrent.futures import ThreadPoolExecutor
-from typing import Any, List, Tuple
-from os import path, makedirs
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+from os import path, makedirs, cpu_count
 
-from scripts.processing.lib.utils import find_files, chunks, exists, load, store
+from scripts.processing.lib.utils import chunks, exists, is_outdated, load, store
 from scripts.processing.lib.clean import clean_text
+from scripts.processing.lib.compilation import count_chunks
+from scripts.processing.lib.compression import compressions
+from scripts.processing.lib.manifest import Manifest
+from scripts.processing.lib.metrics import Metrics, profile_patterns
 from scripts.sources.multilingual.gutenberg import clean_gutenberg_book
 from scripts.sources.multilingual.wikipedia import clean_wikipedia_article
 from scripts.sources.swedish.litteraturbanken import clean_litteraturbanken_book
@@ -23,49 +28,104 @@ logger = logging.getLogger(__name__)
 executor = None
 
 
-def clean_bucket(output_directory: str, language: str, bucket: List[Tuple[str, Any]]) -> None:
-    """Clean a bucket of sources."""
+def store_shard(output_directory: str, filename: str, content: str) -> None:
+    """Store the word and character counts of a cleaned source as a shard."""
+    word_count, character_count = count_chunks([content])
+    shard = {"words": word_count, "characters": character_count}
+    store(output_directory, filename, json.dumps(shard))
+
+
+def clean_source(output_directory: str, language: str, source: str, filename: str, manifest: Manifest, compression: Optional[str] = None,
+                 metrics: Optional[Metrics] = None) -> Optional[str]:
+    """Clean a source, optionally storing it compressed. Returns the cleaned content, or None if the source could not be cleaned."""
+    if metrics is None:
+        metrics = Metrics()
+    input = "downloads/{}/{}/{}".format(language, source, filename)
+    output = "clean/{}/{}/{}".format(language, source, filename)
+    shard = "shards/{}/{}/{}.json".format(language, source, filename)
+
+    # Sources are cleaned again if they have been downloaded since they were cleaned
+    if not is_outdated(output_directory, output, input):
+        logger.info("Skipping cleaned source=%s filename=%s", source, filename)
+        try:
+            content = load(output_directory, output)
+            if not exists(output_directory, shard):
+                logger.info("Storing missing shard source=%s filename=%s", source, filename)
+                store_shard(output_directory, shard, content)
+            # The hash of the cleaned content is what the fingerprint of a compilation is made from
+            manifest.record(language, source, filename, "cleaned", content)
+            return content
+        except:
+            logger.error("Unable to store shard source=%s filename=%s", source, filename, exc_info=True)
+            return None
+
+    try:
+        with metrics.measure("clean", source):
+            content = load(output_directory, input)
+            size = len(content.encode("utf-8"))
+            if source == "wikipedia":
+                logger.info("Cleaning with special handler source=Wikipedia filename=%s", filename)
+                content = clean_wikipedia_article(content)
+            elif source == "gutenberg":
+                logger.info("Cleaning with special handler source=Gutenberg filename=%s", filename)
+                content = clean_gutenberg_book(content)
+            elif source == "litteraturbanken":
+                logger.info("Cleaning with special handler source=Litteraturbanken filename=%s", filename)
+                content = clean_litteraturbanken_book(content)
+
+            logger.info("Cleaning using generic cleaner filename=%s size=%d", filename, len(content))
+            content = clean_text(content)
+
+            logger.info("Storing source=%s filename=%s", source, filename)
+            store(output_directory, output, content, compression)
+            store_shard(output_directory, shard, content)
+            manifest.record(language, source, filename, "cleaned", content)
+        # Cleaned words are separated by single spaces and newlines
+        tokens = content.count(" ") + content.count("\n") + 1 if content else 0
+        metrics.add("clean", source, documents=1, bytes_in=size, bytes_out=len(content.encode("utf-8")), tokens=tokens)
+        return content
+    except:
+        logger.error("Unable to load and clean source=%s filename=%s", source, filename, exc_info=True)
+        return None
+
+
+def clean_bucket(output_directory: str, language: str, bucket: List[Tuple[str, Any]], compression: Optional[str] = None, profile: bool = False) -> Dict[str, Any]:
+    """Clean a bucket of sources. Returns a snapshot of the metrics of the bucket, optionally with the time spent in each pattern."""
     logger.info("Cleaning bucket size=%d", len(bucket))
-    prepared_content = []
-    for source, parameter in bucket:
-        filename = parameter
-        input = "downloads/{}/{}/{}".format(language, source, parameter)
-        output = "clean/{}/{}/{}".format(language, source, parameter)
-
-        if exists(output_directory, output):
-            logger.info("Skipping cleaned source=%s filename=%s", source, filename)
-        else:
-            try:
-                content = load(output_directory, input)
-                if source == "wikipedia":
-                    logger.info("Cleaning with special handler source=Wikipedia filename=%s", filename)
-                    content = clean_wikipedia_article(content)
-                elif source == "gutenberg":
-                    logger.info("Cleaning with special handler source=Gutenberg filename=%s", filename)
-                    content = clean_gutenberg_book(content)
-                elif source == "litteraturbanken":
-                    logger.info("Cleaning with special handler source=Litteraturbanken filename=%s", filename)
-                    content = clean_litteraturbanken_book(content)
-
-                logger.info("Cleaning using generic cleaner filename=%s size=%d", filename, len(content))
-                content = clean_text(content)
-
-                logger.info("Storing source=%s filename=%s", source, filename)
-                store(output_directory, output, content)
-            except:
-                logger.error("Unable to load and clean source=%s filename=%s", source, filename, exc_info=True)
-
-
-def clean(output_directory: str, language: str) -> None:
-    """Clean sources for the language."""
-    # Get downloaded files
-    files = find_files(path.join(output_directory, "./downloads/{}".format(language)))
-
-    buckets = chunks(files, min(10, len(files)))
-    logger.info("Cleaning threads=%d", len(buckets))
-    futures = {executor.submit(clean_bucket, output_directory, language, bucket) for bucket in buckets}
-    for future in futures:
-        future.result()
+    if profile:
+        profile_patterns()
+    metrics = Metrics()
+    # Each worker uses its own connection to the manifest
+    manifest = Manifest(output_directory)
+    with metrics.measure("clean"):
+        for source, filename in bucket:
+            clean_source(output_directory, language, source, filename, manifest, compression, metrics)
+    manifest.close()
+    return metrics.snapshot()
+
+
+def clean(output_directory: str, language: str, workers: int = 5, compression: Optional[str] = None, metrics: Optional[Metrics] = None, profile: bool = False,
+          rescan: bool = False) -> None:
+    """Clean sources for the language. Metrics of the workers are merged into the given metrics, if any.
+    The manifest is optionally reconciled with the downloads in the cache first."""
+    if metrics is None:
+        metrics = Metrics()
+    # Get downloaded files that are yet to be cleaned
+    manifest = Manifest(output_directory)
+    manifest.scan(language, rescan)
+    files = manifest.documents(language, "downloaded")
+    manifest.close()
+    if len(files) == 0:
+        logger.info("No sources to clean")
+        return
+
+    # Use more buckets than workers to even out the differences in size between sources
+    buckets = chunks(files, min(workers * 4, len(files)))
+    logger.info("Cleaning buckets=%d workers=%d", len(buckets), workers)
+    with metrics.measure("clean"):
+        futures = {executor.submit(clean_bucket, output_directory, language, bucket, compression, profile) for bucket in buckets}
+        for future in futures:
+            metrics.merge(future.result())
     logger.info("Completed all jobs")
 
 
@@ -74,9 +134,15 @@ def main() -> None:
     global executor
 
     # Create an argument parser for parsing CLI arguments
-    parser = ArgumentParser(description="A threaded tool to clean large collections of textual content")
+    parser = ArgumentParser(description="A parallel tool to clean large collections of textual content")
     parser.add_argument("-l", "--language", required=True, type=str, help="The two letter language code for the language to clean")
     parser.add_argument("-c", "--cache", type=str, default="./frequency-data", required=False, help="The cache directory to use")
+    parser.add_argument("-w", "--workers", type=int, default=cpu_count(), required=False, help="The number of workers to clean with")
+    parser.add_argument("-e", "--executor", choices=["process", "thread"], default="process", required=False, help="Whether to clean in a pool of processes or threads")
+    parser.add_argument("--compression", choices=compressions, default=None, required=False, help="Store cleaned sources compressed")
+    parser.add_argument("--metrics", type=str, default=None, required=False, help="Store performance metrics as JSON in a file")
+    parser.add_argument("--profile-patterns", action="store_true", help="Include the time spent in each pattern in the metrics")
+    parser.add_argument("--rescan", action="store_true", help="Reconcile the manifest with the downloads in the cache, such as after changing it by hand")
 
     # Parse the arguments
     options = parser.parse_args()
@@ -86,8 +152,16 @@ def main() -> None:
     if not path.exists(output_directory):
         makedirs(output_directory)
 
-    executor = ThreadPoolExecutor(max_workers=5)
-    clean(output_directory, options.language)
+    # Cleaning is bound by the CPU, so processes are used by default to not be limited by the GIL.
+    # Workers are given paths rather than content to avoid transferring large texts between processes
+    if options.executor == "process":
+        executor = ProcessPoolExecutor(max_workers=options.workers)
+    else:
+        executor = ThreadPoolExecutor(max_workers=options.workers)
+    metrics = Metrics()
+    clean(output_directory, options.language, options.workers, options.compression, metrics, options.profile_patterns, options.rescan)
+    if options.metrics is not None:
+        metrics.store(options.metrics)
 
 
 if __name__ == '__main__':
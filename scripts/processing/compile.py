@@ -1,10 +1,13 @@
 import logging
 from argparse import ArgumentParser
-from concurrent.futures import ThreadPoolExecutor
-from typing import Any, List, Tuple
-from os import path, makedirs
+from shutil import copyfileobj
+from typing import Any, BinaryIO, List, Optional, Tuple
+from os import path, makedirs, replace
 
-from scripts.processing.lib.utils import find_files, chunks, load, store
+from scripts.processing.lib.compression import open_reader
+from scripts.processing.lib.manifest import Manifest
+from scripts.processing.lib.metrics import Metrics
+from scripts.processing.lib.utils import assert_file, exists
 
 # Configure the default logging format
 logging.basicConfig(
@@ -15,48 +18,64 @@ logging.basicConfig(
 
 logger = logging.getLogger(__name__)
 
-# Configure a future executor
-executor = None
 
-
-def compile_bucket(output_directory: str, language: str, bucket: List[Tuple[str, Any]]) -> None:
-    """Compile a bucket of sources."""
+def compile_bucket(output_directory: str, language: str, bucket: List[Tuple[str, Any]], output: BinaryIO, metrics: Optional[Metrics] = None) -> None:
+    """Compile a bucket of sources by streaming them to the output. Compressed sources are decompressed as they are streamed."""
     logger.info("Compiling bucket size=%d", len(bucket))
-    compiled = ""
+    if metrics is None:
+        metrics = Metrics()
     for source, parameter in bucket:
         filename = parameter
         input = "clean/{}/{}/{}".format(language, source, parameter)
 
         try:
-            compiled += "\n" + load(output_directory, input)
+            with metrics.measure("compile", source), open_reader(path.join(output_directory, input)) as file:
+                output.write(b"\n")
+                start = output.tell()
+                copyfileobj(file, output, 1 << 20)
+                size = output.tell() - start
+            metrics.add("compile", source, documents=1, bytes_in=size, bytes_out=size + 1)
         except:
             logger.error("Unable to load and compile source=%s filename=%s", source, filename, exc_info=True)
-    return compiled
-
 
-def compile(output_directory: str, language: str) -> None:
-    """Compile sources for the language."""
-    # Get cleaned files
-    files = find_files(path.join(output_directory, "./clean/{}".format(language)))
 
-    buckets = chunks(files, min(10, len(files)))
-    logger.info("Cleaning threads=%d", len(buckets))
-    futures = {executor.submit(compile_bucket, output_directory, language, bucket) for bucket in buckets}
-    compiled = ""
-    for future in futures:
-        compiled += future.result() + "\n"
-    logger.info("Completed all jobs, storing compilation")
-    store(output_directory, "./compiled/{}/compiled.txt".format(language), compiled)
+def compile(output_directory: str, language: str, force: bool = False, metrics: Optional[Metrics] = None, rescan: bool = False) -> None:
+    """Compile sources for the language. Skipped if the cleaned sources are unchanged since the last compilation, unless forced.
+    The manifest is optionally reconciled with the downloads in the cache first."""
+    # Get cleaned files, sorted to produce the same compilation for the same sources
+    manifest = Manifest(output_directory)
+    manifest.scan(language, rescan)
+    files = manifest.documents(language, "cleaned")
+    fingerprint = manifest.fingerprint(language, "cleaned")
+
+    filename = "compiled/{}/compiled.txt".format(language)
+    if not force and manifest.build(language, "compile") == fingerprint and exists(output_directory, filename):
+        logger.info("Skipping compilation, sources are unchanged")
+        manifest.close()
+        return
+
+    # Write to a temporary file so that an interrupted compilation is never mistaken for a complete one
+    assert_file(output_directory, filename)
+    if metrics is None:
+        metrics = Metrics()
+    with metrics.measure("compile"), open(path.join(output_directory, filename + ".tmp"), "wb") as output:
+        compile_bucket(output_directory, language, files, output, metrics)
+        output.write(b"\n")
+    replace(path.join(output_directory, filename + ".tmp"), path.join(output_directory, filename))
+    manifest.record_build(language, "compile", fingerprint)
+    manifest.close()
+    logger.info("Completed all jobs, stored compilation")
 
 
 def main() -> None:
     """Main entrypoint."""
-    global executor
-
     # Create an argument parser for parsing CLI arguments
-    parser = ArgumentParser(description="A threaded tool to compile large collections of textual content")
+    parser = ArgumentParser(description="A tool to compile large collections of textual content")
     parser.add_argument("-l", "--language", required=True, type=str, help="The two letter language code for the language to clean")
     parser.add_argument("-c", "--cache", type=str, default="./frequency-data", required=False, help="The cache directory to use")
+    parser.add_argument("--force", action="store_true", help="Compile even if the cleaned sources are unchanged")
+    parser.add_argument("--metrics", type=str, default=None, required=False, help="Store performance metrics as JSON in a file")
+    parser.add_argument("--rescan", action="store_true", help="Reconcile the manifest with the downloads in the cache, such as after changing it by hand")
 
     # Parse the arguments
     options = parser.parse_args()
@@ -66,8 +85,10 @@ def main() -> None:
     if not path.exists(output_directory):
         makedirs(output_directory)
 
-    executor = ThreadPoolExecutor(max_workers=5)
-    compile(output_directory, options.language)
+    metrics = Metrics()
+    compile(output_directory, options.language, options.force, metrics, options.rescan)
+    if options.metrics is not None:
+        metrics.store(options.metrics)
 
 
 if __name__ == '__main__':
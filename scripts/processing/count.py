@@ -1,10 +1,15 @@
 import logging
-import json
 from argparse import ArgumentParser
-from typing import Any, List, Tuple
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
 from os import path, makedirs
 
-from scripts.processing.lib.utils import load, store
+from scripts.processing.lib.compilation import count_text
+from scripts.processing.lib.manifest import Manifest
+from scripts.processing.lib.metrics import Metrics
+from scripts.processing.lib.utils import frequency_formats, split_lines, stream, store_frequencies
+from scripts.processing.ngram import parse_orders
 
 # Configure the default logging format
 logging.basicConfig(
@@ -16,30 +21,69 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
-def count(output_directory: str, language: str) -> None:
-    """Count words in sources for the language."""
-    # Get cleaned files
-    compiled = load(output_directory, "compiled/{}/compiled.txt".format(language))
-    words = " ".join(compiled.split("\n")).split(" ")
-
-    logger.info("Counting %d words", len(words))
-
-    word_count = {}
-    character_count = {}
-    for word in words:
-        for character in word:
-            if character not in character_count:
-                character_count[character] = 0
-            character_count[character] += 1
-        if word not in word_count:
-            word_count[word] = 0
-        word_count[word] += 1
-    sorted_word_count = {k: v for k, v in sorted(word_count.items(), key=lambda item: item[1], reverse=True)}
-    sorted_character_count = {k: v for k, v in sorted(character_count.items(), key=lambda item: item[1], reverse=True)}
-
-    logger.info("Completed all jobs, storing compilation")
-    store(output_directory, "./compiled/{}/word-frequencies.json".format(language), json.dumps(sorted_word_count, indent=2))
-    store(output_directory, "./compiled/{}/character-frequencies.json".format(language), json.dumps(sorted_character_count, indent=2))
+def count_range(output_directory: str, language: str, start: int, end: Optional[int], chunk_size: int,
+                character_orders: List[int] = []) -> Tuple[Counter, Counter, Dict[int, Counter]]:
+    """Count words, characters and character n-grams in a byte range of the compiled file."""
+    chunks = stream(output_directory, "compiled/{}/compiled.txt".format(language), chunk_size, start, end)
+    return count_text(chunks, character_orders)
+
+
+def count_compilation(output_directory: str, language: str, chunk_size: int, workers: int,
+                      character_orders: List[int] = []) -> Tuple[Counter, Counter, Dict[int, Counter]]:
+    """Count words, characters and character n-grams in the compiled file, optionally split between processes."""
+    if workers > 1:
+        # Split the compiled file at line boundaries and count each range in its own process
+        ranges = split_lines(output_directory, "compiled/{}/compiled.txt".format(language), workers)
+        logger.info("Counting words workers=%d ranges=%d", workers, len(ranges))
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(count_range, output_directory, language, start, end, chunk_size, character_orders) for start, end in ranges]
+            # Merge in file order to keep the order of first occurrence. Ranges end at line boundaries, which character n-grams never span
+            word_count, character_count, character_ngram_count = futures[0].result()
+            for future in futures[1:]:
+                partial_word_count, partial_character_count, partial_character_ngram_count = future.result()
+                word_count.update(partial_word_count)
+                character_count.update(partial_character_count)
+                for n, counts in partial_character_ngram_count.items():
+                    character_ngram_count[n].update(counts)
+    else:
+        # Stream the compiled file in chunks to keep memory usage bounded
+        logger.info("Counting words chunk_size=%d", chunk_size)
+        word_count, character_count, character_ngram_count = count_range(output_directory, language, 0, None, chunk_size, character_orders)
+    return word_count, character_count, character_ngram_count
+
+
+def count(output_directory: str, language: str, chunk_size: int = 1 << 20, workers: int = 1, formats: List[str] = ["json"], force: bool = False,
+          metrics: Optional[Metrics] = None, character_orders: List[int] = [], top: Optional[int] = None, min_count: int = 1) -> None:
+    """Count words, characters and optionally character n-grams of each order in sources for the language.
+    Skipped if the compilation is unchanged since the last count, unless forced."""
+    manifest = Manifest(output_directory)
+    fingerprint = "{}:{}".format(manifest.build(language, "compile"), ",".join(formats))
+    if character_orders:
+        fingerprint += ":{}".format(",".join(str(n) for n in character_orders))
+    if top is not None or min_count > 1:
+        fingerprint += ":top={}:min={}".format(top, min_count)
+    # Compilations not made through the manifest are always counted
+    if not force and manifest.build(language, "compile") is not None and manifest.build(language, "count") == fingerprint:
+        logger.info("Skipping count, compilation is unchanged")
+        manifest.close()
+        return
+
+    if metrics is None:
+        metrics = Metrics()
+    with metrics.measure("count"):
+        word_count, character_count, character_ngram_count = count_compilation(output_directory, language, chunk_size, workers, character_orders)
+        logger.info("Counted %d words", sum(word_count.values()))
+
+        logger.info("Completed all jobs, storing compilation")
+        size = store_frequencies(output_directory, "./compiled/{}/word-frequencies".format(language), word_count, formats, top, min_count)
+        size += store_frequencies(output_directory, "./compiled/{}/character-frequencies".format(language), character_count, formats, top, min_count)
+        for n, counts in character_ngram_count.items():
+            logger.info("Storing character %d-grams unique=%d", n, len(counts))
+            size += store_frequencies(output_directory, "./compiled/{}/character-{}-grams".format(language, n), counts, formats, top, min_count)
+    metrics.add("count", documents=1, bytes_in=path.getsize(path.join(output_directory, "compiled/{}/compiled.txt".format(language))),
+                bytes_out=size, tokens=sum(word_count.values()))
+    manifest.record_build(language, "count", fingerprint)
+    manifest.close()
 
 
 def main() -> None:
@@ -50,6 +94,15 @@ def main() -> None:
     parser = ArgumentParser(description="A tool to count the frequency of words and characters in large collections of textual content")
     parser.add_argument("-l", "--language", required=True, type=str, help="The two letter language code for the language to clean")
     parser.add_argument("-c", "--cache", type=str, default="./frequency-data", required=False, help="The cache directory to use")
+    parser.add_argument("-f", "--format", nargs="+", choices=frequency_formats, default=["json"], required=False, help="The formats to store the frequencies in")
+    parser.add_argument("--force", action="store_true", help="Count even if the compilation is unchanged")
+    parser.add_argument("--top", type=int, default=None, required=False, help="Only store this number of the most frequent entries")
+    parser.add_argument("-m", "--min-count", type=int, default=1, required=False, help="The minimum number of occurrences for an entry to be stored")
+    parser.add_argument("--chunk-size", type=int, default=1 << 20, required=False, help="The number of bytes to read from the compiled file at a time")
+    parser.add_argument("-w", "--workers", type=int, default=1, required=False, help="The number of processes to count with")
+    parser.add_argument("--metrics", type=str, default=None, required=False, help="Store performance metrics as JSON in a file")
+    parser.add_argument("--character-ngrams", type=parse_orders, default=[], required=False,
+                        help="Also count sequences of this number of characters within sentences, such as 2, 2,3 or 2-4")
 
     # Parse the arguments
     options = parser.parse_args()
@@ -59,7 +112,11 @@ def main() -> None:
     if not path.exists(output_directory):
         makedirs(output_directory)
 
-    count(output_directory, options.language)
+    metrics = Metrics()
+    count(output_directory, options.language, options.chunk_size, options.workers, options.format, options.force, metrics, options.character_ngrams, options.top,
+          options.min_count)
+    if options.metrics is not None:
+        metrics.store(options.metrics)
 
 
 if __name__ == '__main__':
@@ -1,13 +1,18 @@
+import asyncio
+import json
 import logging
 from argparse import ArgumentParser
-from concurrent.futures import ThreadPoolExecutor
-from typing import Any, List, Tuple
-from os import path
-
-from scripts.sources.multilingual.wikipedia import fetch_top_wikipedia_articles, fetch_wikipedia_article
-from scripts.sources.multilingual.gutenberg import fetch_available_gutenberg_books, fetch_gutenberg_book
-from scripts.sources.swedish.litteraturbanken import fetch_available_litteraturbanken_books, fetch_litteraturbanken_books
-from scripts.processing.lib.utils import chunks, store, exists
+from typing import Any, Awaitable, Callable, List, Optional, Tuple
+from os import path, makedirs
+
+from scripts.sources.multilingual.wikipedia import fetch_top_wikipedia_articles_async, fetch_wikipedia_article_async, fetch_wikipedia_titles_async, batch_size
+from scripts.sources.multilingual.gutenberg import fetch_available_gutenberg_books_async, fetch_gutenberg_book_async
+from scripts.sources.swedish.litteraturbanken import fetch_available_litteraturbanken_books_async, fetch_litteraturbanken_books_async
+from scripts.processing.lib.compression import compressions
+from scripts.processing.lib.fetch import Fetcher, NotModified
+from scripts.processing.lib.manifest import Manifest
+from scripts.processing.lib.metrics import Metrics
+from scripts.processing.lib.utils import load, load_binary, store, exists
 
 # Configure the default logging format
 logging.basicConfig(
@@ -18,76 +23,192 @@ logging.basicConfig(
 
 logger = logging.getLogger(__name__)
 
-# Configure a future executor
-executor = None
-
+# Configure a future manifest
+manifest = None
+# The documents recorded in the manifest before downloading
+downloaded_documents = set()
+# The compression to store downloads with, if any
+download_compression = None
+# Configure future metrics
+download_metrics = None
+
+# A function called with the source and filename of each stored download
+DownloadHook = Optional[Callable[[str, str], Awaitable[None]]]
+
+
+def download_filename(source: str, parameter: Any) -> Optional[str]:
+    """Get the filename to download a source to, relative to the language's download directory."""
+    if source == "wikipedia":
+        return "wikipedia/{}.txt".format(parameter.replace("/", "_"))
+    elif source == "gutenberg":
+        return "gutenberg/{}.txt".format(parameter[0].replace("/", "_"))
+    elif source == "litteraturbanken":
+        return "litteraturbanken/{}".format(parameter[0])
+    return None
+
+
+def store_download(output_directory: str, language: str, source: str, filename: str, content: str) -> bool:
+    """Store a downloaded source, unless an identical download is already stored. Returns whether or not it was stored."""
+    output = "downloads/{}/{}".format(language, filename)
+    data = content.encode("utf-8")
+    size = len(data)
+    download_metrics.add("download", source, documents=1, bytes_in=size)
+    # Unchanged files are left untouched so that later stages can skip them. The bytes are compared, as reading the
+    # file as text would translate line endings such as those of Gutenberg books
+    if manifest_contains(language, filename) and load_binary(output_directory, output) == data:
+        logger.info("Unchanged source=%s filename=%s", source, filename)
+        return False
+    else:
+        logger.info("Storing source=%s filename=%s", source, filename)
+        store(output_directory, output, content, download_compression)
+        download_metrics.add("download", source, bytes_out=size)
+        manifest.record(language, source, path.basename(filename), "downloaded", content)
+        return True
+
+
+def manifest_contains(language: str, filename: str) -> bool:
+    """Whether or not the manifest contains a download, given its filename relative to the language's download directory."""
+    source, name = filename.split("/", 1)
+    return (source, name) in downloaded_documents
+
+
+async def download_source(fetcher: Fetcher, output_directory: str, language: str, source: str, parameter: Any, refresh: bool = False, on_download: DownloadHook = None) -> None:
+    """Download a source. When refreshing, already downloaded sources are fetched again if they have changed."""
+    filename = download_filename(source, parameter)
+    if filename is None:
+        logger.warning("Got unknown source %s", source)
+        return
+
+    downloaded = manifest_contains(language, filename)
+    if downloaded and not refresh:
+        logger.info("Skipping download source=%s filename=%s", source, filename)
+        return
+
+    content = None
+    stored = False
+    try:
+        # The validators of the response are only kept once the download is stored, or a later conditional request
+        # would find a download that was never stored to be unchanged
+        with fetcher.defer_validators():
+            if source == "gutenberg":
+                logger.info("Fetching source=Gutenberg book='%s' id=%s", parameter[1], parameter[0])
+                content = await fetch_gutenberg_book_async(fetcher, parameter[0], conditional=downloaded)
+            elif source == "litteraturbanken":
+                logger.info("Fetching source=Litteraturbanken filename='%s' id=%s", parameter[0], parameter[1])
+                content = await fetch_litteraturbanken_books_async(fetcher, [parameter], conditional=downloaded)
+            if content is not None:
+                stored = store_download(output_directory, language, source, filename, content)
+        if stored and on_download is not None:
+            await on_download(source, path.basename(filename))
+    except NotModified:
+        logger.info("Not modified source=%s filename=%s", source, filename)
+    except:
+        logger.error("Unable to download source=%s filename=%s", source, filename, exc_info=True)
+
+
+async def download_wikipedia_article(fetcher: Fetcher, output_directory: str, language: str, article: str, title: str, on_download: DownloadHook = None) -> None:
+    """Download a Wikipedia article, given the title the article was found as."""
+    filename = download_filename("wikipedia", article)
+    try:
+        logger.info("Fetching source=Wikipedia article='%s'", title)
+        content = await fetch_wikipedia_article_async(fetcher, title, language)
+        if store_download(output_directory, language, "wikipedia", filename, content) and on_download is not None:
+            await on_download("wikipedia", path.basename(filename))
+    except:
+        logger.error("Unable to download source=wikipedia filename=%s", filename, exc_info=True)
+
+
+async def download_wikipedia_articles(fetcher: Fetcher, output_directory: str, language: str, articles: List[str], on_download: DownloadHook = None) -> None:
+    """Download a batch of Wikipedia articles. The titles are found for the whole batch at once, while the articles
+    are fetched concurrently, as the API only returns a single full article per request."""
+    logger.info("Downloading source=Wikipedia articles=%d", len(articles))
+    try:
+        titles = await fetch_wikipedia_titles_async(fetcher, articles, language)
+    except:
+        logger.error("Unable to download source=wikipedia articles=%s", "|".join(articles), exc_info=True)
+        return
+
+    for article in articles:
+        if article not in titles:
+            logger.error("Unable to download source=wikipedia filename=%s", download_filename("wikipedia", article))
+    await asyncio.gather(*[download_wikipedia_article(fetcher, output_directory, language, article, title, on_download) for article, title in titles.items()])
+
+
+async def download(output_directory: str, language: str, fetcher: Fetcher, refresh: bool = False, on_download: DownloadHook = None, rescan: bool = False) -> None:
+    """Download sources for the language. When refreshing, already downloaded sources are fetched again if they have changed.
+    The optional hook is awaited for each stored download. The manifest is optionally reconciled with the downloads in the cache first."""
+    global downloaded_documents
+
+    # Find what has already been downloaded in the manifest, rather than scanning the cache
+    manifest.scan(language, rescan)
+    downloaded_documents = set(manifest.documents(language))
 
-def download_bucket(output_directory: str, language: str, bucket: List[Tuple[str, Any]]) -> None:
-    """Download a bucket of sources."""
-    logger.info("Downloading bucket size=%d", len(bucket))
-    for source, parameter in bucket:
-        filename = ""
-        if source == "wikipedia":
-            filename = "wikipedia/{}.txt".format(parameter.replace("/", "_"))
-        elif source == "gutenberg":
-            filename = "gutenberg/{}.txt".format(parameter[0].replace("/", "_"))
-        elif source == "litteraturbanken":
-            filename = "litteraturbanken/{}".format(parameter[0])
-        else:
-            logger.warn("Got unknown source %s", source)
-            continue
-
-        if exists(output_directory, "downloads/{}/{}".format(language, filename)):
-            logger.info("Skipping download source=%s filename=%s", source, filename)
-        else:
-            content = None
-            try:
-                if source == "wikipedia":
-                    logger.info("Downloading source=Wikipedia article=%s", parameter)
-                    content = fetch_wikipedia_article(parameter, language)
-                elif source == "gutenberg":
-                    logger.info("Fetching source=Gutenberg book='%s' id=%s", parameter[1], parameter[0])
-                    content = fetch_gutenberg_book(parameter[0])
-                elif source == "litteraturbanken":
-                    logger.info("Fetching source=Litteraturbanken filename='%s' id=%s", parameter[0], parameter[1])
-                    content = fetch_litteraturbanken_books([parameter])
-                if content is not None:
-                    logger.info("Storing source=%s filename=%s", source, filename)
-                    store(output_directory, "downloads/{}/{}".format(language, filename), content)
-            except:
-                logger.error("Unable to download source=%s filename=%s", source, filename, exc_info=True)
-
-
-def download(output_directory: str, language: str) -> None:
-    """Download sources for the language."""
     fetches = []
 
     logger.info("Fetching top Wikipedia articles language=%s", language)
-    fetches += [("wikipedia", x) for x in fetch_top_wikipedia_articles(language)]
+    fetches += [("wikipedia", x) for x in await fetch_top_wikipedia_articles_async(fetcher, language)]
 
     logger.info("Fetching available Gutenberg books language=%s", language)
-    fetches += [("gutenberg", x) for x in fetch_available_gutenberg_books(language)]
+    fetches += [("gutenberg", x) for x in await fetch_available_gutenberg_books_async(fetcher, language)]
 
     if language == "sv":
         logger.info("Fetching available books from Litteraturbanken")
-        fetches += [("litteraturbanken", x) for x in fetch_available_litteraturbanken_books()]
+        fetches += [("litteraturbanken", x) for x in await fetch_available_litteraturbanken_books_async(fetcher)]
 
-    buckets = chunks(fetches, min(10, len(fetches)))
-    logger.info("Downloading threads=%d", len(buckets))
-    futures = {executor.submit(download_bucket, output_directory, language, bucket) for bucket in buckets}
-    for future in futures:
-        future.result()
+    # The titles of Wikipedia articles are found in batches
+    articles = []
+    for source, parameter in fetches:
+        if source == "wikipedia":
+            filename = download_filename(source, parameter)
+            if not refresh and manifest_contains(language, filename):
+                logger.info("Skipping download source=%s filename=%s", source, filename)
+            else:
+                articles.append(parameter)
+    batches = [articles[i:i + batch_size] for i in range(0, len(articles), batch_size)]
+    jobs = [download_wikipedia_articles(fetcher, output_directory, language, batch, on_download) for batch in batches]
+
+    # All sources are downloaded at once, the fetcher limits the number of requests in flight per host
+    jobs += [download_source(fetcher, output_directory, language, source, parameter, refresh, on_download) for source, parameter in fetches if source != "wikipedia"]
+    logger.info("Downloading sources=%d jobs=%d", len(fetches), len(jobs))
+    await asyncio.gather(*jobs)
     logger.info("Completed all jobs")
 
 
+async def download_with_fetcher(output_directory: str, language: str, concurrency: int, rate: float, retries: int, refresh: bool = False,
+                                on_download: DownloadHook = None, compression: Optional[str] = None, metrics: Optional[Metrics] = None, rescan: bool = False) -> None:
+    """Download sources for the language using a new fetcher. Downloads are optionally stored compressed."""
+    global manifest, download_compression, download_metrics
+    manifest = Manifest(output_directory)
+    download_compression = compression
+    download_metrics = metrics if metrics is not None else Metrics()
+
+    # Keep the HTTP validators of downloads in order to make conditional requests when refreshing
+    validators = {}
+    if exists(output_directory, "http/validators.json"):
+        validators = json.loads(load(output_directory, "http/validators.json"))
+
+    try:
+        async with Fetcher(concurrency=concurrency, rate=rate, retries=retries, validators=validators) as fetcher:
+            with download_metrics.measure("download"):
+                await download(output_directory, language, fetcher, refresh, on_download, rescan)
+    finally:
+        store(output_directory, "http/validators.json", json.dumps(validators))
+        manifest.close()
+
+
 def main() -> None:
     """Main entrypoint."""
-    global executor
-
     # Create an argument parser for parsing CLI arguments
-    parser = ArgumentParser(description="A threaded tool to download large collections of textual content")
+    parser = ArgumentParser(description="An asynchronous tool to download large collections of textual content")
     parser.add_argument("-l", "--language", required=True, type=str, help="The two letter language code for which to download data")
     parser.add_argument("-c", "--cache", type=str, default="./frequency-data", required=False, help="The cache directory to use")
+    parser.add_argument("--concurrency", type=int, default=8, required=False, help="The maximum number of concurrent requests per host")
+    parser.add_argument("--rate", type=float, default=20, required=False, help="The maximum number of requests per second per host, 0 for no limit")
+    parser.add_argument("--retries", type=int, default=5, required=False, help="The number of times to retry a failed request")
+    parser.add_argument("--refresh", action="store_true", help="Fetch already downloaded sources again, only storing those that have changed")
+    parser.add_argument("--compression", choices=compressions, default=None, required=False, help="Store downloads compressed")
+    parser.add_argument("--metrics", type=str, default=None, required=False, help="Store performance metrics as JSON in a file")
+    parser.add_argument("--rescan", action="store_true", help="Reconcile the manifest with the downloads in the cache, such as after changing it by hand")
 
     # Parse the arguments
     options = parser.parse_args()
@@ -97,8 +218,11 @@ def main() -> None:
     if not path.exists(output_directory):
         makedirs(output_directory)
 
-    executor = ThreadPoolExecutor(max_workers=5)
-    download(output_directory, options.language)
+    metrics = Metrics()
+    asyncio.run(download_with_fetcher(output_directory, options.language, options.concurrency, options.rate, options.retries, options.refresh,
+                                      compression=options.compression, metrics=metrics, rescan=options.rescan))
+    if options.metrics is not None:
+        metrics.store(options.metrics)
 
 
 if __name__ == '__main__':
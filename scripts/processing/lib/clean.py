@@ -1,12 +1,33 @@
 import re
-from typing import List, Set
+from typing import Dict, List, Pattern, Set, Tuple
 
 
+# Characters normalized to their ASCII counterpart
+unicode_hyphens = "\u2014\u2013\u2012\u2010\u2043\ufe63\uff0d\u058a\u1806\u00ad\u2212"
+unicode_single_quotes = "\u2039\u203a\u2019\u276e\u276f\u201a\u2018\u201b\u275b\u275c\u275f\u00b4\u02c8\u02cc\u02bb`\u2032"
+unicode_double_quotes = "\u00ab\u201e\u201c\u201f\u201d\u0022\u275d\u275e\u2e42\u301d\u301e\u301f\uff02\u00bb\u2033"
+unicode_periods = "\u002e\u0589\u3002\u06d4\u2cf9\u0701\u1362\u166e\u1803\u2cfe\ua4ff\ua60e\ua6f3"
+unicode_exclamations = "\u2048\u2757\u203c\u0021\u00a1\u07f9\u1944"
+unicode_commas = "\u002c\u060c\u3001\u055d\u07f8\u1363\u1808\ua4fe\ua60d\ua6f5"
+unicode_questions = "\u2047\u2049\u003f\u037e\u00bf\u061f\u055e\u1367\u2cfa\u2cfb\ua60f\ua6f7\ud804"
+unicode_colons = "\u0706\u003a\u1365\ua6f4\u02d0"
+unicode_ellipses = "\u2026\ufe19\u0eaf"
+
+# Characters ending a sentence
+punctuation_characters = "!?."
+# Characters removed from the text
+special_characters = "\\!\"#$%&'()*+,./:;<=>?@[]^_{|}~°→©²§½×ʃ•¾⊙\u2020\u2030\u00b3\u00b9‿✯¼√═\u0333º⎫⎬⎭ᚠ™" + "".join(map(chr, range(0x2460, 0x325a + 1)))
+
+
+def character_class(characters: str) -> str:
+    """Create a regular expression character class matching any of the characters."""
+    return "[{}]".format(re.escape(characters))
+
 
 digit_pattern = re.compile(r"\b\d+\b")
 possessive_pattern = re.compile(r"([a-z])'s")
-punctuation_pattern = re.compile(r"[!?.]")
-special_pattern = re.compile(r"[\\!\"#$%&'()*+,./:;<=>?@[\]^_{|}~)°→©²§½×ʃ•¾⊙°\u2020\u2030\u00b3\u00b9‿✯¼√═\u0333º⎫⎬⎭|\u2460-\u325aᚠ™]")
+punctuation_pattern = re.compile(character_class(punctuation_characters))
+special_pattern = re.compile(character_class(special_characters))
 hyphen_pattern = re.compile(r"\B-\B|\b-\B|\B-\b")
 whitespace_pattern = re.compile(r"\s+")
 newline_pattern = re.compile(r"\n+")
@@ -15,15 +36,59 @@ website_pattern = re.compile(r"(https?:\/\/)?([a-z0-9-]+\.)+[a-z]{2,}(\/[a-z0-9%
 single_character_line_pattern = re.compile(r"^.$", flags=re.MULTILINE)
 math_pattern = re.compile(r"\{[A-Za-z0-9\\ _^+\-*\{\}]+\}")
 
-unicode_hyphen_pattern = re.compile(r"[\u2014\u2013\u2012\u2010\u2043\ufe63\uff0d\u058a\u1806\u2014\u2010\u00ad\u2010\u2013\u2014\u2043\u2212]")
-unicode_single_quote_pattern = re.compile(r"[\u2039\u203a\u2019\u276e\u276f\u201a\u2018\u201b\u275b\u275c\u275f\u00b4\u02c8\u02cc\u02bb`\u2032]")
-unicode_double_quote_pattern = re.compile(r"[\u00ab\u00ab\u201e\u201c\u201f\u201d\u0022\u275d\u275e\u2e42\u301d\u301e\u301f\uff02\u00bb\u2033]")
-unicode_period_pattern = re.compile(r"[\u002e\u0589\u3002\u06d4\u2cf9\u0701\u1362\u166e\u1803\u2cfe\ua4ff\ua60e\ua6f3\u002e\u002e]")
-unicode_exclamation_pattern = re.compile(r"[\u2048\u2757\u203c\u0021\u00a1\u07f9\u1944\u0021\u0021\u00a1]")
-unicode_comma_pattern = re.compile(r"[\u002c\u060c\u3001\u055d\u07f8\u1363\u1808\ua4fe\ua60d\ua6f5\u002c\u002c]")
-unicode_question_pattern = re.compile(r"[\u2047\u2049\u003f\u037e\u00bf\u061f\u055e\u1367\u2cfa\u2cfb\ua60f\ua6f7\ud804\u003f\u003f\u00bf]")
-unicode_colon_pattern = re.compile(r"[\u0706\u003a\u1365\ua6f4\u003a\u003a\u02d0]")
-unicode_ellipsis_pattern = re.compile(r"[\u2026\ufe19\u0eaf\u2026\u2026]")
+unicode_hyphen_pattern = re.compile(character_class(unicode_hyphens))
+unicode_single_quote_pattern = re.compile(character_class(unicode_single_quotes))
+unicode_double_quote_pattern = re.compile(character_class(unicode_double_quotes))
+unicode_period_pattern = re.compile(character_class(unicode_periods))
+unicode_exclamation_pattern = re.compile(character_class(unicode_exclamations))
+unicode_comma_pattern = re.compile(character_class(unicode_commas))
+unicode_question_pattern = re.compile(character_class(unicode_questions))
+unicode_colon_pattern = re.compile(character_class(unicode_colons))
+unicode_ellipsis_pattern = re.compile(character_class(unicode_ellipses))
+
+
+# Faster to scan equivalents of the patterns above, used by clean_text
+fast_digit_pattern = re.compile(r"\d(?<!\w\d)\d*(?!\w)")
+fast_hyphen_pattern = re.compile(r"-(?:(?<!\w-)|(?!\w))")
+# Single spaces are left as is rather than being replaced by themselves
+fast_whitespace_pattern = re.compile(r"\s{2,}|[^\S ]")
+fast_newline_pattern = re.compile(r"\n{2,}")
+
+
+def create_replacements(replacements: List[Tuple[str, str]]) -> Dict[str, str]:
+    """Create a map of characters to their replacement. The first replacement of a character wins."""
+    replacement_map = {}
+    for characters, replacement in replacements:
+        for character in characters:
+            replacement_map.setdefault(character, replacement)
+    return replacement_map
+
+
+def replace_characters(pattern: Pattern, replacements: Dict[str, str], text: str) -> str:
+    """Replace the characters matched by a pattern in a single pass."""
+    return pattern.sub(lambda match: replacements[match.group()], text)
+
+
+# Single pass equivalent of the character replacements in normalize_unicode
+unicode_replacements = create_replacements([
+    (unicode_hyphens, "-"),
+    (unicode_single_quotes, "'"),
+    (unicode_double_quotes, '"'),
+    (unicode_periods, "."),
+    (unicode_commas, ","),
+    (unicode_exclamations, "!"),
+    (unicode_questions, "?"),
+    (unicode_colons, ":"),
+    (unicode_ellipses, "..."),
+])
+unicode_replacement_pattern = re.compile(character_class("".join(unicode_replacements)))
+
+# Single pass equivalent of splitting sentences and removing special characters
+sentence_replacements = create_replacements([
+    (punctuation_characters, "\n"),
+    (special_characters, ""),
+])
+sentence_replacement_pattern = re.compile(character_class("".join(sentence_replacements)))
 
 
 def normalize_unicode(text: str) -> str:
@@ -52,7 +117,41 @@ def normalize_abbreviations(text: str) -> str:
 
 
 def clean_text(text: str) -> str:
-    """Clean and normalize text into sentences."""
+    """Clean and normalize text into sentences.
+
+    Produces the same output as clean_text_reference, using fewer and faster passes.
+    """
+    # Transform all of the text to lowercase
+    text = text.lower()
+    # Normalize unicode
+    text = replace_characters(unicode_replacement_pattern, unicode_replacements, text)
+    # Normalize abbreviations
+    text = normalize_abbreviations(text)
+    # Remove digits
+    text = fast_digit_pattern.sub(" ", text)
+    # Remove websites
+    text = website_pattern.sub(" ", text)
+    # Remove math expressions
+    text = math_pattern.sub(" ", text)
+    # Remove possessives
+    text = possessive_pattern.sub(r"\1", text)
+    # Remove hyphens not between words
+    text = fast_hyphen_pattern.sub(" ", text)
+    # Normalize whitespace
+    text = fast_whitespace_pattern.sub(" ", text)
+    # Split sentences to newlines and remove special characters
+    text = replace_characters(sentence_replacement_pattern, sentence_replacements, text)
+    # Remove padding
+    text = padding_pattern.sub("", text)
+    # Remove single characters on a line
+    text = single_character_line_pattern.sub("", text)
+    # Normalize newlines
+    text = fast_newline_pattern.sub("\n", text)
+    return text
+
+
+def clean_text_reference(text: str) -> str:
+    """Clean and normalize text into sentences, one pass at a time."""
     # Transform all of the text to lowercase
     text = text.lower()
     # Normalize unicode
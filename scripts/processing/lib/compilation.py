@@ -1,4 +1,5 @@
-from typing import List, Dict
+from collections import Counter
+from typing import Dict, Iterable, Iterator, List, Tuple
 
 # Ugly, but mulitudes faster than
 # return {word: words.count(word) for word in set(words)}
@@ -10,3 +11,65 @@ def count(words: List[str]) -> Dict[str, int]:
             counted_words[word] = 0
         counted_words[word] = counted_words[word] + 1
     return counted_words
+
+
+def ngrams(words: List[str], n: int) -> Iterator[str]:
+    """Get the overlapping n-grams of a list of words, joined by spaces."""
+    # Slide a window of n words over the list
+    return map(" ".join, zip(*[words[i:] for i in range(n)]))
+
+
+def count_character_ngrams(counts: Dict[int, Counter], previous: str, text: str) -> None:
+    """Count the character n-grams of each order that end in text, where previous is the text that came before it."""
+    for n, counter in counts.items():
+        window = previous[max(len(previous) - n + 1, 0):] + text
+        counter.update(map("".join, zip(*[window[i:] for i in range(n)])))
+
+
+def count_text(chunks: Iterable[str], character_orders: Iterable[int] = ()) -> Tuple[Counter, Counter, Dict[int, Counter]]:
+    """Count words, characters and character n-grams of each order in a stream of text chunks in a single pass.
+
+    Words are separated by spaces and newlines. A word split across two chunks
+    is carried over to the next chunk, so the result is identical to splitting
+    the concatenated text. Character n-grams include spaces, but not newlines,
+    so they never span two sentences. The counters keep the order of first occurrence.
+    """
+    word_count = Counter()
+    character_count = Counter()
+    character_ngram_count = {n: Counter() for n in character_orders}
+    # The characters before the text being counted that start n-grams ending in it
+    context = max(character_ngram_count, default=1) - 1
+    previous = ""
+    remainder = ""
+    for chunk in chunks:
+        text = remainder + chunk
+        # Everything up to the last separator is made up of complete words
+        end = max(text.rfind(" "), text.rfind("\n"))
+        if end < 0:
+            remainder = text
+            continue
+        remainder = text[end + 1:]
+        text = text[:end + 1]
+        word_count.update(text[:end].replace("\n", " ").split(" "))
+        # Counting whole buffers keeps the loop over characters in C
+        character_count.update(text)
+        if character_ngram_count:
+            count_character_ngrams(character_ngram_count, previous, text)
+            previous = (previous + text[-context:])[-context:] if context > 0 else ""
+    # The last word is counted even if empty, just like str.split does
+    word_count[remainder] += 1
+    character_count.update(remainder)
+    del character_count[" "]
+    del character_count["\n"]
+    if character_ngram_count:
+        count_character_ngrams(character_ngram_count, previous, remainder)
+        for counter in character_ngram_count.values():
+            for gram in [gram for gram in counter if "\n" in gram]:
+                del counter[gram]
+    return word_count, character_count, character_ngram_count
+
+
+def count_chunks(chunks: Iterable[str]) -> Tuple[Counter, Counter]:
+    """Count words and characters in a stream of text chunks. See count_text."""
+    word_count, character_count, _ = count_text(chunks)
+    return word_count, character_count
@@ -0,0 +1,59 @@
+import gzip
+from typing import BinaryIO, Optional
+
+# Zstandard is optional and only needed to store or load files compressed with zstd:
+# python3 -m pip install zstandard
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# The compressions that files may be stored with. The compression of a file is
+# detected from its first bytes, so plain and compressed files can be mixed
+compressions = ["gzip", "zstd"]
+gzip_magic = b"\x1f\x8b"
+zstd_magic = b"\x28\xb5\x2f\xfd"
+
+# Favour speed over size, the caches are mostly written once and read many times
+gzip_level = 6
+zstd_level = 3
+
+
+def detect_compression(filename: str) -> Optional[str]:
+    """Detect the compression of a file from its first bytes."""
+    with open(filename, "rb") as file:
+        magic = file.read(4)
+    if magic.startswith(gzip_magic):
+        return "gzip"
+    elif magic.startswith(zstd_magic):
+        return "zstd"
+    return None
+
+
+def assert_compression(compression: Optional[str]) -> None:
+    """Raise an error if a compression is unknown or unavailable."""
+    if compression is not None and compression not in compressions:
+        raise ValueError("Unknown compression: {}".format(compression))
+    if compression == "zstd" and zstandard is None:
+        raise ValueError("The zstd compression requires the zstandard package")
+
+
+def open_reader(filename: str) -> BinaryIO:
+    """Open a file for reading its content, decompressing it as needed. The content is decompressed as it is read."""
+    compression = detect_compression(filename)
+    if compression == "gzip":
+        return gzip.GzipFile(filename, "rb")
+    elif compression == "zstd":
+        assert_compression(compression)
+        return zstandard.ZstdDecompressor().stream_reader(open(filename, "rb"), closefd=True)
+    return open(filename, "rb")
+
+
+def open_writer(filename: str, compression: Optional[str] = None) -> BinaryIO:
+    """Open a file for writing, compressing the content as it is written."""
+    assert_compression(compression)
+    if compression == "gzip":
+        return gzip.GzipFile(filename, "wb", compresslevel=gzip_level)
+    elif compression == "zstd":
+        return zstandard.ZstdCompressor(level=zstd_level).stream_writer(open(filename, "wb"), closefd=True)
+    return open(filename, "wb")
@@ -0,0 +1,149 @@
+import asyncio
+import json
+import logging
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, Optional
+from urllib.parse import urlsplit
+
+# Requires aiohttp:
+# python3 -m pip install aiohttp
+import aiohttp
+
+logger = logging.getLogger(__name__)
+
+# Responses worth retrying, as the server may recover
+retry_statuses = {408, 429, 500, 502, 503, 504}
+
+# The validators of responses received by the current task while they are deferred, by request
+deferred_validators: ContextVar[Optional[Dict[str, Dict[str, str]]]] = ContextVar("deferred_validators", default=None)
+
+
+class NotModified(Exception):
+    """Raised when a conditional request finds that the content has not changed since it was last fetched."""
+
+
+class HostLimiter:
+    """Limit the number of concurrent requests and the rate of requests to a host."""
+
+    def __init__(self, concurrency: int, rate: float) -> None:
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.interval = 1 / rate if rate > 0 else 0
+        self.next_request = 0.0
+
+    async def __aenter__(self) -> None:
+        await self.semaphore.acquire()
+        if self.interval > 0:
+            # Reserve the next free slot before waiting, so that waiting requests are spaced evenly
+            now = asyncio.get_running_loop().time()
+            slot = max(now, self.next_request)
+            self.next_request = slot + self.interval
+            if slot > now:
+                await asyncio.sleep(slot - now)
+
+    async def __aexit__(self, *args) -> None:
+        self.semaphore.release()
+
+
+class Fetcher:
+    """An HTTP client with pooled keep-alive connections, per-host limits and retries."""
+
+    def __init__(self, concurrency: int = 8, rate: float = 0, retries: int = 5, backoff: float = 0.5, timeout: float = 300, validators: Optional[Dict[str, Dict[str, str]]] = None) -> None:
+        # Validators (ETag and Last-Modified) of previous responses, by request
+        self.validators = validators if validators is not None else {}
+        self.concurrency = concurrency
+        self.rate = rate
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.limiters: Dict[str, HostLimiter] = {}
+        self.session: Optional[aiohttp.ClientSession] = None
+
+    async def __aenter__(self) -> "Fetcher":
+        connector = aiohttp.TCPConnector(limit=0, limit_per_host=self.concurrency)
+        self.session = aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=self.timeout), raise_for_status=False)
+        return self
+
+    async def __aexit__(self, *args) -> None:
+        await self.session.close()
+
+    def limiter(self, url: str) -> HostLimiter:
+        """Get the limiter for the host of a URL."""
+        host = urlsplit(url).netloc
+        if host not in self.limiters:
+            self.limiters[host] = HostLimiter(self.concurrency, self.rate)
+        return self.limiters[host]
+
+    @contextmanager
+    def defer_validators(self) -> Iterator[None]:
+        """Defer keeping the validators of the responses received by the current task within the block until the block
+        completes without an error, such as once their content is stored. Concurrent tasks defer their validators apart."""
+        deferred = {}
+        token = deferred_validators.set(deferred)
+        try:
+            yield
+        finally:
+            deferred_validators.reset(token)
+        self.validators.update(deferred)
+
+    def validator_key(self, method: str, url: str, files: Optional[Dict[str, str]], data: Any) -> str:
+        """Get the key of the validators for a request."""
+        return json.dumps([method, url, files, data], sort_keys=True)
+
+    async def request(self, method: str, url: str, files: Optional[Dict[str, str]] = None, conditional: bool = False, **kwargs: Any) -> str:
+        """Perform a request, retrying with an exponential backoff on failure. Returns the body as text.
+
+        Like with requests, files are posted as a multipart form. A conditional request
+        raises NotModified if the server responds that the content has not changed
+        since the validators were stored.
+        """
+        limiter = self.limiter(url)
+        key = self.validator_key(method, url, files, kwargs.get("data"))
+        if conditional and key in self.validators:
+            headers = dict(kwargs.get("headers", {}))
+            if "etag" in self.validators[key]:
+                headers["If-None-Match"] = self.validators[key]["etag"]
+            if "last-modified" in self.validators[key]:
+                headers["If-Modified-Since"] = self.validators[key]["last-modified"]
+            kwargs["headers"] = headers
+        for attempt in range(self.retries + 1):
+            delay = self.backoff * 2 ** attempt * (1 + random.random())
+            if files is not None:
+                # A form can only be sent once, so it is created for each attempt
+                kwargs["data"] = aiohttp.FormData()
+                for name, value in files.items():
+                    kwargs["data"].add_field(name, value, filename=name)
+            try:
+                async with limiter:
+                    async with self.session.request(method, url, **kwargs) as response:
+                        if response.status in retry_statuses and attempt < self.retries:
+                            # Respect the server's wish, if given in seconds
+                            retry_after = response.headers.get("Retry-After", "")
+                            if retry_after.isdigit():
+                                delay = max(delay, int(retry_after))
+                            logger.warning("Retrying request status=%d url=%s delay=%.1f", response.status, url, delay)
+                        elif response.status == 304:
+                            raise NotModified(url)
+                        else:
+                            response.raise_for_status()
+                            validators = {name: response.headers[name] for name in ["etag", "last-modified"] if name in response.headers}
+                            if validators:
+                                deferred = deferred_validators.get()
+                                (self.validators if deferred is None else deferred)[key] = validators
+                            return await response.text()
+            except aiohttp.ClientResponseError:
+                raise
+            except (aiohttp.ClientError, asyncio.TimeoutError) as error:
+                if attempt == self.retries:
+                    raise
+                logger.warning("Retrying request error='%s' url=%s delay=%.1f", error, url, delay)
+            await asyncio.sleep(delay)
+
+    async def get(self, url: str, **kwargs: Any) -> str:
+        """Perform a GET request. Returns the body as text."""
+        return await self.request("GET", url, **kwargs)
+
+    async def post(self, url: str, **kwargs: Any) -> str:
+        """Perform a POST request. Returns the body as text."""
+        return await self.request("POST", url, **kwargs)
@@ -0,0 +1,110 @@
+import heapq
+from collections import Counter
+from typing import Dict, Iterable, List, Tuple
+
+from scripts.processing.lib.compilation import ngrams
+
+
+class SpaceSaving:
+    """Approximate counts of the most frequent items of a stream in bounded memory, using Space-Saving.
+
+    At most twice the capacity of items are tracked at once. Once full, only the capacity most frequent
+    items are kept and items seen afterwards start at the largest count evicted so far, which becomes
+    their error. An estimated count is never below the true count and at most its error above it.
+    """
+
+    def __init__(self, capacity: int) -> None:
+        if capacity < 1:
+            raise ValueError("Invalid capacity: {}".format(capacity))
+        self.capacity = capacity
+        self.counts: Dict[str, int] = {}
+        self.errors: Dict[str, int] = {}
+        # The largest count evicted so far, an upper bound of the true count of any untracked item
+        self.floor = 0
+        self.total = 0
+
+    def update(self, counts: Dict[str, int]) -> None:
+        """Add the counts of a batch of items."""
+        tracked = self.counts
+        for item, count in counts.items():
+            if item in tracked:
+                tracked[item] += count
+            else:
+                tracked[item] = self.floor + count
+                if self.floor > 0:
+                    self.errors[item] = self.floor
+            self.total += count
+            if len(tracked) > 2 * self.capacity:
+                self.evict()
+                tracked = self.counts
+
+    def evict(self) -> None:
+        """Keep only the capacity most frequent items."""
+        kept = heapq.nlargest(self.capacity, self.counts.items(), key=lambda item: item[1])
+        kept_items = {item for item, _ in kept}
+        for item, count in self.counts.items():
+            if item not in kept_items:
+                self.floor = max(self.floor, count)
+        self.counts = dict(kept)
+        self.errors = {item: self.errors[item] for item in self.counts if item in self.errors}
+
+    def error(self, item: str) -> int:
+        """Get the maximum overcount of an item, or the maximum count of an untracked item."""
+        if item in self.counts:
+            return self.errors.get(item, 0)
+        return self.floor
+
+    def top(self, k: int) -> List[Tuple[str, int, int]]:
+        """Get the k items with the largest estimated counts as (item, estimated count, error), most frequent first."""
+        items = heapq.nlargest(k, self.counts.items(), key=lambda item: item[1])
+        return [(item, count, self.errors.get(item, 0)) for item, count in items]
+
+    def guaranteed(self, k: int) -> int:
+        """Get the number of the top k items that are certain to be among the true top k items.
+
+        An item is certain if its lowest possible count is above the highest possible count of any item outside the top k.
+        """
+        items = heapq.nlargest(k + 1, self.counts.items(), key=lambda item: item[1])
+        outside = max(items[k][1] if len(items) > k else 0, self.floor)
+        return sum(1 for item, count in items[:k] if count - self.errors.get(item, 0) > outside)
+
+
+def count_ngrams_approximate(sentences: Iterable[str], orders: List[int], capacity: int) -> Dict[int, SpaceSaving]:
+    """Approximately count the overlapping n-grams of words in sentences for each order, tracking at most twice the capacity of n-grams per order.
+
+    N-grams are counted exactly in batches, which are added to the summaries once they hold the capacity of distinct n-grams.
+    Memory is therefore bounded by about three times the capacity of n-grams per order, plus those of a single sentence.
+    """
+    summaries = {n: SpaceSaving(capacity) for n in orders}
+    batch = {n: Counter() for n in orders}
+    for sentence in sentences:
+        words = sentence.split()
+        for n in orders:
+            if n == 1:
+                batch[n].update(words)
+            elif len(words) >= n:
+                batch[n].update(ngrams(words, n))
+            if len(batch[n]) >= capacity:
+                summaries[n].update(batch[n])
+                batch[n] = Counter()
+    for n in orders:
+        summaries[n].update(batch[n])
+    return summaries
+
+
+def evaluate(summary: SpaceSaving, exact: Dict[str, int], k: int) -> Dict[str, float]:
+    """Compare the approximate top k items of a summary to exact counts."""
+    approximate = summary.top(k)
+    true_top = {item for item, _ in heapq.nlargest(k, exact.items(), key=lambda item: item[1])}
+    errors = [count - exact.get(item, 0) for item, count, _ in approximate]
+    relative_errors = [(count - exact.get(item, 0)) / exact[item] for item, count, _ in approximate if exact.get(item, 0) > 0]
+    return {
+        "k": k,
+        "recall": len(true_top & {item for item, _, _ in approximate}) / len(true_top) if true_top else 1.0,
+        "mean_error": sum(errors) / len(errors) if errors else 0.0,
+        "max_error": max(errors) if errors else 0,
+        "mean_relative_error": sum(relative_errors) / len(relative_errors) if relative_errors else 0.0,
+        "max_error_bound": max((error for _, _, error in approximate), default=0),
+        "within_bounds": all(0 <= count - exact.get(item, 0) <= error for item, count, error in approximate),
+        "guaranteed": summary.guaranteed(k),
+    }
@@ -0,0 +1,136 @@
+import hashlib
+import logging
+import sqlite3
+import time
+from os import path
+from typing import List, Optional, Tuple
+
+from scripts.processing.lib.utils import find_files, is_outdated, load
+
+logger = logging.getLogger(__name__)
+
+def hash_content(content: str) -> str:
+    """Hash the content of a document."""
+    return hashlib.sha1(content.encode("utf-8")).hexdigest()
+
+
+class Manifest:
+    """A database of the documents in the cache and the stages they have completed.
+
+    A document is only recorded once a stage has completely stored its output,
+    so a document with a half-written file is still outstanding.
+    """
+
+    def __init__(self, output_directory: str) -> None:
+        self.output_directory = output_directory
+        # Several processes may use the manifest at once, such as when cleaning
+        self.connection = sqlite3.connect(path.join(output_directory, "manifest.sqlite"), timeout=60)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.execute("""
+            CREATE TABLE IF NOT EXISTS documents (
+                language TEXT NOT NULL,
+                source TEXT NOT NULL,
+                filename TEXT NOT NULL,
+                stage TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                hash TEXT NOT NULL,
+                updated REAL NOT NULL,
+                PRIMARY KEY (language, source, filename)
+            )""")
+        self.connection.execute("CREATE INDEX IF NOT EXISTS documents_stage ON documents (language, stage)")
+        self.connection.execute("""
+            CREATE TABLE IF NOT EXISTS builds (
+                language TEXT NOT NULL,
+                stage TEXT NOT NULL,
+                fingerprint TEXT NOT NULL,
+                updated REAL NOT NULL,
+                PRIMARY KEY (language, stage)
+            )""")
+        self.connection.commit()
+
+    def record(self, language: str, source: str, filename: str, stage: str, content: Optional[str] = None) -> None:
+        """Record that a document has completed a stage. The size and hash are updated if content is given.
+
+        The content should be the output of the stage, so that the fingerprint of the stage changes with its output.
+        """
+        if content is not None:
+            self.connection.execute("""
+                INSERT INTO documents (language, source, filename, stage, size, hash, updated) VALUES (?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (language, source, filename) DO UPDATE SET stage=excluded.stage, size=excluded.size, hash=excluded.hash, updated=excluded.updated
+            """, (language, source, filename, stage, len(content.encode("utf-8")), hash_content(content), time.time()))
+        else:
+            self.connection.execute("UPDATE documents SET stage=?, updated=? WHERE language=? AND source=? AND filename=?", (stage, time.time(), language, source, filename))
+        self.connection.commit()
+
+    def documents(self, language: str, stage: Optional[str] = None) -> List[Tuple[str, str]]:
+        """Get the source and filename of documents for a language, optionally only those that last completed a stage."""
+        if stage is None:
+            rows = self.connection.execute("SELECT source, filename FROM documents WHERE language=? ORDER BY source, filename", (language,))
+        else:
+            rows = self.connection.execute("SELECT source, filename FROM documents WHERE language=? AND stage=? ORDER BY source, filename", (language, stage))
+        return [(source, filename) for source, filename in rows]
+
+    def fingerprint(self, language: str, stage: str) -> str:
+        """Get a fingerprint of the documents for a language that last completed a stage."""
+        fingerprint = hashlib.sha1()
+        rows = self.connection.execute("SELECT source, filename, hash FROM documents WHERE language=? AND stage=? ORDER BY source, filename", (language, stage))
+        for row in rows:
+            fingerprint.update("{}/{}:{}\n".format(*row).encode("utf-8"))
+        return fingerprint.hexdigest()
+
+    def build(self, language: str, stage: str) -> Optional[str]:
+        """Get the fingerprint of the input of the last build of a stage for a language."""
+        row = self.connection.execute("SELECT fingerprint FROM builds WHERE language=? AND stage=?", (language, stage)).fetchone()
+        return None if row is None else row[0]
+
+    def record_build(self, language: str, stage: str, fingerprint: str) -> None:
+        """Record that a stage has been built for a language from input with the given fingerprint."""
+        self.connection.execute("""
+            INSERT INTO builds (language, stage, fingerprint, updated) VALUES (?, ?, ?, ?)
+            ON CONFLICT (language, stage) DO UPDATE SET fingerprint=excluded.fingerprint, updated=excluded.updated
+        """, (language, stage, fingerprint, time.time()))
+        self.connection.commit()
+
+    def scan(self, language: str, rescan: bool = False) -> None:
+        """Record the documents of a cache created before the manifest was introduced, which is only done while the
+        manifest has no documents of the language. Otherwise stages find their work by querying the manifest alone.
+
+        Rescanning reconciles the documents of the manifest with the downloads in the cache, such as after documents
+        were added to or removed from the cache by hand. It lists every download, which is slow for a large cache.
+        Only the listing of the downloads is compared, so a document changed in place outside of download.py is not noticed.
+        """
+        if not rescan and self.connection.execute("SELECT 1 FROM documents WHERE language=? LIMIT 1", (language,)).fetchone() is not None:
+            return
+
+        downloads = path.join(self.output_directory, "downloads/{}".format(language))
+        found = set()
+        if path.exists(downloads):
+            # Files still being written are not documents yet
+            found = {(source, filename) for source, filename in find_files(downloads) if not filename.endswith(".tmp")}
+        recorded = set(self.documents(language))
+
+        removed = sorted(recorded - found)
+        if removed:
+            logger.info("Forgetting documents removed from the cache language=%s documents=%d", language, len(removed))
+            self.connection.executemany("DELETE FROM documents WHERE language=? AND source=? AND filename=?",
+                                        [(language, source, filename) for source, filename in removed])
+
+        added = sorted(found - recorded)
+        if added:
+            logger.info("Scanning cache for documents language=%s documents=%d", language, len(added))
+        for source, filename in added:
+            input = "downloads/{}/{}/{}".format(language, source, filename)
+            output = "clean/{}/{}/{}".format(language, source, filename)
+            # Documents count as cleaned only if both the cleaned file and the shard are up to date
+            cleaned = not is_outdated(self.output_directory, output, input)
+            cleaned = cleaned and not is_outdated(self.output_directory, "shards/{}/{}/{}.json".format(language, source, filename), input)
+            # The hash is that of the output of the stage, which is what the next stage reads
+            content = load(self.output_directory, output if cleaned else input)
+            self.connection.execute("INSERT OR IGNORE INTO documents (language, source, filename, stage, size, hash, updated) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (language, source, filename, "cleaned" if cleaned else "downloaded", len(content.encode("utf-8")), hash_content(content), time.time()))
+        self.connection.commit()
+
+    def close(self) -> None:
+        """Close the manifest."""
+        self.connection.close()
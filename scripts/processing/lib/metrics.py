@@ -0,0 +1,197 @@
+import json
+import re
+import resource
+import sys
+import time
+from contextlib import contextmanager
+from importlib import import_module
+from typing import Any, Dict, Iterator, List, Optional
+
+from scripts.processing.lib.utils import store
+
+# The counters kept for every stage and source
+counters = ["documents", "bytes_in", "bytes_out", "tokens", "wall_seconds", "cpu_seconds"]
+
+# The modules whose patterns are profiled, those used when cleaning
+profiled_modules = [
+    "scripts.processing.lib.clean",
+    "scripts.sources.multilingual.gutenberg",
+    "scripts.sources.multilingual.wikipedia",
+    "scripts.sources.swedish.litteraturbanken",
+]
+
+# The time spent in each profiled pattern of this process since the timings were last taken
+pattern_timings: Dict[str, Dict[str, float]] = {}
+
+
+def children_cpu_time() -> float:
+    """Get the CPU time of the terminated child processes of this process."""
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+
+def peak_rss() -> int:
+    """Get the peak resident set size of this process in bytes."""
+    # The peak is reported in kilobytes on Linux and in bytes on macOS
+    scale = 1 if sys.platform == "darwin" else 1024
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale
+
+
+class ProfiledPattern:
+    """A compiled pattern that records the time spent in each call to it."""
+
+    def __init__(self, name: str, pattern: re.Pattern) -> None:
+        self.name = name
+        self.pattern = pattern
+
+    def record(self, started: float, string: str) -> None:
+        """Record a call that started at a time."""
+        timing = pattern_timings.setdefault(self.name, {"calls": 0, "seconds": 0, "characters": 0})
+        timing["calls"] += 1
+        timing["seconds"] += time.perf_counter() - started
+        timing["characters"] += len(string)
+
+    def sub(self, repl: Any, string: str, count: int = 0) -> str:
+        """Replace matches in a string."""
+        started = time.perf_counter()
+        result = self.pattern.sub(repl, string, count)
+        self.record(started, string)
+        return result
+
+    def subn(self, repl: Any, string: str, count: int = 0) -> Any:
+        """Replace matches in a string, also returning the number of replacements."""
+        started = time.perf_counter()
+        result = self.pattern.subn(repl, string, count)
+        self.record(started, string)
+        return result
+
+    def split(self, string: str, maxsplit: int = 0) -> List[str]:
+        """Split a string by matches."""
+        started = time.perf_counter()
+        result = self.pattern.split(string, maxsplit)
+        self.record(started, string)
+        return result
+
+    def findall(self, string: str, *args: Any) -> List[Any]:
+        """Find all matches in a string."""
+        started = time.perf_counter()
+        result = self.pattern.findall(string, *args)
+        self.record(started, string)
+        return result
+
+    def search(self, string: str, *args: Any) -> Any:
+        """Find the first match in a string."""
+        started = time.perf_counter()
+        result = self.pattern.search(string, *args)
+        self.record(started, string)
+        return result
+
+    def __getattr__(self, name: str) -> Any:
+        # Other attributes, such as finditer which is lazy, are not profiled
+        return getattr(self.pattern, name)
+
+
+def profile_patterns() -> None:
+    """Replace the compiled patterns of the cleaning modules with profiled patterns. Only done once per process."""
+    for module_name in profiled_modules:
+        module = import_module(module_name)
+        for name, value in list(vars(module).items()):
+            if isinstance(value, re.Pattern):
+                setattr(module, name, ProfiledPattern("{}.{}".format(module_name, name), value))
+
+
+def take_pattern_timings() -> Dict[str, Dict[str, float]]:
+    """Get and reset the pattern timings of this process."""
+    timings = {name: dict(timing) for name, timing in pattern_timings.items()}
+    pattern_timings.clear()
+    return timings
+
+
+class Metrics:
+    """Performance metrics of stages and of the sources processed by each stage.
+
+    Metrics collected in other processes are sent as snapshots and merged.
+    """
+
+    def __init__(self) -> None:
+        self.stages: Dict[str, Dict[str, Any]] = {}
+        self.patterns: Dict[str, Dict[str, float]] = {}
+
+    def entry(self, stage: str, source: Optional[str] = None) -> Dict[str, Any]:
+        """Get the counters of a stage, or of a source within a stage."""
+        entry = self.stages.setdefault(stage, dict(dict.fromkeys(counters, 0), peak_rss=0, sources={}))
+        if source is None:
+            return entry
+        return entry["sources"].setdefault(source, dict.fromkeys(counters, 0))
+
+    def add(self, stage: str, source: Optional[str] = None, **counts: float) -> None:
+        """Add to the counters of a stage and, if given, of a source within it."""
+        entries = [self.entry(stage)] + ([] if source is None else [self.entry(stage, source)])
+        for entry in entries:
+            for counter, count in counts.items():
+                entry[counter] += count
+
+    @contextmanager
+    def measure(self, stage: str, source: Optional[str] = None) -> Iterator[None]:
+        """Measure the wall and CPU time of a stage, or of a source within a stage.
+
+        The CPU time is that of the current thread, as stages may run side by side in threads.
+        The CPU time of child processes that finish during a stage is included in that of the stage.
+        """
+        entry = self.entry(stage, source)
+        wall = time.perf_counter()
+        cpu = time.thread_time()
+        children = children_cpu_time()
+        try:
+            yield
+        finally:
+            entry["wall_seconds"] += time.perf_counter() - wall
+            entry["cpu_seconds"] += time.thread_time() - cpu
+            if source is None:
+                entry["cpu_seconds"] += children_cpu_time() - children
+                entry["peak_rss"] = max(entry["peak_rss"], peak_rss())
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Get the metrics of this process, including the pattern timings since the last snapshot, in order to merge them elsewhere."""
+        return {"stages": self.stages, "patterns": take_pattern_timings(), "peak_rss": peak_rss()}
+
+    def merge(self, snapshot: Dict[str, Any]) -> None:
+        """Merge a snapshot from another process. Its stage wall time is left out as it overlaps that of this process."""
+        for stage, other in snapshot["stages"].items():
+            entry = self.entry(stage)
+            for counter in counters:
+                if counter != "wall_seconds":
+                    entry[counter] += other[counter]
+            entry["peak_rss"] = max(entry["peak_rss"], other["peak_rss"], snapshot["peak_rss"])
+            for source, other_source in other["sources"].items():
+                source_entry = self.entry(stage, source)
+                for counter in counters:
+                    source_entry[counter] += other_source[counter]
+        for name, timing in snapshot["patterns"].items():
+            entry = self.patterns.setdefault(name, {"calls": 0, "seconds": 0, "characters": 0})
+            for key, value in timing.items():
+                entry[key] += value
+
+    def report(self) -> Dict[str, Any]:
+        """Get the metrics with rates derived from the counters."""
+        self.merge({"stages": {}, "patterns": take_pattern_timings(), "peak_rss": 0})
+
+        def rates(entry: Dict[str, Any]) -> Dict[str, Any]:
+            seconds = entry["wall_seconds"]
+            result = {key: value for key, value in entry.items() if key != "sources"}
+            result["documents_per_second"] = entry["documents"] / seconds if seconds > 0 else 0
+            result["tokens_per_second"] = entry["tokens"] / seconds if seconds > 0 else 0
+            result["mb_per_second"] = entry["bytes_in"] / seconds / 1e6 if seconds > 0 else 0
+            return result
+
+        stages = {}
+        for stage, entry in self.stages.items():
+            stages[stage] = rates(entry)
+            # Sources processed in parallel report the time spent on them summed over all workers
+            stages[stage]["sources"] = {source: rates(source_entry) for source, source_entry in sorted(entry["sources"].items())}
+        patterns = {name: timing for name, timing in sorted(self.patterns.items(), key=lambda item: item[1]["seconds"], reverse=True)}
+        return {"stages": stages, "patterns": patterns}
+
+    def store(self, filename: str) -> None:
+        """Store the report of the metrics as JSON."""
+        store(".", filename, json.dumps(self.report(), indent=2))
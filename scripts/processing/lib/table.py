@@ -0,0 +1,128 @@
+import mmap
+import struct
+import sys
+from array import array
+from typing import Dict, List, Optional, Tuple
+
+# A frequency table is stored as a header followed by fixed-width arrays and a blob of keys.
+# All integers are little-endian.
+#
+# header          magic, version, number of keys (n), size of the key blob
+# offsets         uint64[n + 1], offset of each key in the blob
+# counts          uint64[n], count of each key
+# ranks           uint32[n], zero-based rank of each key
+# order           uint32[n], index of the key of each rank
+# blob            the UTF-8 encoded keys, sorted bytewise
+header_format = "<4sIQQ"
+header_size = struct.calcsize(header_format)
+magic = b"WFT\x00"
+version = 1
+
+
+def encode_table(counts: Dict[str, int]) -> bytes:
+    """Encode frequencies to the binary table format."""
+    # Rank keys by frequency, keeping the original order for ties
+    ranked = sorted(counts.items(), key=lambda item: item[1], reverse=True)
+    encoded = sorted((key.encode("utf-8"), rank) for rank, (key, _) in enumerate(ranked))
+
+    offsets = array("Q", [0])
+    counts_array = array("Q")
+    ranks = array("I")
+    order = array("I", bytes(4 * len(encoded)))
+    for index, (key, rank) in enumerate(encoded):
+        offsets.append(offsets[-1] + len(key))
+        counts_array.append(ranked[rank][1])
+        ranks.append(rank)
+        order[rank] = index
+
+    arrays = [offsets, counts_array, ranks, order]
+    if sys.byteorder != "little":
+        for values in arrays:
+            values.byteswap()
+
+    blob = b"".join(key for key, _ in encoded)
+    header = struct.pack(header_format, magic, version, len(encoded), len(blob))
+    return header + b"".join(values.tobytes() for values in arrays) + blob
+
+
+class FrequencyTable:
+    """A read-only, memory-mapped frequency table."""
+
+    def __init__(self, filename: str) -> None:
+        self.file = open(filename, "rb")
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        file_magic, file_version, self.size, blob_size = struct.unpack_from(header_format, self.map)
+        if file_magic != magic or file_version != version:
+            self.close()
+            raise ValueError("Not a frequency table: {}".format(filename))
+
+        # The arrays are used in place, without reading them into memory
+        self.view = memoryview(self.map)
+        start = header_size
+        self.offsets, start = self.section(start, "Q", self.size + 1)
+        self.counts, start = self.section(start, "Q", self.size)
+        self.ranks, start = self.section(start, "I", self.size)
+        self.order, start = self.section(start, "I", self.size)
+        self.blob = start
+
+    def section(self, start: int, typecode: str, length: int) -> Tuple[memoryview, int]:
+        """Get an array from the table along with the offset following it."""
+        end = start + struct.calcsize(typecode) * length
+        values = self.view[start:end].cast(typecode)
+        if sys.byteorder != "little":
+            values = array(typecode, values)
+            values.byteswap()
+        return values, end
+
+    def key(self, index: int) -> bytes:
+        """Get the encoded key at an index."""
+        return self.map[self.blob + self.offsets[index]:self.blob + self.offsets[index + 1]]
+
+    def find(self, word: str) -> int:
+        """Find the index of a word using binary search. Returns -1 if the word does not exist."""
+        encoded = word.encode("utf-8")
+        low, high = 0, self.size
+        while low < high:
+            middle = (low + high) // 2
+            if self.key(middle) < encoded:
+                low = middle + 1
+            else:
+                high = middle
+        if low < self.size and self.key(low) == encoded:
+            return low
+        return -1
+
+    def frequency(self, word: str) -> int:
+        """Get the frequency of a word. Returns 0 if the word does not exist."""
+        index = self.find(word)
+        return 0 if index < 0 else self.counts[index]
+
+    def rank(self, word: str) -> Optional[int]:
+        """Get the rank of a word, where the most frequent word has rank 1. Returns None if the word does not exist."""
+        index = self.find(word)
+        return None if index < 0 else self.ranks[index] + 1
+
+    def top(self, n: int) -> List[Tuple[str, int]]:
+        """Get the n most frequent words along with their frequency."""
+        return [(self.key(index).decode("utf-8"), self.counts[index]) for index in self.order[:n]]
+
+    def __len__(self) -> int:
+        return self.size
+
+    def __contains__(self, word: str) -> bool:
+        return self.find(word) >= 0
+
+    def __enter__(self) -> "FrequencyTable":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """Close the table."""
+        for name in ["offsets", "counts", "ranks", "order", "view"]:
+            values = getattr(self, name, None)
+            if isinstance(values, memoryview):
+                values.release()
+        self.map.close()
+        self.file.close()
@@ -1,10 +1,22 @@
+import csv
+import heapq
 import logging
-from typing import Any, List, Tuple
+from codecs import getincrementaldecoder
+from io import IncrementalNewlineDecoder, TextIOWrapper
+from json.encoder import encode_basestring_ascii
+from operator import itemgetter
+from typing import Any, Dict, Iterable, Iterator, List, Optional, TextIO, Tuple
 from multiprocessing.pool import ThreadPool
-from os import makedirs, path, listdir
+from os import makedirs, path, listdir, replace
+
+from scripts.processing.lib.compression import detect_compression, open_reader, open_writer
+from scripts.processing.lib.table import encode_table
 
 logger = logging.getLogger(__name__)
 
+# The formats frequencies can be stored in
+frequency_formats = ["json", "binary", "tsv", "csv"]
+
 
 def assert_file(output_directory: str, filename: str) -> None:
     """Create the path to a file if it does not exist."""
@@ -13,19 +25,162 @@ def assert_file(output_directory: str, filename: str) -> None:
         makedirs(parent_directory)
 
 
-def store(output_directory: str, filename: str, content: str) -> None:
-    """Store a file in the output directory. Creates the path as needed."""
+def store(output_directory: str, filename: str, content: str, compression: Optional[str] = None) -> None:
+    """Store a file in the output directory, optionally compressed. Creates the path as needed."""
     assert_file(output_directory, filename)
-    with open(path.join(output_directory, filename), "w") as file:
+    # Write to a temporary file first so that a file is never left half-written
+    if compression is None:
+        with open(path.join(output_directory, filename + ".tmp"), "w") as file:
+            file.write(content)
+    else:
+        with open_writer(path.join(output_directory, filename + ".tmp"), compression) as file:
+            file.write(content.encode("utf-8"))
+    replace(path.join(output_directory, filename + ".tmp"), path.join(output_directory, filename))
+
+
+def store_binary(output_directory: str, filename: str, content: bytes) -> None:
+    """Store a binary file in the output directory. Creates the path as needed."""
+    assert_file(output_directory, filename)
+    with open(path.join(output_directory, filename + ".tmp"), "wb") as file:
         file.write(content)
+    replace(path.join(output_directory, filename + ".tmp"), path.join(output_directory, filename))
 
 
 def load(output_directory: str, filename: str) -> str:
-    """Load a file from the output directory."""
-    with open(path.join(output_directory, filename), "r") as file:
+    """Load a file from the output directory. Compressed files are detected and decompressed."""
+    filename = path.join(output_directory, filename)
+    if detect_compression(filename) is None:
+        with open(filename, "r") as file:
+            return file.read()
+    with TextIOWrapper(open_reader(filename), encoding="utf-8") as file:
         return file.read()
 
 
+def load_binary(output_directory: str, filename: str) -> bytes:
+    """Load a file from the output directory as is, without decoding it or translating line endings. Compressed files
+    are detected and decompressed."""
+    with open_reader(path.join(output_directory, filename)) as file:
+        return file.read()
+
+
+def stream(output_directory: str, filename: str, chunk_size: int = 1 << 20, start: int = 0, end: Optional[int] = None) -> Iterator[str]:
+    """Stream a file from the output directory in chunks of text. Optionally limited to a byte range.
+
+    Compressed files are decompressed as they are read, in which case the range refers to the decompressed content.
+    """
+    # Decode incrementally so that multi-byte characters and line endings
+    # split across chunks are handled just like when reading the whole file
+    decoder = IncrementalNewlineDecoder(getincrementaldecoder("utf-8")(), translate=True)
+    with open_reader(path.join(output_directory, filename)) as file:
+        if start > 0:
+            file.seek(start)
+        remaining = None if end is None else end - start
+        while remaining is None or remaining > 0:
+            data = file.read(chunk_size if remaining is None else min(chunk_size, remaining))
+            if not data:
+                break
+            if remaining is not None:
+                remaining -= len(data)
+            chunk = decoder.decode(data)
+            if chunk:
+                yield chunk
+        chunk = decoder.decode(b"", final=True)
+        if chunk:
+            yield chunk
+
+
+def stream_lines(output_directory: str, filename: str, chunk_size: int = 1 << 20) -> Iterator[str]:
+    """Stream the lines of a file from the output directory, without line endings."""
+    remainder = ""
+    for chunk in stream(output_directory, filename, chunk_size):
+        lines = (remainder + chunk).split("\n")
+        remainder = lines.pop()
+        yield from lines
+    if remainder:
+        yield remainder
+
+
+def split_lines(output_directory: str, filename: str, parts: int) -> List[Tuple[int, int]]:
+    """Split a file into byte ranges of roughly equal size at line boundaries.
+
+    The line ending between two ranges is excluded from both of them. The file must not be compressed.
+    """
+    filename = path.join(output_directory, filename)
+    size = path.getsize(filename)
+    ranges = []
+    start = 0
+    with open(filename, "rb") as file:
+        for part in range(1, parts):
+            if start >= size:
+                break
+            file.seek(max(start, size * part // parts))
+            file.readline()
+            next_start = file.tell()
+            if next_start >= size:
+                break
+            # Exclude the line ending from the range
+            file.seek(next_start - 2 if next_start >= 2 else 0)
+            end = next_start - (2 if file.read(2) == b"\r\n" else 1)
+            ranges.append((start, max(start, end)))
+            start = next_start
+    ranges.append((start, size))
+    return ranges
+
+
+def select_frequencies(counts: Dict[str, int], top: Optional[int] = None, min_count: int = 1) -> List[Tuple[str, int]]:
+    """Select the entries occurring at least min_count times, optionally only the top most frequent ones.
+
+    Entries are ordered by the most frequent first, keeping the original order for ties.
+    """
+    items = counts.items() if min_count <= 1 else [(key, count) for key, count in counts.items() if count >= min_count]
+    if top is not None:
+        # A heap selects the top entries without sorting all of them
+        return heapq.nlargest(top, items, key=itemgetter(1))
+    return sorted(items, key=itemgetter(1), reverse=True)
+
+
+def write_frequencies(file: TextIO, items: Iterable[Tuple[str, int]], format: str) -> None:
+    """Write frequencies to a file entry by entry. The JSON written is identical to that of json.dumps with an indent of 2."""
+    if format == "json":
+        file.write("{")
+        separator = "\n  "
+        for key, count in items:
+            file.write("{}{}: {}".format(separator, encode_basestring_ascii(key), count))
+            separator = ",\n  "
+        file.write("}" if separator == "\n  " else "\n}")
+    elif format == "tsv":
+        for key, count in items:
+            file.write("{}\t{}\n".format(key, count))
+    elif format == "csv":
+        csv.writer(file, lineterminator="\n").writerows(items)
+    else:
+        raise ValueError("Unknown format: {}".format(format))
+
+
+def store_frequencies(output_directory: str, filename: str, counts: Dict[str, int], formats: List[str] = ["json"], top: Optional[int] = None,
+                      min_count: int = 1) -> int:
+    """Store frequencies sorted by the most frequent entries, optionally only the top ones occurring at least min_count times.
+
+    The extension is added per format. Returns the number of bytes stored.
+    """
+    items = select_frequencies(counts, top, min_count)
+    size = 0
+    for format in formats:
+        output = "{}.{}".format(filename, "bin" if format == "binary" else format)
+        if format == "binary":
+            store_binary(output_directory, output, encode_table(dict(items)))
+        elif format in frequency_formats:
+            assert_file(output_directory, output)
+            # Write to a temporary file first so that a file is never left half-written
+            with open(path.join(output_directory, output + ".tmp"), "w", encoding="utf-8", newline="") as file:
+                write_frequencies(file, items, format)
+            replace(path.join(output_directory, output + ".tmp"), path.join(output_directory, output))
+        else:
+            raise ValueError("Unknown format: {}".format(format))
+        size += path.getsize(path.join(output_directory, output))
+    return size
+
+
 def load_bucket(output_directory: str, bucket: List[str]) -> List[str]:
     """Load a bucket of files."""
     files = []
@@ -45,6 +200,13 @@ def exists(output_directory: str, filename: str) -> bool:
     return path.exists(path.join(output_directory, filename))
 
 
+def is_outdated(output_directory: str, filename: str, source: str) -> bool:
+    """Whether or not a file in the output directory is missing or older than the file it was created from."""
+    if not exists(output_directory, filename):
+        return True
+    return path.getmtime(path.join(output_directory, filename)) < path.getmtime(path.join(output_directory, source))
+
+
 def chunks(items: Any, chunk_size: int) -> List[List[Any]]:
     """Format a list to evenly sized chunks"""
     size = round(len(items) / chunk_size)
@@ -0,0 +1,140 @@
+import logging
+import json
+from argparse import ArgumentParser
+from collections import Counter
+from os import path, makedirs, remove, stat
+from typing import List, Optional, Tuple
+
+from scripts.processing.lib.metrics import Metrics
+from scripts.processing.lib.utils import frequency_formats, find_files, exists, load, store, store_frequencies
+
+# Configure the default logging format
+logging.basicConfig(
+    format="[%(asctime)s] [%(name)s] [%(levelname)-5s] %(message)s",
+    level=logging.INFO,
+    datefmt="%Y-%m-%d %H:%M:%S"
+)
+
+logger = logging.getLogger(__name__)
+
+
+def parse_shard(content: str) -> Tuple[Counter, Counter]:
+    """Parse the word and character counts of a shard."""
+    shard = json.loads(content)
+    return Counter(shard["words"]), Counter(shard["characters"])
+
+
+def subtract(total: Counter, counts: Counter) -> None:
+    """Subtract counts from a total, removing entries that are no longer present."""
+    total.subtract(counts)
+    for key in counts:
+        if total[key] <= 0:
+            del total[key]
+
+
+def merge(output_directory: str, language: str, formats: List[str] = ["json"], metrics: Optional[Metrics] = None, top: Optional[int] = None,
+          min_count: int = 1) -> None:
+    """Incrementally merge the count shards of cleaned sources for the language."""
+    if metrics is None:
+        metrics = Metrics()
+    with metrics.measure("merge"):
+        merge_shards(output_directory, language, formats, metrics, top, min_count)
+
+
+def merge_shards(output_directory: str, language: str, formats: List[str], metrics: Metrics, top: Optional[int] = None, min_count: int = 1) -> None:
+    """Merge the shards that have been added, changed or removed since the last merge. The state keeps every entry, whatever is stored."""
+    state_filename = "merged/{}/state.json".format(language)
+    shards_directory = path.join(output_directory, "shards/{}".format(language))
+
+    # The state holds the merged totals and the signature of every merged shard
+    state = {"shards": {}, "words": {}, "characters": {}}
+    if exists(output_directory, state_filename):
+        state = json.loads(load(output_directory, state_filename))
+    merged = state["shards"]
+    word_count = Counter(state["words"])
+    character_count = Counter(state["characters"])
+
+    # Sign each shard by its size and modification time
+    signatures = {}
+    if path.exists(shards_directory):
+        for source, filename in find_files(shards_directory):
+            file = stat(path.join(shards_directory, source, filename))
+            signatures["{}/{}".format(source, filename)] = [file.st_size, file.st_mtime_ns]
+
+    removed = [shard for shard in merged if merged[shard] != signatures.get(shard)]
+    added = sorted(shard for shard in signatures if signatures[shard] != merged.get(shard))
+    logger.info("Merging shards total=%d added=%d removed=%d", len(signatures), len(added), len(removed))
+
+    # A copy of each merged shard is kept so that it can be subtracted once changed or deleted. The totals and the
+    # merged shards are only changed together, so that the state never holds counts of a shard it does not record
+    for shard in removed:
+        logger.info("Removing shard=%s", shard)
+        try:
+            words, characters = parse_shard(load(output_directory, "merged/{}/{}".format(language, shard)))
+        except:
+            # The counts of the shard cannot be told apart from the totals, so every shard is merged again
+            logger.error("Unable to remove shard=%s, merging all shards again", shard, exc_info=True)
+            merged = {}
+            word_count = Counter()
+            character_count = Counter()
+            added = sorted(signatures)
+            break
+        subtract(word_count, words)
+        subtract(character_count, characters)
+        del merged[shard]
+        try:
+            remove(path.join(output_directory, "merged/{}/{}".format(language, shard)))
+        except OSError:
+            logger.warning("Unable to remove the copy of shard=%s", shard, exc_info=True)
+
+    for shard in added:
+        source = shard.split("/", 1)[0]
+        try:
+            logger.info("Adding shard=%s", shard)
+            with metrics.measure("merge", source):
+                content = load(output_directory, "shards/{}/{}".format(language, shard))
+                words, characters = parse_shard(content)
+                store(output_directory, "merged/{}/{}".format(language, shard), content)
+        except:
+            # The shard is neither counted nor recorded, so it is added by the next merge
+            logger.error("Unable to add shard=%s", shard, exc_info=True)
+            continue
+        word_count.update(words)
+        character_count.update(characters)
+        merged[shard] = signatures[shard]
+        metrics.add("merge", source, documents=1, bytes_in=signatures[shard][0], tokens=sum(words.values()))
+
+    logger.info("Completed all jobs, storing compilation")
+    store(output_directory, state_filename, json.dumps({"shards": merged, "words": word_count, "characters": character_count}))
+    size = store_frequencies(output_directory, "./compiled/{}/word-frequencies".format(language), word_count, formats, top, min_count)
+    size += store_frequencies(output_directory, "./compiled/{}/character-frequencies".format(language), character_count, formats, top, min_count)
+    metrics.add("merge", bytes_out=size)
+
+
+def main() -> None:
+    """Main entrypoint."""
+    # Create an argument parser for parsing CLI arguments
+    parser = ArgumentParser(description="A tool to incrementally merge the word and character frequencies of cleaned sources")
+    parser.add_argument("-l", "--language", required=True, type=str, help="The two letter language code for the language to merge")
+    parser.add_argument("-c", "--cache", type=str, default="./frequency-data", required=False, help="The cache directory to use")
+    parser.add_argument("-f", "--format", nargs="+", choices=frequency_formats, default=["json"], required=False, help="The formats to store the frequencies in")
+    parser.add_argument("--metrics", type=str, default=None, required=False, help="Store performance metrics as JSON in a file")
+    parser.add_argument("--top", type=int, default=None, required=False, help="Only store this number of the most frequent entries")
+    parser.add_argument("-m", "--min-count", type=int, default=1, required=False, help="The minimum number of occurrences for an entry to be stored")
+
+    # Parse the arguments
+    options = parser.parse_args()
+
+    # Create a directory for the language as needed
+    output_directory = options.cache
+    if not path.exists(output_directory):
+        makedirs(output_directory)
+
+    metrics = Metrics()
+    merge(output_directory, options.language, options.format, metrics, options.top, options.min_count)
+    if options.metrics is not None:
+        metrics.store(options.metrics)
+
+
+if __name__ == '__main__':
+    main()
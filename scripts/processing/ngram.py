@@ -1,10 +1,16 @@
-import logging
 import json
+import logging
 from argparse import ArgumentParser
-from typing import Any, List, Tuple
+from collections import Counter
+from itertools import islice
+from typing import Any, Dict, Iterable, List, Optional, Tuple
 from os import path, makedirs
 
-from scripts.processing.lib.utils import load, store
+from scripts.processing.lib.compilation import ngrams
+from scripts.processing.lib.heavy_hitters import count_ngrams_approximate, evaluate
+from scripts.processing.lib.manifest import Manifest
+from scripts.processing.lib.metrics import Metrics
+from scripts.processing.lib.utils import frequency_formats, store, stream_lines, store_frequencies
 
 # Configure the default logging format
 logging.basicConfig(
@@ -16,34 +22,135 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
-def create_ngrams(output_directory: str, language: str, n: int) -> None:
-    """Count words in sources for the language."""
-    # Get cleaned files
-    compiled = load(output_directory, "compiled/{}/compiled.txt".format(language))
-    sentences = compiled.split("\n")
+def parse_orders(value: str) -> List[int]:
+    """Parse n-gram orders such as "3", "2,3" or "1-5"."""
+    orders = set()
+    for part in value.split(","):
+        if "-" in part:
+            start, end = part.split("-")
+            orders.update(range(int(start), int(end) + 1))
+        else:
+            orders.add(int(part))
+    if not orders or min(orders) < 1:
+        raise ValueError("Invalid n-gram orders: {}".format(value))
+    return sorted(orders)
 
-    logger.info("Creating %d-grams of  %d sentences", n, len(sentences))
 
-    compiled_grams = set()
-    for sentence in sentences:
-        sentence = sentence.split(" ")
-        grams = [sentence[i:i + n] for i in range(0, len(sentence), n)]
-        for gram in grams:
-            compiled_grams.add(" ".join(gram))
+def default_top_k(capacity: int) -> int:
+    """Get the number of n-grams to keep when counting approximately, if not given."""
+    # Counts are only reliable for the n-grams far more frequent than those evicted, which are a fraction of those tracked
+    return max(capacity // 10, 1)
 
-    logger.info("Completed all jobs, storing compiled %d-grams", n)
-    store(output_directory, "compiled/{}/{}-grams.txt".format(language, n), "\n".join(compiled_grams))
+
+def count_ngrams(sentences: Iterable[str], orders: List[int]) -> Dict[int, Counter]:
+    """Count the overlapping n-grams of words in sentences for each order."""
+    counts = {n: Counter() for n in orders}
+    for sentence in sentences:
+        words = sentence.split()
+        for n in orders:
+            if n == 1:
+                counts[n].update(words)
+            elif len(words) >= n:
+                counts[n].update(ngrams(words, n))
+    return counts
+
+
+def create_ngrams(output_directory: str, language: str, orders: List[int], min_count: int = 1, formats: List[str] = ["json"], force: bool = False,
+                  metrics: Optional[Metrics] = None, capacity: Optional[int] = None, top_k: Optional[int] = None) -> None:
+    """Count n-grams of words in sources for the language. Skipped if the compilation is unchanged since the last count, unless forced.
+
+    Only the top k n-grams of each order are stored, if given. If a capacity is given, n-grams are counted approximately
+    in bounded memory and only the top k of each order are stored, a tenth of the capacity by default, together with the error
+    bound of each count.
+    """
+    manifest = Manifest(output_directory)
+    fingerprint = "{}:{}:{}:{}".format(manifest.build(language, "compile"), ",".join(str(n) for n in orders), min_count, ",".join(formats))
+    if capacity is not None:
+        fingerprint += ":approximate:{}:{}".format(capacity, top_k)
+    elif top_k is not None:
+        fingerprint += ":top={}".format(top_k)
+    # Compilations not made through the manifest are always counted
+    if not force and manifest.build(language, "compile") is not None and manifest.build(language, "ngram") == fingerprint:
+        logger.info("Skipping n-grams, compilation is unchanged")
+        manifest.close()
+        return
+
+    if metrics is None:
+        metrics = Metrics()
+    with metrics.measure("ngram"):
+        logger.info("Counting %s-grams", ",".join(str(n) for n in orders))
+        sentences = stream_lines(output_directory, "compiled/{}/compiled.txt".format(language))
+        if capacity is None:
+            counts = count_ngrams(sentences, orders)
+            tokens = sum(sum(counts[n].values()) for n in orders)
+        else:
+            logger.info("Counting approximately capacity=%d", capacity)
+            summaries = count_ngrams_approximate(sentences, orders, capacity)
+            tokens = sum(summaries[n].total for n in orders)
+
+        size = 0
+        for n in orders:
+            filename = "compiled/{}/{}-grams".format(language, n)
+            if capacity is None:
+                logger.info("Storing %d-grams unique=%d", n, len(counts[n]))
+                size += store_frequencies(output_directory, filename, counts[n], formats, top_k, min_count)
+            else:
+                k = top_k or default_top_k(capacity)
+                top = [(gram, count, error) for gram, count, error in summaries[n].top(k) if count >= min_count]
+                grams = {gram: count for gram, count, _ in top}
+                # The true count of an n-gram is at least its count minus its error
+                bounds = {
+                    "total": summaries[n].total,
+                    "capacity": capacity,
+                    "untracked_max_count": summaries[n].floor,
+                    "guaranteed": summaries[n].guaranteed(k),
+                    "errors": {gram: error for gram, _, error in top if error > 0},
+                }
+                logger.info("Storing approximate %d-grams kept=%d guaranteed=%d max_error=%d", n, len(grams), bounds["guaranteed"], summaries[n].floor)
+                store(output_directory, filename + "-bounds.json", json.dumps(bounds, indent=2, ensure_ascii=False))
+                size += store_frequencies(output_directory, filename, grams, formats)
+    # The tokens of n-grams are the n-grams counted of every order
+    metrics.add("ngram", documents=1, bytes_in=path.getsize(path.join(output_directory, "compiled/{}/compiled.txt".format(language))),
+                bytes_out=size, tokens=tokens)
+    manifest.record_build(language, "ngram", fingerprint)
+    manifest.close()
+
+
+def evaluate_ngrams(output_directory: str, language: str, orders: List[int], capacity: int, top_k: Optional[int] = None,
+                    sample: int = 100000) -> Dict[int, Dict[str, float]]:
+    """Compare approximate and exact n-gram counts of a sample of the sentences of the compilation for the language."""
+    k = top_k or default_top_k(capacity)
+    filename = "compiled/{}/compiled.txt".format(language)
+    summaries = count_ngrams_approximate(islice(stream_lines(output_directory, filename), sample), orders, capacity)
+    counts = count_ngrams(islice(stream_lines(output_directory, filename), sample), orders)
+    results = {}
+    for n in orders:
+        results[n] = evaluate(summaries[n], counts[n], k)
+        results[n]["unique"] = len(counts[n])
+        logger.info("Evaluated %d-grams unique=%d recall=%.3f mean_relative_error=%.4f max_error=%d guaranteed=%d", n, results[n]["unique"],
+                    results[n]["recall"], results[n]["mean_relative_error"], results[n]["max_error"], results[n]["guaranteed"])
+    store(output_directory, "compiled/{}/ngram-evaluation.json".format(language), json.dumps(
+        {"capacity": capacity, "sample": sample, "orders": {str(n): result for n, result in results.items()}}, indent=2))
+    return results
 
 
 def main() -> None:
     """Main entrypoint."""
-    global executor
-
     # Create an argument parser for parsing CLI arguments
-    parser = ArgumentParser(description="A threaded tool to create n-grams of words in large collections of textual content")
+    parser = ArgumentParser(description="A tool to count n-grams of words in large collections of textual content")
     parser.add_argument("-l", "--language", required=True, type=str, help="The two letter language code for the language to clean")
     parser.add_argument("-c", "--cache", type=str, default="./frequency-data", required=False, help="The cache directory to use")
-    parser.add_argument("-n", type=int, default=3, required=False, help="The number of words to use for each sequence")
+    parser.add_argument("-n", type=parse_orders, default=[3], required=False, help="The number of words to use for each sequence, such as 3, 2,3 or 1-5")
+    parser.add_argument("-m", "--min-count", type=int, default=1, required=False, help="The minimum number of occurrences for an n-gram to be stored")
+    parser.add_argument("-f", "--format", nargs="+", choices=frequency_formats, default=["json"], required=False, help="The formats to store the n-grams in")
+    parser.add_argument("--force", action="store_true", help="Count even if the compilation is unchanged")
+    parser.add_argument("--metrics", type=str, default=None, required=False, help="Store performance metrics as JSON in a file")
+    parser.add_argument("--approximate", type=int, default=None, required=False, metavar="CAPACITY",
+                        help="Count approximately in memory bounded by about three times this number of n-grams of each order")
+    parser.add_argument("-k", "--top", "--top-k", dest="top_k", type=int, default=None, required=False,
+                        help="Only store this number of the most frequent n-grams of each order, a tenth of the capacity by default when counting approximately")
+    parser.add_argument("--evaluate", type=int, default=None, required=False, metavar="SENTENCES",
+                        help="Compare approximate and exact counts on this number of sentences instead of counting")
 
     # Parse the arguments
     options = parser.parse_args()
@@ -53,7 +160,16 @@ def main() -> None:
     if not path.exists(output_directory):
         makedirs(output_directory)
 
-    create_ngrams(output_directory, options.language, options.n)
+    if options.evaluate is not None:
+        if options.approximate is None:
+            parser.error("--evaluate requires --approximate")
+        evaluate_ngrams(output_directory, options.language, options.n, options.approximate, options.top_k, options.evaluate)
+        return
+
+    metrics = Metrics()
+    create_ngrams(output_directory, options.language, options.n, options.min_count, options.format, options.force, metrics, options.approximate, options.top_k)
+    if options.metrics is not None:
+        metrics.store(options.metrics)
 
 
 if __name__ == '__main__':
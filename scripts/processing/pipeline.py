@@ -0,0 +1,266 @@
+import asyncio
+import logging
+from argparse import ArgumentParser
+from collections import Counter
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from queue import Empty, Queue
+from threading import Thread
+from typing import Any, Dict, List, Optional, Set, Tuple
+from os import path, makedirs, cpu_count, replace
+
+from scripts.processing.clean import clean_source
+from scripts.processing.download import download_with_fetcher
+from scripts.processing.lib.compilation import count_text
+from scripts.processing.lib.compression import compressions
+from scripts.processing.lib.manifest import Manifest
+from scripts.processing.lib.metrics import Metrics, profile_patterns
+from scripts.processing.lib.utils import assert_file, frequency_formats, load, store_frequencies
+from scripts.processing.ngram import count_ngrams, parse_orders
+
+# Configure the default logging format
+logging.basicConfig(
+    format="[%(asctime)s] [%(name)s] [%(levelname)-5s] %(message)s",
+    level=logging.INFO,
+    datefmt="%Y-%m-%d %H:%M:%S"
+)
+
+logger = logging.getLogger(__name__)
+
+# Configure a future manifest, one per cleaning process
+manifest = None
+
+# The word, character, character n-gram and n-gram counts of a document
+Counts = Tuple[Counter, Counter, Dict[int, Counter], Dict[int, Counter]]
+
+
+def process_document(output_directory: str, language: str, source: str, filename: str, cleaned: bool, orders: List[int], character_orders: List[int],
+                     compile: bool = False, compression: Optional[str] = None, profile: bool = False) -> Tuple[Optional[Counts], Optional[str], Dict[str, Any]]:
+    """Clean a downloaded document unless it is already cleaned, then count it, in a worker.
+
+    Returns the counts of the document, or None if it could not be cleaned or counted, the cleaned content when compiling
+    and a snapshot of the metrics of the worker.
+    """
+    global manifest
+    if manifest is None:
+        manifest = Manifest(output_directory)
+        if profile:
+            profile_patterns()
+    metrics = Metrics()
+    try:
+        if cleaned:
+            content = load(output_directory, "clean/{}/{}/{}".format(language, source, filename))
+        else:
+            with metrics.measure("clean"):
+                content = clean_source(output_directory, language, source, filename, manifest, compression, metrics)
+            if content is None:
+                return None, None, metrics.snapshot()
+
+        with metrics.measure("count", source):
+            # Documents are joined by newlines in the compiled file, so no words span two documents
+            word_count, character_count, character_ngram_count = count_text([content], character_orders)
+            ngram_count = count_ngrams(content.split("\n"), orders)
+        metrics.add("count", source, documents=1, bytes_in=len(content.encode("utf-8")), tokens=sum(word_count.values()))
+    except:
+        logger.error("Unable to load and count source=%s filename=%s", source, filename, exc_info=True)
+        return None, None, metrics.snapshot()
+    return (word_count, character_count, character_ngram_count, ngram_count), content if compile else None, metrics.snapshot()
+
+
+def produce(output_directory: str, language: str, documents: Queue, download: bool, concurrency: int, rate: float, retries: int,
+            compression: Optional[str] = None, metrics: Optional[Metrics] = None, rescan: bool = False) -> None:
+    """Queue the documents already in the cache, then download new documents and queue them as they are stored.
+    Documents are queued along with whether or not they are already cleaned. The manifest is optionally reconciled
+    with the downloads in the cache first."""
+    try:
+        manifest = Manifest(output_directory)
+        manifest.scan(language, rescan)
+        cached_cleaned = manifest.documents(language, "cleaned")
+        cached_downloaded = manifest.documents(language, "downloaded")
+        manifest.close()
+
+        # Cleaned documents skip the cleaning stage altogether
+        logger.info("Queueing cached documents cleaned=%d downloaded=%d", len(cached_cleaned), len(cached_downloaded))
+        for source, filename in cached_downloaded:
+            documents.put((source, filename, False))
+        for source, filename in cached_cleaned:
+            documents.put((source, filename, True))
+
+        if download:
+            async def run() -> None:
+                loop = asyncio.get_running_loop()
+
+                async def on_download(source: str, filename: str) -> None:
+                    # Wait for room in the queue without blocking the event loop
+                    await loop.run_in_executor(None, documents.put, (source, filename, False))
+
+                await download_with_fetcher(output_directory, language, concurrency, rate, retries, on_download=on_download, compression=compression, metrics=metrics)
+
+            asyncio.run(run())
+    except:
+        logger.error("Unable to download sources", exc_info=True)
+    finally:
+        documents.put(None)
+
+
+def dispatch(output_directory: str, language: str, documents: Queue, counted: Queue, executor: ProcessPoolExecutor, limit: int, orders: List[int],
+             character_orders: List[int], compile: bool = False, compression: Optional[str] = None, metrics: Optional[Metrics] = None, profile: bool = False) -> None:
+    """Clean and count documents in the pool with at most limit documents in flight, queueing their counts for merging once counted."""
+    if metrics is None:
+        metrics = Metrics()
+    pending: Set[Future] = set()
+    finished = False
+    try:
+        with metrics.measure("clean"):
+            while not finished or len(pending) > 0:
+                # Forward counts as soon as documents are counted
+                done = {future for future in pending if future.done()}
+                pending -= done
+                for future in done:
+                    try:
+                        counts, content, snapshot = future.result()
+                        metrics.merge(snapshot)
+                        if counts is not None:
+                            counted.put((counts, content))
+                    except:
+                        logger.error("Unable to clean and count document", exc_info=True)
+
+                if not finished and len(pending) < limit:
+                    try:
+                        document = documents.get(timeout=0.1)
+                    except Empty:
+                        continue
+                    if document is None:
+                        finished = True
+                    else:
+                        pending.add(executor.submit(process_document, output_directory, language, *document, orders, character_orders, compile, compression, profile))
+                elif len(pending) > 0:
+                    wait(pending, timeout=0.1, return_when=FIRST_COMPLETED)
+    finally:
+        counted.put(None)
+
+
+def run_pipeline(output_directory: str, language: str, orders: List[int], min_count: int = 1, workers: int = 1, queue_size: int = 64, compile: bool = False,
+                 download: bool = True, concurrency: int = 8, rate: float = 20, retries: int = 5, formats: List[str] = ["json"],
+                 compression: Optional[str] = None, metrics: Optional[Metrics] = None, profile: bool = False, character_orders: List[int] = [],
+                 top: Optional[int] = None, rescan: bool = False) -> None:
+    """Download, clean and count sources for the language in one pass, without reading back a compiled file.
+
+    Downloading, cleaning and counting run at the same time and are connected by bounded queues, so the total time is
+    close to that of the slowest stage. Documents are cleaned and counted in the worker processes, which pass their
+    counts in memory, so only merging the counts is left to the main process.
+    """
+    if metrics is None:
+        metrics = Metrics()
+
+    # Bounded queues make a fast stage wait for a slow one rather than buffer the corpus in memory
+    documents: Queue = Queue(maxsize=queue_size)
+    counted: Queue = Queue(maxsize=queue_size)
+
+    executor = ProcessPoolExecutor(max_workers=workers)
+    producer = Thread(target=produce, args=(output_directory, language, documents, download, concurrency, rate, retries, compression, metrics, rescan), daemon=True)
+    dispatcher = Thread(target=dispatch, args=(output_directory, language, documents, counted, executor, workers * 2, orders, character_orders, compile,
+                                               compression, metrics, profile), daemon=True)
+    producer.start()
+    dispatcher.start()
+
+    # The compiled file starts with a newline, so it starts with an empty word
+    word_count = Counter({"": 1})
+    character_count = Counter()
+    ngram_count: Dict[int, Counter] = {n: Counter() for n in orders}
+    character_ngram_count: Dict[int, Counter] = {n: Counter() for n in character_orders}
+
+    # The compilation is written in the order documents are counted, rather than sorted
+    compiled = None
+    filename = "compiled/{}/compiled.txt".format(language)
+    if compile:
+        assert_file(output_directory, filename)
+        compiled = open(path.join(output_directory, filename + ".tmp"), "wb")
+
+    with metrics.measure("count"):
+        count = 0
+        while True:
+            document = counted.get()
+            if document is None:
+                break
+            (partial_word_count, partial_character_count, partial_character_ngram_count, partial_ngram_count), content = document
+            word_count.update(partial_word_count)
+            character_count.update(partial_character_count)
+            for n, counts in partial_character_ngram_count.items():
+                character_ngram_count[n].update(counts)
+            for n, counts in partial_ngram_count.items():
+                ngram_count[n].update(counts)
+            if compiled is not None:
+                compiled.write(b"\n")
+                compiled.write(content.encode("utf-8"))
+
+            count += 1
+            if count % 100 == 0:
+                logger.info("Counted documents=%d words=%d", count, sum(word_count.values()))
+
+        if compiled is not None:
+            compiled.write(b"\n")
+            compiled.close()
+            replace(path.join(output_directory, filename + ".tmp"), path.join(output_directory, filename))
+
+        # The compiled file also ends with a newline
+        word_count[""] += 1
+        logger.info("Counted documents=%d words=%d", count, sum(word_count.values()))
+
+        logger.info("Completed all jobs, storing frequencies")
+        size = store_frequencies(output_directory, "compiled/{}/word-frequencies".format(language), word_count, formats, top)
+        size += store_frequencies(output_directory, "compiled/{}/character-frequencies".format(language), character_count, formats, top)
+        for n, counts in character_ngram_count.items():
+            logger.info("Storing character %d-grams unique=%d", n, len(counts))
+            size += store_frequencies(output_directory, "compiled/{}/character-{}-grams".format(language, n), counts, formats, top)
+        for n in orders:
+            logger.info("Storing %d-grams unique=%d", n, len(ngram_count[n]))
+            size += store_frequencies(output_directory, "compiled/{}/{}-grams".format(language, n), ngram_count[n], formats, top, min_count)
+        metrics.add("count", bytes_out=size)
+
+    producer.join()
+    dispatcher.join()
+    executor.shutdown()
+
+
+def main() -> None:
+    """Main entrypoint."""
+    # Create an argument parser for parsing CLI arguments
+    parser = ArgumentParser(description="A tool to download, clean and count large collections of textual content in a single pass")
+    parser.add_argument("-l", "--language", required=True, type=str, help="The two letter language code for the language to process")
+    parser.add_argument("-c", "--cache", type=str, default="./frequency-data", required=False, help="The cache directory to use")
+    parser.add_argument("-n", type=parse_orders, default=[2, 3], required=False, help="The number of words to use for each sequence, such as 3, 2,3 or 1-5")
+    parser.add_argument("-m", "--min-count", type=int, default=1, required=False, help="The minimum number of occurrences for an n-gram to be stored")
+    parser.add_argument("--character-ngrams", type=parse_orders, default=[], required=False,
+                        help="Also count sequences of this number of characters within sentences, such as 2, 2,3 or 2-4")
+    parser.add_argument("-w", "--workers", type=int, default=cpu_count(), required=False, help="The number of processes to clean and count with")
+    parser.add_argument("-f", "--format", nargs="+", choices=frequency_formats, default=["json"], required=False, help="The formats to store the frequencies in")
+    parser.add_argument("--top", type=int, default=None, required=False, help="Only store this number of the most frequent entries of each output")
+    parser.add_argument("--queue-size", type=int, default=64, required=False, help="The maximum number of documents waiting between two stages")
+    parser.add_argument("--compile", action="store_true", help="Also write the compiled file, in the order documents are cleaned")
+    parser.add_argument("--no-download", action="store_true", help="Only process documents already in the cache")
+    parser.add_argument("--concurrency", type=int, default=8, required=False, help="The maximum number of concurrent requests per host")
+    parser.add_argument("--rate", type=float, default=20, required=False, help="The maximum number of requests per second per host, 0 for no limit")
+    parser.add_argument("--retries", type=int, default=5, required=False, help="The number of times to retry a failed request")
+    parser.add_argument("--compression", choices=compressions, default=None, required=False, help="Store downloaded and cleaned sources compressed")
+    parser.add_argument("--metrics", type=str, default=None, required=False, help="Store performance metrics as JSON in a file")
+    parser.add_argument("--profile-patterns", action="store_true", help="Include the time spent in each pattern in the metrics")
+    parser.add_argument("--rescan", action="store_true", help="Reconcile the manifest with the downloads in the cache, such as after changing it by hand")
+
+    # Parse the arguments
+    options = parser.parse_args()
+
+    # Create a directory for the language as needed
+    output_directory = options.cache
+    if not path.exists(output_directory):
+        makedirs(output_directory)
+
+    metrics = Metrics()
+    run_pipeline(output_directory, options.language, options.n, options.min_count, options.workers, options.queue_size, options.compile,
+                 not options.no_download, options.concurrency, options.rate, options.retries, options.format, options.compression,
+                 metrics, options.profile_patterns, options.character_ngrams, options.top, options.rescan)
+    if options.metrics is not None:
+        metrics.store(options.metrics)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,5 +1,5 @@
 import re
-from typing import List
+from typing import Any, List, Tuple
 
 # Requires requests:
 # python3 -m pip install requests
@@ -13,14 +13,21 @@ footer_pattern_2 = re.compile(r"\*\*\* ?START: FULL LICENSE.*")
 newline_pattern = re.compile(r"\n")
 
 
-def fetch_available_gutenberg_books(language: str) -> List[str]:
+def available_gutenberg_books_url(language: str) -> str:
+    """Get the URL listing available books from Gutenberg for the given two-letter language code."""
+    return "https://www.gutenberg.org/browse/languages/{}".format(language)
+
+
+# The form posted when listing available books
+available_gutenberg_books_body = {
+    "lang": "language",
+    "filetype": "txt.utf-8"
+}
+
+
+def fetch_available_gutenberg_books(language: str) -> List[Tuple[str, str]]:
     """Fetch available books from Gutenberg for the given two-letter language code."""
-    url = "https://www.gutenberg.org/browse/languages/{}".format(language)
-    body = {
-        "lang": "language",
-        "filetype": "txt.utf-8"
-    }
-    response = requests.post(url, files=body)
+    response = requests.post(available_gutenberg_books_url(language), files=available_gutenberg_books_body)
     response.raise_for_status()
 
     # Extract a list of tuples for each book with the id and name
@@ -28,14 +35,30 @@ def fetch_available_gutenberg_books(language: str) -> List[str]:
     return books
 
 
+async def fetch_available_gutenberg_books_async(fetcher: Any, language: str) -> List[Tuple[str, str]]:
+    """Fetch available books from Gutenberg for the given two-letter language code using a fetcher."""
+    body = await fetcher.post(available_gutenberg_books_url(language), files=available_gutenberg_books_body)
+    return book_pattern.findall(body)
+
+
+def gutenberg_book_url(id: str) -> str:
+    """Get the URL of a book from Gutenberg, given its ebook id."""
+    return "https://www.gutenberg.org/ebooks/{}.txt.utf-8".format(id)
+
+
 def fetch_gutenberg_book(id: str) -> str:
     """Fetch a book from Gutenberg, given its ebook id."""
-    url = "https://www.gutenberg.org/ebooks/{}.txt.utf-8".format(id)
-    response = requests.get(url)
+    response = requests.get(gutenberg_book_url(id))
     response.raise_for_status()
     return response.text
 
 
+async def fetch_gutenberg_book_async(fetcher: Any, id: str, conditional: bool = False) -> str:
+    """Fetch a book from Gutenberg, given its ebook id, using a fetcher.
+    A conditional fetch raises NotModified if the book has not changed since it was last fetched."""
+    return await fetcher.get(gutenberg_book_url(id), conditional=conditional)
+
+
 def clean_gutenberg_book(body: str) -> str:
     """Clean a book from Gutenberg. Removes header and footer."""
     # Remove the Gutenberg header
@@ -1,5 +1,7 @@
+import asyncio
 import json
 import re
+from typing import Any, Dict, List
 from urllib.request import urlopen
 from urllib.parse import urlencode
 from datetime import datetime
@@ -7,28 +9,101 @@ from datetime import datetime
 heading_pattern = re.compile(r"=+ *[^=]+ *=+")
 newline_pattern = re.compile(r"\n")
 
-def fetch_wikipedia_article(query: str, language: str) -> str:
-    """Fetch a plain-text article from Wikipedia."""
-    url = "https://{}.wikipedia.org/w/api.php?{}".format(language, urlencode({
+# The maximum number of titles the API accepts in a single query. TextExtracts only returns a single full
+# plain-text extract per response (several only for introductions), so batches are used to find the titles
+# of articles and each article is fetched with a request of its own
+batch_size = 50
+
+def wikipedia_article_url(query: str, language: str) -> str:
+    """Get the URL of the API endpoint for a plain-text article from Wikipedia."""
+    return "https://{}.wikipedia.org/w/api.php?{}".format(language, urlencode({
         "action": "query",
         "prop": "extracts",
         "rvprop": "content",
         "explaintext": True,
         "format": "json",
         "titles": query}))
-    file = urlopen(url)
-    body = json.loads(file.read())
+
+def parse_wikipedia_article(body: str) -> str:
+    """Parse a plain-text article from an API response."""
+    body = json.loads(body)
     return list(body["query"]["pages"].values())[0]["extract"]
 
-def fetch_top_wikipedia_articles(language: str) -> str:
-    """Fetch the top viewed articles for a language."""
+def fetch_wikipedia_article(query: str, language: str) -> str:
+    """Fetch a plain-text article from Wikipedia."""
+    file = urlopen(wikipedia_article_url(query, language))
+    return parse_wikipedia_article(file.read())
+
+async def fetch_wikipedia_article_async(fetcher: Any, query: str, language: str) -> str:
+    """Fetch a plain-text article from Wikipedia using a fetcher."""
+    return parse_wikipedia_article(await fetcher.get(wikipedia_article_url(query, language)))
+
+def wikipedia_titles_url(queries: List[str], language: str) -> str:
+    """Get the URL of the API endpoint for the titles of a batch of articles from Wikipedia."""
+    return "https://{}.wikipedia.org/w/api.php?{}".format(language, urlencode({
+        "action": "query",
+        "format": "json",
+        "titles": "|".join(queries)}))
+
+def parse_wikipedia_titles(body: str, queries: List[str]) -> Dict[str, str]:
+    """Parse the titles of a batch of articles from an API response, by the query they were requested as.
+    Queries of articles that do not exist are left out."""
+    body = json.loads(body)
+
+    # Titles may have been normalized, such as replacing underscores with spaces
+    titles = {query: query for query in queries}
+    for normalization in body["query"].get("normalized", []) + body["query"].get("converted", []):
+        for query, title in list(titles.items()):
+            if title == normalization["from"]:
+                titles[query] = normalization["to"]
+
+    existing = {page["title"] for page in body["query"]["pages"].values() if "missing" not in page and "invalid" not in page}
+    return {query: title for query, title in titles.items() if title in existing}
+
+def fetch_wikipedia_titles(queries: List[str], language: str) -> Dict[str, str]:
+    """Fetch the titles of a batch of articles from Wikipedia, by the query they were requested as.
+    Queries of articles that do not exist are left out."""
+    file = urlopen(wikipedia_titles_url(queries, language))
+    return parse_wikipedia_titles(file.read(), queries)
+
+async def fetch_wikipedia_titles_async(fetcher: Any, queries: List[str], language: str) -> Dict[str, str]:
+    """Fetch the titles of a batch of articles from Wikipedia using a fetcher, by the query they were requested as.
+    Queries of articles that do not exist are left out."""
+    return parse_wikipedia_titles(await fetcher.get(wikipedia_titles_url(queries, language)), queries)
+
+def fetch_wikipedia_articles(queries: List[str], language: str) -> Dict[str, str]:
+    """Fetch a batch of plain-text articles from Wikipedia, by the query they were requested as.
+    Queries that do not exist are left out."""
+    titles = fetch_wikipedia_titles(queries, language)
+    return {query: fetch_wikipedia_article(title, language) for query, title in titles.items()}
+
+async def fetch_wikipedia_articles_async(fetcher: Any, queries: List[str], language: str) -> Dict[str, str]:
+    """Fetch a batch of plain-text articles from Wikipedia using a fetcher, by the query they were requested as.
+    Queries that do not exist are left out. The articles are fetched concurrently, a request each."""
+    titles = await fetch_wikipedia_titles_async(fetcher, queries, language)
+    articles = await asyncio.gather(*[fetch_wikipedia_article_async(fetcher, title, language) for title in titles.values()])
+    return dict(zip(titles, articles))
+
+def top_wikipedia_articles_url(language: str) -> str:
+    """Get the URL of the top viewed articles for a language, last month."""
     now = datetime.now()
     month = 12 if now.month == 1 else now.month - 1
-    url = "https://wikimedia.org/api/rest_v1/metrics/pageviews/top/{0}.wikipedia.org/all-access/{1}/{2:02}/all-days".format(language, now.year, month)
-    file = urlopen(url)
-    body = json.loads(file.read())
+    return "https://wikimedia.org/api/rest_v1/metrics/pageviews/top/{0}.wikipedia.org/all-access/{1}/{2:02}/all-days".format(language, now.year, month)
+
+def parse_top_wikipedia_articles(body: str) -> List[str]:
+    """Parse the top viewed articles from an API response."""
+    body = json.loads(body)
     return [article["article"] for article in body["items"][0]["articles"] if not ":" in article["article"]]
 
+def fetch_top_wikipedia_articles(language: str) -> List[str]:
+    """Fetch the top viewed articles for a language."""
+    file = urlopen(top_wikipedia_articles_url(language))
+    return parse_top_wikipedia_articles(file.read())
+
+async def fetch_top_wikipedia_articles_async(fetcher: Any, language: str) -> List[str]:
+    """Fetch the top viewed articles for a language using a fetcher."""
+    return parse_top_wikipedia_articles(await fetcher.get(top_wikipedia_articles_url(language)))
+
 def clean_wikipedia_article(body: str) -> str:
     """Clean a Wikipedia article. Removes headings."""
     body = heading_pattern.sub("", body)
@@ -1,6 +1,6 @@
 import re
 import json
-from typing import List, Tuple
+from typing import Any, List, Tuple
 
 # Requires requests:
 # python3 -m pip install requests
@@ -30,13 +30,13 @@ blacklist = [
 ]
 
 
-def fetch_available_litteraturbanken_books() -> List[Tuple[str, str]]:
-    """Fetch available books from Litteraturbanken."""
-    url = "https://litteraturbanken.se/api/list_all/etext?exclude=text,parts,sourcedesc,pages,errata&filter_and=%7B%22sort_date_imprint.date:range%22:%221248,2020%22,%22export%3Etype%22:%5B%22xml%22,%22txt%22,%22workdb%22%5D%7D&filter_or=%7B%7D&filter_string=&from=0&include=lbworkid,titlepath,title,titleid,work_titleid,shorttitle,mediatype,searchable,imported,sortfield,sort_date_imprint.plain,main_author.authorid,main_author.surname,main_author.type,work_authors.authorid,work_authors.surname,startpagename,has_epub,sort_date.plain,export&partial_string=true&sort_field=popularity%7Cdesc&suggest=true&to=1000"
-    response = requests.get(url)
-    response.raise_for_status()
+# The URL listing available books
+available_litteraturbanken_books_url = "https://litteraturbanken.se/api/list_all/etext?exclude=text,parts,sourcedesc,pages,errata&filter_and=%7B%22sort_date_imprint.date:range%22:%221248,2020%22,%22export%3Etype%22:%5B%22xml%22,%22txt%22,%22workdb%22%5D%7D&filter_or=%7B%7D&filter_string=&from=0&include=lbworkid,titlepath,title,titleid,work_titleid,shorttitle,mediatype,searchable,imported,sortfield,sort_date_imprint.plain,main_author.authorid,main_author.surname,main_author.type,work_authors.authorid,work_authors.surname,startpagename,has_epub,sort_date.plain,export&partial_string=true&sort_field=popularity%7Cdesc&suggest=true&to=1000"
+
 
-    response = json.loads(response.text)
+def parse_available_litteraturbanken_books(body: str) -> List[Tuple[str, str]]:
+    """Parse available books from a Litteraturbanken API response."""
+    response = json.loads(body)
 
     books = []
     for book in response["data"]:
@@ -56,17 +56,39 @@ def fetch_available_litteraturbanken_books() -> List[Tuple[str, str]]:
     return books
 
 
+def fetch_available_litteraturbanken_books() -> List[Tuple[str, str]]:
+    """Fetch available books from Litteraturbanken."""
+    response = requests.get(available_litteraturbanken_books_url)
+    response.raise_for_status()
+    return parse_available_litteraturbanken_books(response.text)
+
+
+async def fetch_available_litteraturbanken_books_async(fetcher: Any) -> List[Tuple[str, str]]:
+    """Fetch available books from Litteraturbanken using a fetcher."""
+    return parse_available_litteraturbanken_books(await fetcher.get(available_litteraturbanken_books_url))
+
+
+# The URL to download books from
+litteraturbanken_download_url = "https://litteraturbanken.se/api/download"
+
+
 def fetch_litteraturbanken_books(books: List[Tuple[str, str]]) -> str:
     """Fetch books from Litteraturbanken given their ids."""
-    url = "https://litteraturbanken.se/api/download"
     body = {
         "files": ["{}-etext-txt".format(id) for filename, id in books]
     }
-    response = requests.post(url, data=body)
+    response = requests.post(litteraturbanken_download_url, data=body)
     response.raise_for_status()
     return response.text
 
 
+async def fetch_litteraturbanken_books_async(fetcher: Any, books: List[Tuple[str, str]], conditional: bool = False) -> str:
+    """Fetch books from Litteraturbanken given their ids using a fetcher.
+    A conditional fetch raises NotModified if the books have not changed since they were last fetched."""
+    body = [("files", "{}-etext-txt".format(id)) for filename, id in books]
+    return await fetcher.post(litteraturbanken_download_url, data=body, conditional=conditional)
+
+
 def clean_litteraturbanken_book(book: str) -> str:
     """Clean a book fetched from Litteraturbanken."""
     # Remove the header
@@ -0,0 +1,60 @@
+import random
+import unittest
+
+from scripts.processing.lib.clean import clean_text, clean_text_reference, unicode_colons, unicode_commas, unicode_double_quotes, \
+    unicode_ellipses, unicode_exclamations, unicode_hyphens, unicode_periods, unicode_questions, unicode_single_quotes
+
+# Texts that exercise every pass of the cleaner
+corpus = [
+    "Det var en gång en liten flicka som hette Sara. Hon bodde i ett rött hus vid sjön!\n"
+    "Varje morgon gick hon ner till bryggan, där båtarna låg förtöjda? Ja, det gjorde hon.",
+    "Överallt låg snön djup; träden böjde sig under tyngden. Älgen stod stilla i gläntan… sedan försvann den.",
+    "År 1904 flyttade familjen till Göteborg, där fadern fick arbete på varvet 3 dagar i veckan.",
+    "Priset var 12,50 kr (inkl. moms) och 1999-2003 var en bra period; 42a och b42 och 4 2.",
+    "Ett nord-sydligt avtal - inte -så- enkelt -, sa han--och gick. Stockholms- och Uppsalaregionen.",
+    "Rad ett\r\nRad två\r\n\r\nRad tre\tmed\ttabbar\t\toch  flera   mellanslag\x0bsamt\x0csidbrytningar.",
+    "Besök https://www.example.se/sida?id=3&x=y eller sls.fi för mer info. Mejla inte.",
+    "Formeln {x^2 + y_1} är enkel, men {\\frac{a}{b}} är svårare.",
+    "Anna's book and Peter's car; it's the cat's toy.",
+    "a\nb\nc d\ne.\nf!\nok",
+    "Citat: ”Hej”, »hallå« och ‘tjena’ – eller — inte‒ ‐ − ­.",
+    "Han frågade; vad؟ Svaret。 kom、 sen⁉ ¡Hola! ¿Qué? … ։ ⁇",
+    "Symboler: © ™ § ½ ¾ ² ³ ° → √ • ① ⑴ ㉚ ⊙ ═ º × ʃ ᚠ.",
+    "",
+    "   \n\n  \t  \r\n",
+    ". . . ! ? ,",
+]
+
+# Every character normalized by normalize_unicode, along with characters close to them
+characters = unicode_hyphens + unicode_single_quotes + unicode_double_quotes + unicode_periods + unicode_exclamations + \
+    unicode_commas + unicode_questions + unicode_colons + unicode_ellipses + "-'\".,!?:;()[]{}\\_^+*/@#$%&=<>|~"
+fragments = ["och", "att", "det", "Är", "ÅÄÖ", "s", "a", "7", "2019", "x2", "www.sls.fi", "http://a.se/b", "{a_1}", "'s",
+             " ", "  ", "\t", "\n", "\r\n", "\n\n", "-"]
+
+
+class CleanTextTest(unittest.TestCase):
+    def test_corpus(self) -> None:
+        for text in corpus:
+            with self.subTest(text=text):
+                self.assertEqual(clean_text(text), clean_text_reference(text))
+
+    def test_joined_corpus(self) -> None:
+        text = "\n".join(corpus)
+        self.assertEqual(clean_text(text), clean_text_reference(text))
+
+    def test_normalized_characters(self) -> None:
+        for character in characters:
+            for text in [character, "ord{}ord".format(character), "ord {} ord".format(character), "a{}\nb".format(character)]:
+                with self.subTest(text=text):
+                    self.assertEqual(clean_text(text), clean_text_reference(text))
+
+    def test_random_texts(self) -> None:
+        generator = random.Random(0)
+        for _ in range(2000):
+            text = "".join(generator.choice([generator.choice(fragments), generator.choice(characters)]) for _ in range(generator.randint(1, 30)))
+            with self.subTest(text=text):
+                self.assertEqual(clean_text(text), clean_text_reference(text))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,110 @@
+import shutil
+import tempfile
+import unittest
+from os import path
+from typing import List
+
+# Requires aiohttp:
+# python3 -m pip install aiohttp
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from scripts.processing import download
+from scripts.processing.lib.fetch import Fetcher, NotModified
+from scripts.processing.lib.manifest import Manifest
+from scripts.processing.lib.metrics import Metrics
+
+
+class ConditionalRequestTest(unittest.IsolatedAsyncioTestCase):
+    """Tests of conditional requests against a stand-in server on localhost."""
+
+    async def asyncSetUp(self) -> None:
+        self.requests: List[web.Request] = []
+
+        app = web.Application()
+        app.router.add_get("/document", self.handle_document)
+        self.server = TestServer(app, host="127.0.0.1")
+        await self.server.start_server()
+
+    async def asyncTearDown(self) -> None:
+        await self.server.close()
+
+    def url(self, path: str) -> str:
+        return str(self.server.make_url(path))
+
+    async def handle_document(self, request: web.Request) -> web.Response:
+        """Respond with validators, and with 304 Not Modified to a request that has them."""
+        self.requests.append(request)
+        if request.headers.get("If-None-Match") == '"v1"' and request.headers.get("If-Modified-Since") == "Mon, 01 Jan 2024 00:00:00 GMT":
+            return web.Response(status=304)
+        return web.Response(text="document", headers={"ETag": '"v1"', "Last-Modified": "Mon, 01 Jan 2024 00:00:00 GMT"})
+
+    async def test_conditional_request_not_modified(self) -> None:
+        async with Fetcher() as fetcher:
+            self.assertEqual(await fetcher.get(self.url("/document"), conditional=True), "document")
+            with self.assertRaises(NotModified):
+                await fetcher.get(self.url("/document"), conditional=True)
+            # Unconditional requests always fetch the content
+            self.assertEqual(await fetcher.get(self.url("/document")), "document")
+        self.assertNotIn("If-None-Match", self.requests[0].headers)
+        self.assertEqual(self.requests[1].headers["If-None-Match"], '"v1"')
+        self.assertNotIn("If-None-Match", self.requests[2].headers)
+
+    async def test_conditional_request_with_stored_validators(self) -> None:
+        async with Fetcher() as fetcher:
+            await fetcher.get(self.url("/document"), conditional=True)
+            validators = fetcher.validators
+        # Validators kept from a previous run make the first request conditional
+        async with Fetcher(validators=validators) as fetcher:
+            with self.assertRaises(NotModified):
+                await fetcher.get(self.url("/document"), conditional=True)
+
+    async def test_validators_are_deferred(self) -> None:
+        async with Fetcher() as fetcher:
+            with self.assertRaises(OSError):
+                with fetcher.defer_validators():
+                    await fetcher.get(self.url("/document"))
+                    raise OSError("Unable to store the document")
+            # The content was never stored, so the next request must fetch it again
+            self.assertEqual(fetcher.validators, {})
+            self.assertEqual(await fetcher.get(self.url("/document"), conditional=True), "document")
+
+            with fetcher.defer_validators():
+                await fetcher.get(self.url("/document"))
+            with self.assertRaises(NotModified):
+                await fetcher.get(self.url("/document"), conditional=True)
+
+
+class StoreDownloadTest(unittest.TestCase):
+    """Tests of storing downloads only when they have changed."""
+
+    def setUp(self) -> None:
+        self.directory = tempfile.mkdtemp(prefix="cache-")
+        download.manifest = Manifest(self.directory)
+        download.download_metrics = Metrics()
+        download.download_compression = None
+
+    def tearDown(self) -> None:
+        download.manifest.close()
+        shutil.rmtree(self.directory)
+
+    def store(self, content: str) -> bool:
+        download.downloaded_documents = set(download.manifest.documents("sv"))
+        return download.store_download(self.directory, "sv", "gutenberg", "gutenberg/1.txt", content)
+
+    def test_unchanged_download(self) -> None:
+        # Gutenberg books end lines with CRLF, which must survive the comparison
+        content = "Line one\r\nLine two\r\n"
+        self.assertTrue(self.store(content))
+        with open(path.join(self.directory, "downloads/sv/gutenberg/1.txt"), "rb") as file:
+            self.assertEqual(file.read(), content.encode("utf-8"))
+        self.assertFalse(self.store(content))
+
+    def test_changed_download(self) -> None:
+        self.assertTrue(self.store("Line one\r\nLine two\r\n"))
+        self.assertTrue(self.store("Line one\nLine two\n"))
+        self.assertTrue(self.store("Line one\nLine three\n"))
+
+
+if __name__ == '__main__':
+    unittest.main()
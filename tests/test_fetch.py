@@ -0,0 +1,115 @@
+import asyncio
+import unittest
+from typing import List
+
+# Requires aiohttp:
+# python3 -m pip install aiohttp
+import aiohttp
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from scripts.processing.lib.fetch import Fetcher
+
+
+class FetcherTest(unittest.IsolatedAsyncioTestCase):
+    """Tests of the fetcher against a stand-in server on localhost."""
+
+    async def asyncSetUp(self) -> None:
+        self.requests: List[web.Request] = []
+        self.times: List[float] = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+        app = web.Application()
+        app.router.add_get("/flaky", self.handle_flaky)
+        app.router.add_get("/slow", self.handle_slow)
+        app.router.add_get("/missing", self.handle_missing)
+        app.router.add_get("/busy", self.handle_busy)
+        self.server = TestServer(app, host="127.0.0.1")
+        await self.server.start_server()
+
+    async def asyncTearDown(self) -> None:
+        await self.server.close()
+
+    def url(self, path: str) -> str:
+        return str(self.server.make_url(path))
+
+    async def handle_flaky(self, request: web.Request) -> web.Response:
+        """Fail a number of times given by the request before succeeding."""
+        self.requests.append(request)
+        if len(self.requests) <= int(request.query.get("failures", "0")):
+            return web.Response(status=503, text="unavailable")
+        return web.Response(text="ok")
+
+    async def handle_slow(self, request: web.Request) -> web.Response:
+        """Respond too slowly to the first request only."""
+        self.requests.append(request)
+        if len(self.requests) == 1:
+            await asyncio.sleep(2)
+        return web.Response(text="ok")
+
+    async def handle_missing(self, request: web.Request) -> web.Response:
+        self.requests.append(request)
+        return web.Response(status=404, text="missing")
+
+    async def handle_busy(self, request: web.Request) -> web.Response:
+        """Record the number of concurrent requests and when they arrive."""
+        self.requests.append(request)
+        self.times.append(asyncio.get_running_loop().time())
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        await asyncio.sleep(0.05)
+        self.in_flight -= 1
+        return web.Response(text="ok")
+
+    async def test_retries_server_errors(self) -> None:
+        async with Fetcher(retries=3, backoff=0.01) as fetcher:
+            self.assertEqual(await fetcher.get(self.url("/flaky?failures=2")), "ok")
+        self.assertEqual(len(self.requests), 3)
+
+    async def test_backs_off_exponentially(self) -> None:
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        async with Fetcher(retries=3, backoff=0.05) as fetcher:
+            await fetcher.get(self.url("/flaky?failures=3"))
+        # Waits of at least 0.05, 0.1 and 0.2 seconds
+        self.assertGreaterEqual(loop.time() - start, 0.35)
+        self.assertEqual(len(self.requests), 4)
+
+    async def test_gives_up_after_retries(self) -> None:
+        async with Fetcher(retries=2, backoff=0.01) as fetcher:
+            with self.assertRaises(aiohttp.ClientResponseError) as context:
+                await fetcher.get(self.url("/flaky?failures=10"))
+        self.assertEqual(context.exception.status, 503)
+        self.assertEqual(len(self.requests), 3)
+
+    async def test_does_not_retry_client_errors(self) -> None:
+        async with Fetcher(retries=3, backoff=0.01) as fetcher:
+            with self.assertRaises(aiohttp.ClientResponseError) as context:
+                await fetcher.get(self.url("/missing"))
+        self.assertEqual(context.exception.status, 404)
+        self.assertEqual(len(self.requests), 1)
+
+    async def test_retries_timeouts(self) -> None:
+        async with Fetcher(retries=2, backoff=0.01, timeout=0.5) as fetcher:
+            self.assertEqual(await fetcher.get(self.url("/slow")), "ok")
+        self.assertEqual(len(self.requests), 2)
+
+    async def test_limits_concurrency_per_host(self) -> None:
+        async with Fetcher(concurrency=3) as fetcher:
+            responses = await asyncio.gather(*[fetcher.get(self.url("/busy")) for _ in range(12)])
+        self.assertEqual(responses, ["ok"] * 12)
+        self.assertEqual(self.max_in_flight, 3)
+
+    async def test_limits_rate_per_host(self) -> None:
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        async with Fetcher(concurrency=8, rate=20) as fetcher:
+            await asyncio.gather(*[fetcher.get(self.url("/busy")) for _ in range(6)])
+        # The requests are sent a twentieth of a second apart, so the last one is sent a quarter of a second after the first
+        self.assertGreaterEqual(loop.time() - start, 0.25)
+        self.assertEqual(len(self.times), 6)
+
+
+if __name__ == '__main__':
+    unittest.main()
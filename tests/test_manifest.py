@@ -0,0 +1,45 @@
+import shutil
+import tempfile
+import unittest
+from os import remove, path
+
+from scripts.processing.lib.manifest import Manifest
+from scripts.processing.lib.utils import store
+
+
+class ManifestTest(unittest.TestCase):
+    """Tests of finding the documents of a cache through the manifest."""
+
+    def setUp(self) -> None:
+        self.directory = tempfile.mkdtemp(prefix="cache-")
+        store(self.directory, "downloads/sv/wikipedia/a.txt", "Ett dokument.")
+        store(self.directory, "downloads/sv/gutenberg/1.txt", "Ett annat dokument.")
+        self.manifest = Manifest(self.directory)
+
+    def tearDown(self) -> None:
+        self.manifest.close()
+        shutil.rmtree(self.directory)
+
+    def test_scan_new_manifest(self) -> None:
+        self.manifest.scan("sv")
+        self.assertEqual(self.manifest.documents("sv", "downloaded"), [("gutenberg", "1.txt"), ("wikipedia", "a.txt")])
+
+    def test_scan_does_not_list_cache(self) -> None:
+        self.manifest.scan("sv")
+        store(self.directory, "downloads/sv/wikipedia/b.txt", "Ett nytt dokument.")
+        remove(path.join(self.directory, "downloads/sv/gutenberg/1.txt"))
+        # Once the manifest has documents, it is trusted as is
+        self.manifest.scan("sv")
+        self.assertEqual(self.manifest.documents("sv"), [("gutenberg", "1.txt"), ("wikipedia", "a.txt")])
+
+    def test_rescan(self) -> None:
+        self.manifest.scan("sv")
+        store(self.directory, "downloads/sv/wikipedia/b.txt", "Ett nytt dokument.")
+        store(self.directory, "downloads/sv/wikipedia/c.txt.tmp", "Ett halvt")
+        remove(path.join(self.directory, "downloads/sv/gutenberg/1.txt"))
+        self.manifest.scan("sv", rescan=True)
+        self.assertEqual(self.manifest.documents("sv"), [("wikipedia", "a.txt"), ("wikipedia", "b.txt")])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,137 @@
+import json
+import shutil
+import tempfile
+import unittest
+from typing import Dict
+from os import path
+
+# Requires aiohttp:
+# python3 -m pip install aiohttp
+from aiohttp.test_utils import TestClient, TestServer
+
+from scripts.lookup.server import Server, max_suggest_batch_size
+from scripts.lookup.spelling import encode_index
+from scripts.processing.lib.table import encode_table
+
+
+def store_json(directory: str, filename: str, counts: Dict[str, int]) -> None:
+    """Store frequencies as JSON, sorted by the most frequent first like compiled frequencies."""
+    with open(path.join(directory, filename), "w") as file:
+        json.dump(dict(sorted(counts.items(), key=lambda item: item[1], reverse=True)), file)
+
+
+def store_table(directory: str, filename: str, counts: Dict[str, int]) -> None:
+    with open(path.join(directory, filename), "wb") as file:
+        file.write(encode_table(counts))
+
+
+class ServerTest(unittest.IsolatedAsyncioTestCase):
+    """Tests of the lookup server on localhost."""
+
+    async def asyncSetUp(self) -> None:
+        self.directory = tempfile.mkdtemp(prefix="tables-")
+        # Words are stored in both formats with different counts, to tell which one is served
+        store_table(self.directory, "word-frequencies.bin", {"och": 50, "att": 30, "det": 20, "är": 5})
+        store_json(self.directory, "word-frequencies.json", {"och": 1, "att": 1})
+        store_json(self.directory, "character-frequencies.json", {"a": 9, "ö": 3, "b": 6})
+        store_table(self.directory, "2-grams.bin", {"det är": 4, "och att": 2})
+        with open(path.join(self.directory, "spelling-index.bin"), "wb") as file:
+            file.write(encode_index([("och", 50), ("att", 30), ("det", 20), ("är", 5)], 2))
+
+        self.server = Server(self.directory)
+        self.client = TestClient(TestServer(self.server.create_app(), host="127.0.0.1"))
+        await self.client.start_server()
+
+    async def asyncTearDown(self) -> None:
+        await self.client.close()
+        self.server.tables.close()
+        shutil.rmtree(self.directory)
+
+    async def get(self, url: str, status: int = 200) -> Dict:
+        response = await self.client.get(url)
+        self.assertEqual(response.status, status, await response.text())
+        return await response.json() if status == 200 else {}
+
+    async def post(self, url: str, body: object, status: int = 200) -> Dict:
+        response = await self.client.post(url, json=body)
+        self.assertEqual(response.status, status, await response.text())
+        return await response.json() if status == 200 else {}
+
+    async def test_lookup(self) -> None:
+        body = await self.get("/lookup?key=och&key=det&key=saknas")
+        self.assertEqual(body["table"], "words")
+        self.assertEqual(body["results"], [
+            {"key": "och", "frequency": 50, "rank": 1},
+            {"key": "det", "frequency": 20, "rank": 3},
+            {"key": "saknas", "frequency": 0, "rank": None},
+        ])
+
+    async def test_lookup_batch(self) -> None:
+        body = await self.post("/lookup", {"table": "2-grams", "keys": ["det är", "och att", "är det"]})
+        self.assertEqual(body["results"], [
+            {"key": "det är", "frequency": 4, "rank": 1},
+            {"key": "och att", "frequency": 2, "rank": 2},
+            {"key": "är det", "frequency": 0, "rank": None},
+        ])
+
+    async def test_lookup_unknown_table(self) -> None:
+        await self.get("/lookup?table=3-grams&key=a", 404)
+        await self.post("/lookup", {"table": "3-grams", "keys": ["a"]}, 404)
+
+    async def test_lookup_invalid_batch(self) -> None:
+        await self.post("/lookup", {"table": "words"}, 400)
+        await self.post("/lookup", {"keys": "och"}, 400)
+        await self.post("/lookup", {"keys": [1, 2]}, 400)
+
+    async def test_binary_tables_are_preferred(self) -> None:
+        body = await self.get("/tables")
+        self.assertEqual(body, {"words": 4, "characters": 3, "2-grams": 2})
+        body = await self.get("/lookup?key=att")
+        self.assertEqual(body["results"][0]["frequency"], 30)
+
+    async def test_json_fallback(self) -> None:
+        body = await self.post("/lookup", {"table": "characters", "keys": ["a", "b", "ö", "c"]})
+        self.assertEqual([(result["frequency"], result["rank"]) for result in body["results"]], [(9, 1), (6, 2), (3, 3), (0, None)])
+
+    async def test_top(self) -> None:
+        body = await self.get("/top?n=2")
+        self.assertEqual(body["results"], [{"key": "och", "frequency": 50}, {"key": "att", "frequency": 30}])
+        body = await self.get("/top?table=characters&n=5")
+        self.assertEqual(body["results"], [{"key": "a", "frequency": 9}, {"key": "b", "frequency": 6}, {"key": "ö", "frequency": 3}])
+
+    async def test_top_invalid(self) -> None:
+        for n in ["0", "-1", "many"]:
+            await self.get("/top?n={}".format(n), 400)
+            await self.get("/top?table=characters&n={}".format(n), 400)
+        await self.get("/top?table=3-grams", 404)
+
+    async def test_suggest(self) -> None:
+        body = await self.get("/suggest?word=ovh&word=dte&n=2")
+        self.assertEqual(body["results"], [
+            {"word": "ovh", "suggestions": [{"word": "och", "distance": 1, "frequency": 50}]},
+            {"word": "dte", "suggestions": [{"word": "det", "distance": 1, "frequency": 20}, {"word": "att", "distance": 2, "frequency": 30}]},
+        ])
+
+    async def test_suggest_batch_size(self) -> None:
+        await self.post("/suggest", {"words": ["och"] * max_suggest_batch_size})
+        await self.post("/suggest", {"words": ["och"] * (max_suggest_batch_size + 1)}, 413)
+
+    async def test_reload(self) -> None:
+        body = await self.post("/reload", {})
+        self.assertFalse(body["reloaded"])
+
+        # Rewrite the tables as a new build would, in both formats
+        store_table(self.directory, "word-frequencies.bin", {"och": 70, "att": 30, "det": 20, "är": 5, "ny": 1})
+        store_json(self.directory, "character-frequencies.json", {"a": 10, "ö": 3, "b": 6, "c": 1})
+        body = await self.post("/reload", {})
+        self.assertTrue(body["reloaded"])
+        self.assertEqual(body["tables"], {"words": 5, "characters": 4, "2-grams": 2})
+
+        body = await self.get("/lookup?key=och&key=ny")
+        self.assertEqual([result["frequency"] for result in body["results"]], [70, 1])
+        body = await self.post("/lookup", {"table": "characters", "keys": ["a", "c"]})
+        self.assertEqual([result["frequency"] for result in body["results"]], [10, 1])
+
+
+if __name__ == '__main__':
+    unittest.main()
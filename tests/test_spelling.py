@@ -0,0 +1,70 @@
+import random
+import shutil
+import tempfile
+import unittest
+from os import path
+
+from benchmarks.spelling import brute_force, generate_words, misspell
+from scripts.lookup.spelling import SpellingIndex, distance, encode_index
+from scripts.processing.lib.utils import store_binary
+
+
+def reference_distance(source: str, target: str) -> int:
+    """Compute the optimal string alignment distance with the full matrix."""
+    rows = [[i + j if i == 0 or j == 0 else 0 for j in range(len(target) + 1)] for i in range(len(source) + 1)]
+    for i in range(1, len(source) + 1):
+        for j in range(1, len(target) + 1):
+            rows[i][j] = min(rows[i - 1][j] + 1, rows[i][j - 1] + 1, rows[i - 1][j - 1] + (source[i - 1] != target[j - 1]))
+            if i > 1 and j > 1 and source[i - 1] == target[j - 2] and source[i - 2] == target[j - 1]:
+                rows[i][j] = min(rows[i][j], rows[i - 2][j - 2] + 1)
+    return rows[-1][-1]
+
+
+class DistanceTest(unittest.TestCase):
+    def test_random_strings(self) -> None:
+        generator = random.Random(0)
+        for _ in range(5000):
+            source = "".join(generator.choices("abcå", k=generator.randint(0, 9)))
+            target = "".join(generator.choices("abcå", k=generator.randint(0, 9)))
+            max_distance = generator.randint(0, 4)
+            with self.subTest(source=source, target=target, max_distance=max_distance):
+                self.assertEqual(distance(source, target, max_distance), min(reference_distance(source, target), max_distance + 1))
+
+    def test_swaps(self) -> None:
+        self.assertEqual(distance("abcd", "bacd", 2), 1)
+        self.assertEqual(distance("abcd", "abdc", 2), 1)
+        self.assertEqual(distance("ca", "abc", 3), 3)
+
+
+class SpellingIndexTest(unittest.TestCase):
+    """Tests of suggestions from the spelling index against computing the distance to every word."""
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.directory = tempfile.mkdtemp(prefix="spelling-")
+        cls.words = generate_words(2000)
+        store_binary(cls.directory, "spelling-index.bin", encode_index(cls.words, 2))
+        cls.index = SpellingIndex(path.join(cls.directory, "spelling-index.bin"))
+        generator = random.Random(0)
+        cls.queries = [misspell(generator, word, generator.randint(0, 3)) for word, _ in generator.choices(cls.words, k=100)]
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        cls.index.close()
+        shutil.rmtree(cls.directory)
+
+    def test_all_suggestions(self) -> None:
+        for max_distance in [0, 1, 2]:
+            for query in self.queries:
+                with self.subTest(query=query, max_distance=max_distance):
+                    self.assertEqual(self.index.suggest(query, max_distance), brute_force(self.words, query, max_distance))
+
+    def test_best_suggestions(self) -> None:
+        for n in [1, 3, 10]:
+            for query in self.queries:
+                with self.subTest(query=query, n=n):
+                    self.assertEqual(self.index.suggest(query, 2, n), brute_force(self.words, query, 2, n))
+
+
+if __name__ == '__main__':
+    unittest.main()